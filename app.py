@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
 from datetime import date
-import json
-import os
+from utils.models import registre
+from utils.compilation import charger_profil
+from utils.base_donnees import base_donnees
+from utils.serveur_inference import adresse_serveur
 
 # Configuration de la page
 st.set_page_config(
@@ -12,6 +14,29 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Préchargement des modèles en arrière-plan (une seule fois par processus),
+# inutile si un serveur d'inférence partagé est configuré
+if adresse_serveur() is None:
+    registre().demarrer()
+
+    etats = registre().etat()
+    durees = registre().durees
+    for nom_modele, etat in etats.items():
+        detail = ""
+        if nom_modele in durees:
+            detail = f" ({durees[nom_modele]['chargement_s']:.1f}s + warm-up {durees[nom_modele]['warmup_s']:.1f}s)"
+        st.sidebar.caption(f"Modèle {nom_modele} : {etat}{detail}")
+
+    # Profil machine écrit par `python -m utils.autotune`, appliqué au chargement des modèles
+    profil = charger_profil()
+    if profil:
+        st.sidebar.caption(
+            f"Profil d'inférence : {profil.get('intra_op')} threads intra-op / "
+            f"{profil.get('inter_op')} inter-op"
+        )
+else:
+    st.sidebar.caption("Inférence : serveur %s:%d" % adresse_serveur())
+
 # Style CSS personnalisé
 st.markdown("""
 <style>
@@ -137,24 +162,45 @@ with st.form("patient_form"):
         if not all([nom, prenom, email, age, telephone, adresse]):
             st.error("⚠️ Veuillez remplir tous les champs obligatoires (*)")
         else:
-            # Sauvegarde des données (vous pourriez sauvegarder dans une base de données)
-            patient_data = {
-                "nom": nom,
-                "prenom": prenom,
-                "email": email,
-                "age": age,
-                "telephone": telephone,
-                "adresse": adresse,
-                "commentaires": commentaires,
-                "date": str(date.today())
-            }
-            
-            # Sauvegarde en local (pour démonstration)
-            os.makedirs("data", exist_ok=True)
-            with open(f"data/patient_{nom}_{prenom}.json", "w") as f:
-                json.dump(patient_data, f, indent=4)
+            # Sauvegarde dans la base SQLite (un identifiant par patient, pas de collision de noms)
+            patient_id = base_donnees().ajouter_patient(
+                nom, prenom, email=email, age=int(age), telephone=telephone,
+                adresse=adresse, commentaires=commentaires, date_fiche=str(date.today())
+            )
+            # Les analyses lancées ensuite sont rattachées à ce patient
+            st.session_state.patient_id = patient_id
+            st.session_state.patient_nom = f"{prenom} {nom}"
             
-            st.success(f"✅ Informations enregistrées pour {prenom} {nom}")
+            st.success(f"✅ Informations enregistrées pour {prenom} {nom} (dossier n° {patient_id})")
+
+# Recherche dans les dossiers existants
+with st.expander("🔎 Rechercher un patient"):
+    r1, r2, r3, r4 = st.columns([2, 1, 1, 1])
+    texte = r1.text_input("Nom ou prénom", key="recherche_texte")
+    date_min = r2.date_input("Depuis le", value=None, key="recherche_date_min")
+    date_max = r3.date_input("Jusqu'au", value=None, key="recherche_date_max")
+    diagnostic = r4.selectbox("Diagnostic", [""] + base_donnees().diagnostics(), key="recherche_diagnostic")
+
+    patients = base_donnees().rechercher_patients(texte, date_min, date_max, diagnostic or None)
+    st.dataframe(patients, use_container_width=True, hide_index=True)
+
+    if len(patients):
+        choix = st.selectbox(
+            "Dossier",
+            patients["id"].tolist(),
+            format_func=lambda i: "{prenom} {nom} (n° {id}, {date})".format(
+                **patients.set_index("id").loc[i].to_dict(), id=i
+            ),
+            key="recherche_choix"
+        )
+        st.dataframe(base_donnees().historique(int(choix)), use_container_width=True, hide_index=True)
+        if st.button("Sélectionner ce patient pour les analyses"):
+            fiche = base_donnees().patient(int(choix))
+            st.session_state.patient_id = int(choix)
+            st.session_state.patient_nom = f"{fiche['prenom']} {fiche['nom']}"
+
+if st.session_state.get("patient_id"):
+    st.info(f"👤 Patient courant : {st.session_state.patient_nom} (dossier n° {st.session_state.patient_id})")
 
 # Séparateur
 st.markdown("---")
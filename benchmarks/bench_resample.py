@@ -0,0 +1,75 @@
+"""
+Benchmark : boucle cv2.resize par coupe (implémentation d'origine)
+contre le moteur de redimensionnement par lots (utils/resample.py).
+
+Exécution (depuis la racine du projet) :
+    python benchmarks/bench_resample.py --repeat 5
+"""
+import argparse
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.resample import preparer_entree, redimensionner_volume
+from benchmarks.commun import chronometrer
+
+
+def boucle_origine(flair, t1ce, size):
+    # Reproduction de l'ancien code de pages/Segmentation.py
+    n_slices = flair.shape[2]
+    X = np.zeros((n_slices, size, size, 2), dtype=np.float32)
+    for i in range(n_slices):
+        X[i, :, :, 0] = cv2.resize(flair[:, :, i], (size, size))
+        X[i, :, :, 1] = cv2.resize(t1ce[:, :, i], (size, size))
+    X = X / np.max(X)
+    return X
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shape", type=int, nargs=3, default=[240, 240, 100])
+    parser.add_argument("--size", type=int, default=128)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    flair = rng.random(args.shape, dtype=np.float32) * 1000
+    t1ce = rng.random(args.shape, dtype=np.float32) * 1000
+
+    ref, ref_min, ref_med = chronometrer(
+        lambda: boucle_origine(flair, t1ce, args.size), args.repeat
+    )
+    print(f"boucle d'origine      : min {ref_min * 1000:8.2f} ms | médiane {ref_med * 1000:8.2f} ms")
+
+    variantes = {
+        "vectorisé (1 thread)": lambda: preparer_entree([flair, t1ce], args.size, max_workers=1),
+        "pool de threads     ": lambda: preparer_entree([flair, t1ce], args.size),
+    }
+    for nom, fn in variantes.items():
+        res, t_min, t_med = chronometrer(fn, args.repeat)
+        ecart = float(np.max(np.abs(res - ref)))
+        print(
+            f"{nom}  : min {t_min * 1000:8.2f} ms | médiane {t_med * 1000:8.2f} ms"
+            f" | x{ref_med / t_med:5.2f} | écart max {ecart:.2e}"
+        )
+
+    # Seuil de bascule : coût d'un seul modèle sur différentes tailles de slab
+    print("\nredimensionner_volume, une modalité :")
+    for n in (10, 50, 100, 155):
+        slab = flair[:, :, :min(n, flair.shape[2])] if n <= flair.shape[2] else \
+            rng.random((*args.shape[:2], n), dtype=np.float32)
+        _, t_vec, _ = chronometrer(
+            lambda: redimensionner_volume(slab, args.size, max_workers=1), args.repeat
+        )
+        _, t_thr, _ = chronometrer(
+            lambda: redimensionner_volume(slab, args.size, seuil=0), args.repeat
+        )
+        print(f"  {n:4d} coupes : vectorisé {t_vec * 1000:7.2f} ms | threads {t_thr * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
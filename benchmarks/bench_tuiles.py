@@ -0,0 +1,119 @@
+"""
+Rapport vitesse / précision : segmentation standard (coupes redimensionnées
+en 128 x 128) contre le mode haute résolution par tuiles (utils/tuiles.py).
+
+Sans cas réel, un volume synthétique est utilisé (vitesse seulement). Avec
+--seg (vérité terrain BraTS), le Dice par classe des deux modes est calculé
+à la résolution native.
+
+Exécution (depuis la racine du projet) :
+    python benchmarks/bench_tuiles.py --flair cas_flair.nii --t1ce cas_t1ce.nii --seg cas_seg.nii
+    python benchmarks/bench_tuiles.py --tuiles-par-appel 16 64 128 --json rapport.json
+"""
+import argparse
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ingest import charger_coupes
+from utils.resample import preparer_entree
+from utils.inference import segmenter_volume
+from utils.tuiles import preparer_natif, segmenter_tuiles, positions_tuiles, TAILLE_TUILE
+from utils.extent import coupes_actives
+from utils.models import MODELES
+from utils.pipeline import IMG_SIZE, VOLUME_START_AT, VOLUME_SLICES
+from benchmarks.commun import volume_synthetique, chronometrer, dice_par_classe
+
+
+def vers_natif(mask, shape):
+    """Masque (N, S, S) -> (N, H, W) au plus proche voisin."""
+    return np.stack([
+        cv2.resize(m, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST) for m in mask
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=MODELES["segmentation"])
+    parser.add_argument("--flair")
+    parser.add_argument("--t1ce")
+    parser.add_argument("--seg", help="vérité terrain BraTS (labels 1, 2, 4)")
+    parser.add_argument("--shape", type=int, nargs=3, default=[240, 240, VOLUME_SLICES])
+    parser.add_argument("--tuiles-par-appel", type=int, nargs="+", default=[16, 64, 128])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-s", type=float, default=30.0, help="budget de latence par étude")
+    parser.add_argument("--json", help="écrit le rapport dans ce fichier")
+    args = parser.parse_args()
+
+    if args.flair and args.t1ce:
+        flair, _ = charger_coupes(args.flair, VOLUME_START_AT, VOLUME_SLICES)
+        t1ce, _ = charger_coupes(args.t1ce, VOLUME_START_AT, VOLUME_SLICES)
+    else:
+        flair, t1ce = volume_synthetique(tuple(args.shape), np.random.default_rng(0))
+
+    verite = None
+    if args.seg:
+        seg, _ = charger_coupes(args.seg, VOLUME_START_AT, VOLUME_SLICES)
+        verite = np.moveaxis(seg, 2, 0).astype(np.uint8)
+        verite[verite == 4] = 3
+
+    from utils.models import charger_modele
+    model = charger_modele("segmentation", args.model)
+    actives = coupes_actives(flair)
+    h, w = flair.shape[:2]
+    n_tuiles = len(positions_tuiles(h)) * len(positions_tuiles(w))
+    print(f"==> {flair.shape} — {actives.sum()} coupes actives, "
+          f"{n_tuiles} tuiles {TAILLE_TUILE}x{TAILLE_TUILE} par coupe")
+
+    # Préchauffage (graphe TF)
+    model.predict_on_batch(np.zeros((1, IMG_SIZE, IMG_SIZE, 2), dtype=np.float32))
+
+    rapport = {"shape": list(flair.shape), "coupes_actives": int(actives.sum()),
+               "tuiles_par_coupe": n_tuiles, "modes": {}}
+
+    def standard():
+        X = preparer_entree([flair, t1ce], IMG_SIZE)
+        return segmenter_volume(model, X, actives=actives)
+
+    mask_std, _, t_std = chronometrer(standard, args.repeat)
+    mask_std = vers_natif(mask_std, (h, w))
+    rapport["modes"]["standard"] = {"duree_s": t_std}
+
+    mask_hr = None
+    for par_appel in args.tuiles_par_appel:
+        def tuiles():
+            X = preparer_natif([flair, t1ce])
+            return segmenter_tuiles(model, X, actives, tuiles_par_appel=par_appel)
+
+        mask_hr, _, t_hr = chronometrer(tuiles, args.repeat)
+        rapport["modes"][f"tuiles_{par_appel}"] = {"duree_s": t_hr}
+
+    rapport["accord_dice"] = dice_par_classe(mask_std, mask_hr, tumeur=True)
+    if verite is not None:
+        rapport["modes"]["standard"]["dice"] = dice_par_classe(mask_std, verite, tumeur=True)
+        for mode in rapport["modes"]:
+            if mode.startswith("tuiles"):
+                rapport["modes"][mode]["dice"] = dice_par_classe(mask_hr, verite, tumeur=True)
+
+    print(f"\n{'mode':14s} {'durée (s)':>10s} {'vs standard':>12s} {'budget':>8s}")
+    for mode, r in rapport["modes"].items():
+        statut = "OK" if r["duree_s"] <= args.budget_s else "DÉPASSÉ"
+        print(f"{mode:14s} {r['duree_s']:10.2f} {r['duree_s'] / t_std:11.1f}x {statut:>8s}")
+        if "dice" in r:
+            print("    Dice : " + ", ".join(f"{k} {v:.3f}" for k, v in r["dice"].items()))
+    print("Accord standard / tuiles (Dice) : "
+          + ", ".join(f"{k} {v:.3f}" for k, v in rapport["accord_dice"].items()))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rapport, f, indent=2)
+        print(f"==> Rapport écrit dans {args.json}")
+
+
+if __name__ == "__main__":
+    main()
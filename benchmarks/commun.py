@@ -0,0 +1,49 @@
+"""
+Fonctions communes aux scripts de benchmarks/ : données synthétiques,
+chronométrage et comparaison de masques. La mémoire résidente vient de
+utils/metriques.py (même mesure que l'instrumentation des pages).
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.mesures import CLASSES
+from utils.metriques import rss_octets  # noqa: F401 (ré-exporté pour les benchmarks)
+
+
+def volume_synthetique(shape, rng):
+    """FLAIR / T1CE : ellipsoïde 'cerveau' + lésion hyperintense + bruit."""
+    x, y, z = np.meshgrid(*(np.linspace(-1, 1, n, dtype=np.float32) for n in shape), indexing="ij")
+    cerveau = (x ** 2 + y ** 2 + (z * 1.2) ** 2) < 0.8
+    lesion = ((x - 0.2) ** 2 + (y + 0.1) ** 2 + z ** 2) < 0.05
+    bruit = rng.random((2,) + tuple(shape), dtype=np.float32) * 20
+    flair = cerveau * 300 + lesion * 500 + bruit[0]
+    t1ce = cerveau * 400 + lesion * 200 + bruit[1]
+    return flair.astype(np.float32), t1ce.astype(np.float32)
+
+
+def chronometrer(fn, repeat):
+    """(dernier résultat, durée min, durée médiane) sur `repeat` exécutions."""
+    durees = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fn()
+        durees.append(time.perf_counter() - t0)
+    return res, min(durees), float(np.median(durees))
+
+
+def dice_par_classe(a, b, tumeur=False):
+    """Dice de chaque classe du modèle (1.0 si absente des deux masques), et de la tumeur entière si demandé."""
+    regions = [(nom, lambda m, c=classe: m == c) for classe, nom in CLASSES.items()]
+    if tumeur:
+        regions.append(("tumeur", lambda m: m > 0))
+    scores = {}
+    for nom, region in regions:
+        pa, pb = region(a), region(b)
+        somme = pa.sum() + pb.sum()
+        scores[nom] = float(2 * (pa & pb).sum() / somme) if somme else 1.0
+    return scores
@@ -0,0 +1,189 @@
+"""
+Parité numérique et performances des backends d'inférence (utils/backends.py)
+par rapport au modèle Keras d'origine.
+
+Pour chaque modèle et chaque backend : écart des probabilités, Dice par
+classe (segmentation) ou accord top-1 (classification), latence par taille
+de batch, mémoire ajoutée par le chargement et taille du fichier modèle.
+
+Exécution (depuis la racine du projet) :
+    python benchmarks/parite_backends.py
+    python benchmarks/parite_backends.py --modele segmentation --flair cas_flair.nii --t1ce cas_t1ce.nii
+    python benchmarks/parite_backends.py --modele classification --images dossier/ --json parite.json
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.backends import BACKENDS, chemin_tflite
+from utils.models import MODELES, charger_modele
+from benchmarks.commun import dice_par_classe, rss_octets
+
+
+# =========================
+# ENTRÉES DE TEST
+# =========================
+def entrees_segmentation(args, rng):
+    if args.flair and args.t1ce:
+        from utils.pipeline import load_and_preprocess_data
+        X = load_and_preprocess_data(args.flair, args.t1ce)[0]
+        # Coupes non vides, réparties sur tout le volume
+        pleines = np.flatnonzero(X.reshape(len(X), -1).max(axis=1) > 0)
+        choix = pleines[np.linspace(0, len(pleines) - 1, min(args.echantillons, len(pleines))).astype(int)]
+        return X[choix]
+
+    # Disques d'intensités différentes sur fond bruité
+    yy, xx = np.mgrid[:128, :128]
+    X = rng.random((args.echantillons, 128, 128, 2), dtype=np.float32) * 0.1
+    for i in range(args.echantillons):
+        cy, cx, r = rng.integers(40, 88), rng.integers(40, 88), rng.integers(8, 30)
+        disque = (yy - cy) ** 2 + (xx - cx) ** 2 < r ** 2
+        X[i][disque] += rng.random(2).astype(np.float32)
+    return X
+
+
+def entrees_classification(args, rng):
+    from utils.classification import IMAGE_SIZE, decoder_image, preprocess_batch
+
+    if args.images:
+        fichiers = sorted(glob.glob(os.path.join(args.images, "*")))[:args.echantillons]
+        images = [decoder_image(open(f, "rb").read()) for f in fichiers]
+        return preprocess_batch(np.stack(images))
+
+    images = rng.integers(0, 256, (args.echantillons, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.uint8)
+    return preprocess_batch(images)
+
+
+# =========================
+# MESURES
+# =========================
+def predire(model, X, batch):
+    return np.concatenate([
+        np.asarray(model.predict_on_batch(X[i:i + batch])) for i in range(0, len(X), batch)
+    ])
+
+
+def latence_ms(model, X, batch, repeat):
+    entree = np.resize(X, (batch,) + X.shape[1:])
+    model.predict_on_batch(entree)   # préchauffage + allocation pour ce batch
+    durees = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        model.predict_on_batch(entree)
+        durees.append(time.perf_counter() - t0)
+    return float(np.median(durees) * 1000)
+
+
+def comparer(nom, reference, sortie):
+    ecart = np.abs(sortie.astype(np.float64) - reference)
+    resultat = {"ecart_max": float(ecart.max()), "ecart_moyen": float(ecart.mean())}
+    ref_classes, classes = reference.argmax(-1), sortie.argmax(-1)
+    if nom == "segmentation":
+        resultat["dice"] = dice_par_classe(ref_classes, classes)
+        resultat["accord_pixels"] = float((ref_classes == classes).mean())
+    else:
+        resultat["accord_top1"] = float((ref_classes == classes).mean())
+    return resultat
+
+
+def conforme(nom, resultat, args):
+    if nom == "segmentation":
+        return min(resultat["dice"].values()) >= args.seuil_dice
+    return resultat["accord_top1"] >= args.seuil_top1
+
+
+# =========================
+# PRINCIPAL
+# =========================
+def evaluer(nom, path, X, args):
+    rapport = {}
+    reference = None
+    for backend in ["keras"] + [b for b in args.backends if b != "keras"]:
+        rss_avant = rss_octets()
+        t0 = time.perf_counter()
+        model = charger_modele(nom, path, backend)
+        chargement_s = time.perf_counter() - t0
+
+        sortie = predire(model, X, max(args.batch))
+        r = {
+            "chargement_s": chargement_s,
+            "memoire_mo": (rss_octets() - rss_avant) / 2 ** 20,
+            "fichier_mo": os.path.getsize(path if backend == "keras" else chemin_tflite(path, backend)) / 2 ** 20,
+            "latence_ms": {str(b): latence_ms(model, X, b, args.repeat) for b in args.batch},
+        }
+        if reference is None:
+            reference = sortie.astype(np.float64)
+        else:
+            r.update(comparer(nom, reference, sortie))
+            r["conforme"] = conforme(nom, r, args)
+        rapport[backend] = r
+        del model
+        gc.collect()
+
+    print(f"\n=== {nom} ({len(X)} échantillons) ===")
+    entete = "".join(f"{'b=' + str(b):>10s}" for b in args.batch)
+    print(f"{'backend':16s}{'fichier Mo':>11s}{'mém. Mo':>9s}{entete}   parité")
+    for backend, r in rapport.items():
+        latences = "".join(f"{r['latence_ms'][str(b)]:8.1f}ms" for b in args.batch)
+        if backend == "keras":
+            parite = "référence"
+        elif nom == "segmentation":
+            parite = (f"Dice min {min(r['dice'].values()):.3f}, |Δp| max {r['ecart_max']:.3g} — "
+                      f"{'OK' if r['conforme'] else 'ÉCART'}")
+        else:
+            parite = (f"top-1 {r['accord_top1']:.1%}, |Δp| max {r['ecart_max']:.3g} — "
+                      f"{'OK' if r['conforme'] else 'ÉCART'}")
+        print(f"{backend:16s}{r['fichier_mo']:11.1f}{r['memoire_mo']:9.0f}{latences}   {parite}")
+    return rapport
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modele", choices=["segmentation", "classification", "tous"], default="tous")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS,
+                        default=["tflite_float32", "tflite_float16", "tflite_int8"])
+    parser.add_argument("--model-segmentation", default=MODELES["segmentation"])
+    parser.add_argument("--model-classification", default=MODELES["classification"])
+    parser.add_argument("--flair")
+    parser.add_argument("--t1ce")
+    parser.add_argument("--images", help="dossier d'images pour la classification")
+    parser.add_argument("--echantillons", type=int, default=32)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seuil-dice", type=float, default=0.95)
+    parser.add_argument("--seuil-top1", type=float, default=0.99)
+    parser.add_argument("--json", help="écrit le rapport dans ce fichier")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    noms = ["segmentation", "classification"] if args.modele == "tous" else [args.modele]
+    rapport = {}
+    for nom in noms:
+        if nom == "segmentation":
+            X = entrees_segmentation(args, rng)
+            path = args.model_segmentation
+        else:
+            X = entrees_classification(args, rng)
+            path = args.model_classification
+        rapport[nom] = evaluer(nom, path, X, args)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rapport, f, indent=2)
+        print(f"\n==> Rapport écrit dans {args.json}")
+
+    ecarts = [f"{nom}/{b}" for nom, r in rapport.items() for b, v in r.items() if v.get("conforme") is False]
+    if ecarts:
+        sys.exit(f"Parité insuffisante : {', '.join(ecarts)}")
+
+
+if __name__ == "__main__":
+    main()
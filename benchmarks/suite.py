@@ -0,0 +1,279 @@
+"""
+Suite de benchmarks reproductible des chemins critiques : prétraitement des
+volumes NIfTI, mesures physiques, prétraitement des images et prédiction des
+deux modèles à plusieurs tailles de batch.
+
+Les données sont synthétiques (graine fixe) : volumes NIfTI écrits dans un
+dossier temporaire et images type IRM. Chaque cas est chronométré (médiane,
+min, p90 sur --repeat exécutions) puis exécuté une fois de plus sous
+tracemalloc pour le pic d'allocation Python/NumPy ; la variation de mémoire
+résidente couvre les allocations natives (TensorFlow, OpenCV).
+
+Le rapport JSON peut être comparé à une référence enregistrée : un cas est
+signalé en régression si sa durée médiane ou son pic mémoire dépasse la
+référence de plus de --tolerance (code de sortie 1).
+
+Exécution (depuis la racine du projet) :
+    python benchmarks/suite.py --json reference.json
+    python benchmarks/suite.py --json courant.json --reference reference.json
+    python benchmarks/suite.py --comparer courant.json --reference reference.json
+    python benchmarks/suite.py --sans-modeles --repeat 10
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.models import MODELES
+from benchmarks.commun import volume_synthetique, rss_octets
+
+# =========================
+# PARAMÈTRES
+# =========================
+TOLERANCE = 0.15
+# Écarts absolus en dessous desquels une variation est du bruit de mesure
+PLANCHER_DUREE_S = 0.002
+PLANCHER_MEMOIRE_MO = 1.0
+
+
+# =========================
+# DONNÉES SYNTHÉTIQUES
+# =========================
+def ecrire_nifti(dossier, shape, rng):
+    import nibabel as nib
+
+    chemins = []
+    for nom, volume in zip(("flair", "t1ce"), volume_synthetique(shape, rng)):
+        chemin = os.path.join(dossier, f"synthetique_{nom}.nii.gz")
+        nib.save(nib.Nifti1Image(volume, np.eye(4)), chemin)
+        chemins.append(chemin)
+    return chemins
+
+
+def masque_synthetique(n_coupes, size, rng):
+    """Masque (N, S, S) à 4 classes : lésions concentriques de rayon variable."""
+    y, x = np.ogrid[:size, :size]
+    mask = np.zeros((n_coupes, size, size), dtype=np.uint8)
+    for i in range(n_coupes):
+        cy, cx = rng.integers(size // 4, 3 * size // 4, 2)
+        r = rng.integers(0, size // 5)
+        d2 = (y - cy) ** 2 + (x - cx) ** 2
+        mask[i][d2 < r ** 2] = 2
+        mask[i][d2 < (r * 0.6) ** 2] = 3
+        mask[i][d2 < (r * 0.3) ** 2] = 1
+    return mask
+
+
+def image_irm(size, rng):
+    """Coupe type IRM en RGB : disque texturé + tache hyperintense, encodée en PNG."""
+    from PIL import Image
+
+    y, x = np.ogrid[:size, :size]
+    c = size / 2
+    disque = ((y - c) ** 2 + (x - c) ** 2) < (0.42 * size) ** 2
+    tache = ((y - 0.4 * size) ** 2 + (x - 0.6 * size) ** 2) < (0.08 * size) ** 2
+    gris = disque * 110 + tache * 120 + rng.normal(0, 12, (size, size))
+    gris = np.clip(gris, 0, 255).astype(np.uint8)
+    image = Image.fromarray(np.stack([gris] * 3, axis=-1))
+    flux = io.BytesIO()
+    image.save(flux, format="PNG")
+    return image, flux.getvalue()
+
+
+# =========================
+# MESURES
+# =========================
+def mesurer(fn, repeat, unites=1):
+    """
+    Durées (hors tracemalloc, qui ralentit les allocations) puis une exécution
+    profilée : pic Python/NumPy et variation de la mémoire résidente.
+    """
+    fn()  # préchauffage : caches, graphes TF, imports paresseux
+    durees = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        durees.append(time.perf_counter() - t0)
+
+    rss_avant = rss_octets()
+    tracemalloc.start()
+    fn()
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mediane = float(np.median(durees))
+    return {
+        "mediane_s": mediane,
+        "min_s": float(np.min(durees)),
+        "p90_s": float(np.percentile(durees, 90)),
+        "debit": unites / mediane if mediane > 0 else None,
+        "pic_python_mo": pic / 2 ** 20,
+        "delta_rss_mo": (rss_octets() - rss_avant) / 2 ** 20,
+    }
+
+
+# =========================
+# CAS
+# =========================
+def cas_pretraitement(args, rng, dossier):
+    from utils.pipeline import load_and_preprocess_data, VOLUME_SLICES
+    from utils.classification import preprocess_image, preprocess_batch, decoder_image
+
+    flair_path, t1ce_path = ecrire_nifti(dossier, tuple(args.shape), rng)
+    yield "load_and_preprocess_data", lambda: load_and_preprocess_data(flair_path, t1ce_path), VOLUME_SLICES
+
+    image, octets = image_irm(args.taille_image, rng)
+    yield "preprocess_image", lambda: preprocess_image(image), 1
+
+    lot = [octets] * 32
+    yield "decoder_et_preprocess_batch_32", lambda: preprocess_batch(
+        np.stack([decoder_image(o) for o in lot])
+    ), len(lot)
+
+
+def cas_mesures(args, rng):
+    from utils.mesures import calculer_mesures_physiques, tableau_mesures
+    from utils.pipeline import IMG_SIZE, VOLUME_SLICES
+
+    mask = masque_synthetique(VOLUME_SLICES, IMG_SIZE, rng)
+    espacement = (1.875, 1.875, 1.0)
+
+    def boucle():
+        return [calculer_mesures_physiques(m, espacement[0], espacement[1]) for m in mask]
+
+    yield "calculer_mesures_physiques", boucle, len(mask)
+    yield "tableau_mesures", lambda: tableau_mesures(mask, espacement), len(mask)
+
+
+def cas_prediction(args, rng):
+    from utils.models import charger_modele
+
+    for nom, path in (("segmentation", args.model_seg), ("classification", args.model_cls)):
+        try:
+            model = charger_modele(nom, path, backend=args.backend)
+        except Exception as e:
+            print(f"[!] Modèle {nom} non chargé ({path}) : {e}")
+            continue
+        forme = tuple(d or 1 for d in model.input_shape[1:])
+        for batch in args.batch:
+            entree = rng.random((batch,) + forme, dtype=np.float32)
+            yield f"predict_{nom}_b{batch}", lambda m=model, x=entree: m.predict_on_batch(x), batch
+
+
+# =========================
+# COMPARAISON
+# =========================
+def comparer(courant, reference, tolerance):
+    """Lignes (cas, métrique, référence, courant, ratio, régression) des cas communs."""
+    lignes = []
+    for nom, r in courant["cas"].items():
+        ref = reference["cas"].get(nom)
+        if ref is None:
+            continue
+        for metrique, plancher in (("mediane_s", PLANCHER_DUREE_S), ("pic_python_mo", PLANCHER_MEMOIRE_MO)):
+            a, b = ref.get(metrique), r.get(metrique)
+            if a is None or b is None:
+                continue
+            ratio = b / a if a > 0 else float("inf")
+            regression = b > a * (1 + tolerance) and b - a > plancher
+            lignes.append((nom, metrique, a, b, ratio, regression))
+    return lignes
+
+
+def afficher_comparaison(lignes, courant, reference):
+    print(f"\n{'cas':36s} {'métrique':14s} {'référence':>10s} {'courant':>10s} {'ratio':>7s}")
+    for nom, metrique, a, b, ratio, regression in lignes:
+        print(f"{nom:36s} {metrique:14s} {a:10.4f} {b:10.4f} {ratio:6.2f}x"
+              f"{'  RÉGRESSION' if regression else ''}")
+    absents = sorted(set(reference["cas"]) - set(courant["cas"]))
+    if absents:
+        print(f"Cas de la référence non mesurés : {', '.join(absents)}")
+    if reference.get("meta", {}).get("machine") != courant.get("meta", {}).get("machine"):
+        print("[!] Référence mesurée sur une autre machine : comparaison indicative")
+
+
+def meta(args):
+    infos = {
+        "machine": platform.node(),
+        "processeur": platform.processor() or platform.machine(),
+        "coeurs": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "repeat": args.repeat,
+        "graine": args.graine,
+        "shape": list(args.shape),
+        "backend": args.backend,
+    }
+    if not args.sans_modeles:
+        import tensorflow as tf
+        infos["tensorflow"] = tf.__version__
+    return infos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-seg", default=MODELES["segmentation"])
+    parser.add_argument("--model-cls", default=MODELES["classification"])
+    parser.add_argument("--backend", default=None, help="backend des modèles (défaut : BT_BACKEND_*)")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--shape", type=int, nargs=3, default=[240, 240, 155])
+    parser.add_argument("--taille-image", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--sans-modeles", action="store_true", help="prétraitement et mesures seulement")
+    parser.add_argument("--cas", nargs="+", help="ne mesurer que les cas dont le nom commence ainsi")
+    parser.add_argument("--json", help="écrit le rapport dans ce fichier")
+    parser.add_argument("--reference", help="rapport de référence à comparer")
+    parser.add_argument("--comparer", help="rapport existant à comparer (sans nouvelle mesure)")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="hausse relative tolérée")
+    args = parser.parse_args()
+
+    if args.comparer:
+        with open(args.comparer) as f:
+            rapport = json.load(f)
+    else:
+        rng = np.random.default_rng(args.graine)
+        rapport = {"meta": meta(args), "cas": {}}
+        with tempfile.TemporaryDirectory() as dossier:
+            generateurs = [cas_pretraitement(args, rng, dossier), cas_mesures(args, rng)]
+            if not args.sans_modeles:
+                generateurs.append(cas_prediction(args, rng))
+            for generateur in generateurs:
+                for nom, fn, unites in generateur:
+                    if args.cas and not any(nom.startswith(c) for c in args.cas):
+                        continue
+                    r = mesurer(fn, args.repeat, unites)
+                    rapport["cas"][nom] = r
+                    print(f"{nom:36s} {r['mediane_s'] * 1000:9.2f} ms (p90 {r['p90_s'] * 1000:8.2f})"
+                          f"  {r['debit']:9.1f} /s  pic {r['pic_python_mo']:7.1f} Mo"
+                          f"  ΔRSS {r['delta_rss_mo']:7.1f} Mo")
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(rapport, f, indent=2)
+            print(f"==> Rapport écrit dans {args.json}")
+
+    if args.reference:
+        with open(args.reference) as f:
+            reference = json.load(f)
+        lignes = comparer(rapport, reference, args.tolerance)
+        afficher_comparaison(lignes, rapport, reference)
+        regressions = [l for l in lignes if l[-1]]
+        if regressions:
+            print(f"==> {len(regressions)} régression(s) au-delà de {args.tolerance:.0%}")
+            sys.exit(1)
+        print("==> Aucune régression")
+
+
+if __name__ == "__main__":
+    main()
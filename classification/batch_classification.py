@@ -0,0 +1,190 @@
+"""
+Classification en lot (sans interface) d'un dossier, d'un .zip ou d'un .tar d'IRM.
+
+Les images sont décodées sur un pool de threads, prétraitées par batchs
+(même logique que `preprocess_image`) et servies au modèle par un pipeline
+tf.data avec prefetch : le predict n'attend jamais les entrées/sorties.
+Les résultats sont écrits au fil de l'eau en CSV ou Parquet.
+
+Exécution (depuis la racine du projet) :
+    python classification/batch_classification.py images/ resultats.csv
+    python classification/batch_classification.py archive.tar.gz resultats.parquet --batch 64
+"""
+import argparse
+import csv
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.classification import LABELS, IMAGE_SIZE, decoder_image, preprocess_batch
+from utils.backends import BACKENDS
+
+EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+# =========================
+# SOURCES
+# =========================
+def iterer_sources(source):
+    """Produit (nom, octets) pour chaque image d'un dossier, zip ou tar (lecture séquentielle)."""
+    if os.path.isdir(source):
+        for racine, _, fichiers in os.walk(source):
+            for nom in sorted(fichiers):
+                if nom.lower().endswith(EXTENSIONS):
+                    path = os.path.join(racine, nom)
+                    with open(path, "rb") as f:
+                        yield os.path.relpath(path, source), f.read()
+
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(EXTENSIONS):
+                    yield info.filename, archive.read(info)
+
+    elif tarfile.is_tarfile(source):
+        # Mode flux "r|*" : l'archive (éventuellement compressée) est lue une seule fois
+        with tarfile.open(source, "r|*") as archive:
+            for membre in archive:
+                if membre.isfile() and membre.name.lower().endswith(EXTENSIONS):
+                    yield membre.name, archive.extractfile(membre).read()
+
+    else:
+        raise ValueError(f"Source non reconnue : {source}")
+
+
+def par_paquets(iterable, taille):
+    paquet = []
+    for item in iterable:
+        paquet.append(item)
+        if len(paquet) == taille:
+            yield paquet
+            paquet = []
+    if paquet:
+        yield paquet
+
+
+def _decoder(item):
+    nom, donnees = item
+    try:
+        return nom, decoder_image(donnees)
+    except Exception as e:
+        print(f"[!] Image illisible {nom} : {e}")
+        return nom, None
+
+
+def batches_pretraites(source, taille_batch, workers):
+    """Générateur (noms, batch float32) : décodage parallèle sur un pool de threads."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for paquet in par_paquets(iterer_sources(source), taille_batch):
+            decodes = [(nom, img) for nom, img in pool.map(_decoder, paquet) if img is not None]
+            if decodes:
+                noms, images = zip(*decodes)
+                yield np.array(noms), preprocess_batch(list(images))
+
+
+def dataset(source, taille_batch, workers):
+    import tensorflow as tf
+
+    signature = (
+        tf.TensorSpec(shape=(None,), dtype=tf.string),
+        tf.TensorSpec(shape=(None, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=tf.float32),
+    )
+    ds = tf.data.Dataset.from_generator(
+        lambda: batches_pretraites(source, taille_batch, workers),
+        output_signature=signature
+    )
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+# =========================
+# ÉCRITURE DES RÉSULTATS
+# =========================
+class EcrivainResultats:
+    """Écriture incrémentale CSV ou Parquet (pyarrow requis pour Parquet)."""
+
+    def __init__(self, path):
+        self.colonnes = ["fichier", "prediction", "confiance"] + [f"prob_{l}" for l in LABELS]
+        self.parquet = path.lower().endswith(".parquet")
+        if self.parquet:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                sys.exit("La sortie Parquet nécessite pyarrow (pip install pyarrow)")
+            self._pa = pa
+            schema = pa.schema(
+                [("fichier", pa.string()), ("prediction", pa.string())] +
+                [(c, pa.float32()) for c in self.colonnes[2:]]
+            )
+            self._writer = pq.ParquetWriter(path, schema)
+        else:
+            self._fichier = open(path, "w", newline="")
+            self._writer = csv.writer(self._fichier)
+            self._writer.writerow(self.colonnes)
+
+    def ecrire(self, noms, probas):
+        indices = np.argmax(probas, axis=1)
+        predictions = [LABELS[i] for i in indices]
+        confiances = probas[np.arange(len(probas)), indices]
+
+        if self.parquet:
+            colonnes = [noms, predictions, confiances] + [probas[:, i] for i in range(len(LABELS))]
+            table = self._pa.table(
+                [self._pa.array(c) for c in colonnes], schema=self._writer.schema
+            )
+            self._writer.write_table(table)
+        else:
+            for nom, pred, conf, p in zip(noms, predictions, confiances, probas):
+                self._writer.writerow([nom, pred, f"{conf:.6f}"] + [f"{x:.6f}" for x in p])
+
+    def fermer(self):
+        if self.parquet:
+            self._writer.close()
+        else:
+            self._fichier.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classification en lot d'images IRM")
+    parser.add_argument("source", help="dossier, archive .zip ou .tar(.gz)")
+    parser.add_argument("sortie", help="fichier de résultats .csv ou .parquet")
+    parser.add_argument("--model", default="models/effnet.h5")
+    parser.add_argument("--backend", choices=BACKENDS, help="défaut : BT_BACKEND_CLASSIFICATION ou keras")
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+
+    from utils.models import charger_modele
+    model = charger_modele("classification", args.model, args.backend)
+
+    ecrivain = EcrivainResultats(args.sortie)
+    total = 0
+    t_predict = 0.0
+    t_debut = time.perf_counter()
+    try:
+        for noms, images in dataset(args.source, args.batch, args.workers):
+            t0 = time.perf_counter()
+            probas = np.asarray(model.predict_on_batch(images))
+            t_predict += time.perf_counter() - t0
+
+            noms = [n.decode("utf-8") for n in noms.numpy()]
+            ecrivain.ecrire(noms, probas)
+            total += len(noms)
+            print(f"  {total} images — {total / (time.perf_counter() - t_debut):.1f} img/s", end="\r")
+    finally:
+        ecrivain.fermer()
+
+    ecoule = time.perf_counter() - t_debut
+    print(f"\n==> {total} images en {ecoule:.1f}s ({total / max(ecoule, 1e-9):.1f} img/s), "
+          f"predict {t_predict:.1f}s ({t_predict / max(ecoule, 1e-9):.0%} du temps)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,112 @@
+import os
+import sys
 import tkinter as tk
-from tkinter import filedialog
+from tkinter import filedialog, ttk
 from tkinter import Label, Button
 from PIL import Image, ImageTk
 import numpy as np
-import cv2
-from tensorflow.keras.models import load_model
-from tensorflow.keras.applications.efficientnet import preprocess_input
-
-# Charger le modèle sauvegardé
-model = load_model("effnet.h5")
-labels = ['glioma_tumor', 'no_tumor', 'meningioma_tumor', 'pituitary_tumor']
-image_size = 150  # même taille utilisée pour l'entraînement
-
-# Fonction pour charger et prédire l'image
-def open_image():
-    file_path = filedialog.askopenfilename()
-    if file_path:
-        # Charger et afficher l'image
-        img = Image.open(file_path)
-        img_resized = img.resize((image_size, image_size))
-        tk_img = ImageTk.PhotoImage(img.resize((250, 250)))  # pour afficher dans l'UI
-        img_label.config(image=tk_img)
-        img_label.image = tk_img
-
-        # Préparer l'image pour le modèle
-        img_array = np.array(img_resized)
-        img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = preprocess_input(img_array)
-
-        pred = model.predict(img_array)
-        pred_percent = pred[0] * 100
-        pred_class_index = np.argmax(pred)
-        pred_class = labels[pred_class_index]
-
-        # Affichage des résultats
-        result_text = f"Prédiction: {pred_class}\n\nPourcentages:\n"
-        for i, label in enumerate(labels):
-            result_text += f"{label}: {pred_percent[i]:.2f}%\n"
-        result_label.config(text=result_text)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.classification import LABELS, classifier_images
+from utils.models import charger_keras
+from utils.travailleur_tk import TravailleurTk
+
+MODEL_PATH = "effnet.h5"
+TAILLE_APERCU = 250
+
+
+# Le modèle est chargé par le worker : la fenêtre s'ouvre tout de suite
+def charger_modele():
+    return charger_keras("classification", MODEL_PATH)
+
+
+# Exécuté dans le worker : lecture, prétraitement et prédiction d'une image
+def predire_image(model, rapporter, file_path):
+    nom = os.path.basename(file_path)
+    rapporter(0.0, f"Lecture de {nom}")
+    with open(file_path, "rb") as f:
+        donnees = f.read()
+    with Image.open(file_path) as img:
+        apercu = img.convert("RGB").resize((TAILLE_APERCU, TAILLE_APERCU))  # pour afficher dans l'UI
+
+    rapporter(0.3, f"Prédiction de {nom}")
+    pred_percent = classifier_images(model, [donnees])[0] * 100
+    rapporter(1.0, f"{nom} terminé")
+    return nom, apercu, pred_percent
+
+
+# Callbacks exécutés sur le thread Tk
+def open_images():
+    file_paths = filedialog.askopenfilenames(
+        filetypes=[("Images", "*.png *.jpg *.jpeg"), ("Tous les fichiers", "*")]
+    )
+    for file_path in file_paths:
+        travailleur.soumettre(
+            predire_image, file_path,
+            progression=afficher_progression, termine=afficher_resultat, erreur=afficher_erreur
+        )
+    maj_file()
+
+
+def afficher_progression(fraction, texte):
+    progress["value"] = 100 * fraction
+    status_label.config(text=texte)
+
+
+def afficher_resultat(resultat):
+    nom, apercu, pred_percent = resultat
+    # PhotoImage est créé ici : les objets Tk ne se manipulent que depuis le thread principal
+    tk_img = ImageTk.PhotoImage(apercu)
+    img_label.config(image=tk_img)
+    img_label.image = tk_img
+
+    pred_class = LABELS[int(np.argmax(pred_percent))]
+    result_text = f"{nom}\nPrédiction: {pred_class}\n\nPourcentages:\n"
+    for i, label in enumerate(LABELS):
+        result_text += f"{label}: {pred_percent[i]:.2f}%\n"
+    result_label.config(text=result_text)
+    historique.insert("end", f"{nom} — {pred_class} ({pred_percent.max():.1f}%)")
+    historique.see("end")
+    maj_file()
+
+
+def afficher_erreur(e):
+    status_label.config(text=f"Erreur : {e}")
+    maj_file()
+
+
+def modele_pret(duree):
+    model_label.config(text=f"Modèle chargé ({duree:.1f} s)")
+
+
+def modele_echec(e):
+    model_label.config(text=f"Échec du chargement du modèle : {e}")
+
+
+def maj_file():
+    n = travailleur.en_attente
+    queue_label.config(text=f"{n} image(s) en file" if n else "File vide")
+
 
 # Interface graphique
 root = tk.Tk()
 root.title("Test du modèle EfficientNetB0")
-root.geometry("400x600")
+root.geometry("400x750")
+
+model_label = Label(root, text="Chargement du modèle en arrière-plan…", fg="#64748b")
+model_label.pack(pady=(10, 0))
+
+btn = Button(root, text="Choisir des images", command=open_images)
+btn.pack(pady=10)
+
+progress = ttk.Progressbar(root, length=300, maximum=100)
+progress.pack()
 
-btn = Button(root, text="Choisir une image", command=open_image)
-btn.pack(pady=20)
+status_label = Label(root, text="")
+status_label.pack()
+
+queue_label = Label(root, text="File vide", fg="#64748b")
+queue_label.pack()
 
 img_label = Label(root)
 img_label.pack(pady=10)
@@ -54,4 +114,9 @@ img_label.pack(pady=10)
 result_label = Label(root, text="", justify="left", font=("Arial", 12))
 result_label.pack(pady=10)
 
+historique = tk.Listbox(root, height=6, width=50)
+historique.pack(pady=10)
+
+travailleur = TravailleurTk(root, charger_modele, pret=modele_pret, echec=modele_echec)
+
 root.mainloop()
@@ -1,22 +1,18 @@
 import streamlit as st
 import numpy as np
-import cv2
 from PIL import Image
 import tempfile
 import os
 import plotly.graph_objects as go
+import pandas as pd
 
-# TensorFlow
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from tensorflow.keras.applications.efficientnet import preprocess_input
-from tensorflow.keras.layers import DepthwiseConv2D
-
-# Custom object pour DepthwiseConv2D (ignore l'argument 'groups' si nécessaire)
-class FixedDepthwiseConv2D(DepthwiseConv2D):
-    def __init__(self, *args, **kwargs):
-        kwargs.pop("groups", None)  # supprime l'argument non reconnu
-        super().__init__(*args, **kwargs)
+from utils.classification import LABELS, LABELS_FR, classifier_images
+from utils.cache import cache_resultats, cle_cache, hash_flux, hash_fichier
+from utils.models import MODELES
+from utils.backends import backend_configure
+from utils.base_donnees import base_donnees
+from utils.serveur_inference import modele_pour
+from utils.metriques import Trace, span, metriques, PANNEAU_ADMIN
 
 # Configuration de la page
 st.set_page_config(
@@ -25,6 +21,11 @@ st.set_page_config(
     layout="wide"
 )
 
+# Étapes de ce passage de script (lecture, inférence, affichage)
+# Exportée seulement si une analyse a tourné : un mouvement de widget n'écrit rien
+trace_page = Trace("classification", origine="page").activer()
+analyse_lancee = False
+
 # Titre
 st.markdown("""
 <div style="text-align: center;">
@@ -33,70 +34,143 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Labels des classes
-LABELS = ['glioma_tumor', 'no_tumor', 'meningioma_tumor', 'pituitary_tumor']
-LABELS_FR = {
-    'glioma_tumor': 'Gliome',
-    'no_tumor': 'Aucune tumeur',
-    'meningioma_tumor': 'Méningiome',
-    'pituitary_tumor': 'Tumeur pituitaire'
-}
-
-# Fonction de prétraitement
-def preprocess_image(image, target_size=(150, 150)):
-    img = np.array(image)
-    img = cv2.resize(img, target_size)
-    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-    img = np.expand_dims(img, axis=0)
-    img = preprocess_input(img)
-    return img
+MODEL_PATH = MODELES["classification"]
 
 # Upload
-st.markdown("### 📤 Téléchargez une image d'IRM")
-uploaded_file = st.file_uploader(
-    "Sélectionnez une image (PNG, JPG, JPEG)",
-    type=['png', 'jpg', 'jpeg']
+st.markdown("### 📤 Téléchargez une ou plusieurs images d'IRM")
+uploaded_files = st.file_uploader(
+    "Sélectionnez des images (PNG, JPG, JPEG)",
+    type=['png', 'jpg', 'jpeg'],
+    accept_multiple_files=True
 )
 
-# Chargement du modèle (une seule fois)
-@st.cache_resource
+# Modèle partagé par toutes les sessions : serveur d'inférence (micro-batching)
+# si BT_INFERENCE_SERVER est défini, sinon registre préchargé au démarrage
 def load_effnet_model():
     try:
-        model = load_model("models/effnet.h5", custom_objects={"DepthwiseConv2D": FixedDepthwiseConv2D})
-        return model
+        return modele_pour("classification")
     except Exception as e:
         st.error(f"Impossible de charger le modèle: {e}")
         return None
 
-model = load_effnet_model()
+with span("modele.chargement"):
+    model = load_effnet_model()
 
-# Si image uploadée
-if uploaded_file is not None and model is not None:
-    image = Image.open(uploaded_file)
-    
-    col1, col2 = st.columns(2)
-    with col1:
-        st.markdown("**Image originale**")
-        st.image(image, width=350)
-    
-    if st.button("🔬 Analyser l'image", use_container_width=True, type="secondary"):
+
+def noms_uniques(fichiers):
+    noms, vus = [], {}
+    for f in fichiers:
+        vus[f.name] = vus.get(f.name, 0) + 1
+        noms.append(f.name if vus[f.name] == 1 else f"{f.name} ({vus[f.name]})")
+    return noms
+
+
+# Si images uploadées
+if uploaded_files and model is not None:
+    with st.expander(f"🖼️ Images chargées ({len(uploaded_files)})", expanded=len(uploaded_files) == 1), \
+            span("affichage.apercus"):
+        st.image(
+            [Image.open(f) for f in uploaded_files],
+            caption=[f.name for f in uploaded_files],
+            width=150 if len(uploaded_files) > 1 else 350
+        )
+
+    label_bouton = "🔬 Analyser l'image" if len(uploaded_files) == 1 \
+        else f"🔬 Analyser les {len(uploaded_files)} images"
+    if st.button(label_bouton, use_container_width=True, type="secondary"):
+        analyse_lancee = True
         with st.spinner("Analyse en cours..."):
             try:
-                img_array = preprocess_image(image)
-                predictions = model.predict(img_array, verbose=0)[0]
-                pred_class_index = np.argmax(predictions)
-                pred_class = LABELS[pred_class_index]
-                pred_percent = predictions * 100
-                
-                st.session_state.predictions = pred_percent
-                st.session_state.pred_class = pred_class
-                st.session_state.image_array = np.array(image)
-                
-                st.success("✅ Analyse terminée!")
+                noms = noms_uniques(uploaded_files)
+                probabilites = [None] * len(uploaded_files)
+
+                # Même image + même modèle : probabilités servies depuis le cache
+                cache = cache_resultats()
+                # Le backend (Keras, TFLite quantifié...) fait partie de la clé : sorties différentes
+                hash_modele = cle_cache(hash_fichier(MODEL_PATH), backend_configure("classification"))
+                with span("upload.lecture_hash"):
+                    cles = [cle_cache("classification", hash_flux(f), hash_modele) for f in uploaded_files]
+                with span("cache.lecture"):
+                    for i, cle in enumerate(cles):
+                        resultat = cache.get(cle, requis=("probabilites",))
+                        if resultat is not None:
+                            probabilites[i] = resultat["probabilites"]
+
+                # Images manquantes : un seul batch, un seul appel au modèle
+                manquantes = [i for i, p in enumerate(probabilites) if p is None]
+                if manquantes:
+                    # Sous-étapes décodage / prétraitement / predict : utils/classification.py
+                    with span("upload.lecture"):
+                        donnees = [uploaded_files[i].getvalue() for i in manquantes]
+                    probas = classifier_images(model, donnees)
+                    for i, p in zip(manquantes, probas):
+                        probabilites[i] = p
+                        cache.put(cles[i], probabilites=p)
+
+                st.session_state.resultats = [
+                    {"fichier": nom, "pred_class": LABELS[int(np.argmax(p))], "predictions": p * 100}
+                    for nom, p in zip(noms, probabilites)
+                ]
+                st.session_state.fichiers_analyses = dict(zip(noms, uploaded_files))
+                st.session_state.predictions = None
+
+                # Rattachement au dossier du patient courant (formulaire d'accueil)
+                if st.session_state.get("patient_id"):
+                    with span("base.enregistrement"):
+                        base = base_donnees()
+                        etude_id = base.ajouter_etude(st.session_state.patient_id, "classification")
+                        base.ajouter_analyses(etude_id, [
+                            {
+                                "fichier": nom, "diagnostic": LABELS_FR[LABELS[int(np.argmax(p))]],
+                                "confiance": float(np.max(p)),
+                                "resultats": {"probabilites": dict(zip(LABELS, map(float, p)))}
+                            }
+                            for nom, p in zip(noms, probabilites)
+                        ])
+
+                st.success(f"✅ Analyse terminée ({len(noms)} image(s))!")
             except Exception as e:
                 st.error(f"Erreur lors de la prédiction: {e}")
+                st.session_state.resultats = None
                 st.session_state.predictions = None
 
+# Tableau des résultats (plusieurs images) et sélection d'une ligne
+if st.session_state.get("resultats"):
+    resultats = st.session_state.resultats
+
+    if len(resultats) > 1:
+        st.markdown("### 🗂️ Résultats par image")
+        tableau = pd.DataFrame([
+            {
+                "Fichier": r["fichier"],
+                "Diagnostic": LABELS_FR[r["pred_class"]],
+                "Confiance (%)": float(np.max(r["predictions"])),
+                **{f"{LABELS_FR[l]} (%)": float(r["predictions"][i]) for i, l in enumerate(LABELS)},
+            }
+            for r in resultats
+        ])
+        st.dataframe(
+            tableau, use_container_width=True, hide_index=True,
+            column_config={
+                c: st.column_config.ProgressColumn(c, format="%.1f", min_value=0, max_value=100)
+                for c in tableau.columns if c.endswith("(%)")
+            }
+        )
+        st.download_button(
+            "📥 Télécharger le tableau (CSV)", data=tableau.to_csv(index=False),
+            file_name="resultats_classification.csv", mime="text/csv"
+        )
+        choix = st.selectbox("Détail de l'image", [r["fichier"] for r in resultats])
+    else:
+        choix = resultats[0]["fichier"]
+
+    selection = next(r for r in resultats if r["fichier"] == choix)
+    st.session_state.pred_class = selection["pred_class"]
+    st.session_state.predictions = selection["predictions"]
+    fichier = st.session_state.fichiers_analyses.get(choix)
+    with span("affichage.decodage_image"):
+        st.session_state.image_array = np.array(Image.open(fichier).convert("RGB")) if fichier else None
+
 # Affichage des résultats
 if hasattr(st.session_state, 'predictions') and st.session_state.predictions is not None:
     st.markdown("### 📊 Résultats de la classification")
@@ -126,15 +200,16 @@ if hasattr(st.session_state, 'predictions') and st.session_state.predictions is
     
     # Graphique probabilités
     st.markdown("#### 📈 Probabilités par classe")
-    fig = go.Figure(data=[go.Bar(
-        x=[LABELS_FR[label] for label in LABELS],
-        y=pred_percent,
-        marker_color=['#FF6B6B' if i == np.argmax(pred_percent) else '#4ECDC4' for i in range(len(LABELS))],
-        text=[f"{p:.1f}%" for p in pred_percent],
-        textposition='outside'
-    )])
-    fig.update_layout(title="Distribution des probabilités", yaxis_title="Probabilité (%)", xaxis_title="Type de tumeur", height=400, showlegend=False)
-    st.plotly_chart(fig, use_container_width=True)
+    with span("affichage.graphique"):
+        fig = go.Figure(data=[go.Bar(
+            x=[LABELS_FR[label] for label in LABELS],
+            y=pred_percent,
+            marker_color=['#FF6B6B' if i == np.argmax(pred_percent) else '#4ECDC4' for i in range(len(LABELS))],
+            text=[f"{p:.1f}%" for p in pred_percent],
+            textposition='outside'
+        )])
+        fig.update_layout(title="Distribution des probabilités", yaxis_title="Probabilité (%)", xaxis_title="Type de tumeur", height=400, showlegend=False)
+        st.plotly_chart(fig, use_container_width=True)
     
     # Rapport texte
     st.markdown("### 📄 Rapport d'analyse")
@@ -159,7 +234,7 @@ if hasattr(st.session_state, 'predictions') and st.session_state.predictions is
     
     # Image annotée
     with col2:
-        if st.button("🖼️ Générer l'image annotée", use_container_width=True):
+        if st.session_state.image_array is not None and st.button("🖼️ Générer l'image annotée", use_container_width=True):
             img_annotated = Image.fromarray(st.session_state.image_array)
             from PIL import ImageDraw
             draw = ImageDraw.Draw(img_annotated)
@@ -176,12 +251,42 @@ else:
     st.info("""
     ### 📋 Instructions pour la classification:
     
-    1. Téléchargez une image d'IRM cérébrale
+    1. Téléchargez une ou plusieurs images d'IRM cérébrale
     2. Formats acceptés: PNG, JPG, JPEG
     3. Image axiale de préférence, bonne résolution et contraste
-    4. Cliquez sur "Analyser l'image"
+    4. Cliquez sur "Analyser" : toutes les images sont classées en un seul lot
     """)
 
+stats_cache = cache_resultats().stats()
+st.sidebar.caption(
+    f"Cache : {stats_cache['hits']} hits / {stats_cache['misses']} misses "
+    f"({stats_cache['entrees']} entrées)"
+)
+
+trace_page.terminer(exporter=analyse_lancee)
+if analyse_lancee:
+    st.session_state.trace_classification = trace_page.en_dict()
+
+# Panneau admin (BT_ADMIN=1) : durées de la dernière analyse et p50 / p99 par étape
+if PANNEAU_ADMIN:
+    with st.sidebar.expander("🛠️ Performances par étape"):
+        derniere = st.session_state.get("trace_classification")
+        if derniere:
+            st.caption(f"Dernière analyse : {derniere['duree_ms']:.0f} ms")
+            st.dataframe(
+                pd.DataFrame(derniere["spans"]).groupby("etape", sort=False)
+                .agg(appels=("duree_ms", "size"), duree_ms=("duree_ms", "sum"),
+                     pic_memoire_mo=("pic_memoire_mo", "max")),
+                use_container_width=True
+            )
+        etapes = metriques().etapes("classification")
+        if etapes:
+            st.caption("Depuis le démarrage du serveur (p50 / p99 sur les dernières exécutions)")
+            st.dataframe(
+                pd.DataFrame(etapes).drop(columns="page").round(2),
+                use_container_width=True, hide_index=True
+            )
+
 st.markdown("---")
 if st.button("🏠 Retour à l'accueil", use_container_width=True):
     st.switch_page("app.py")
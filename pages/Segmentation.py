@@ -1,13 +1,28 @@
+import time
+import uuid
+
 import streamlit as st
-import numpy as np
-import nibabel as nib
-import cv2
-import matplotlib.pyplot as plt
-import tempfile
-import os
-import plotly.graph_objects as go
 import pandas as pd
 
+from utils.inference import TAILLE_BLOC_INFERENCE
+from utils.cache import cache_resultats, cle_cache, hash_flux, hash_fichier
+from utils.models import MODELES
+from utils.backends import backend_configure
+from utils.serveur_inference import modele_pour
+from utils.jobs import gestionnaire_jobs, FileJobsPleine, TERMINE, ANNULE, ERREUR
+from utils.viewer import CacheVues, rendre_coupes
+from utils.export import exporter_masque
+from utils.mesures import volumes_par_classe
+from utils.classification import LABELS_FR, DIAGNOSTIC_TUMEUR
+from utils.base_donnees import base_donnees
+from utils.historique import resume_segmentation, blobs_segmentation, ouvrir_segmentation
+from utils.metriques import Trace, span, metriques, PANNEAU_ADMIN
+from utils.session_store import store_sessions
+from utils.pipeline import (
+    IMG_SIZE, VOLUME_START_AT, VOLUME_SLICES, ETAPES_SEGMENTATION,
+    apercu_coupe, executer_segmentation
+)
+
 # =========================
 # CONFIGURATION DE LA PAGE
 # =========================
@@ -24,68 +39,100 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Étapes de ce passage de script (celles du job ont leur propre trace).
+# Exportée seulement si une analyse a tourné : ni les relances de l'aperçu
+# ni les mouvements de slider n'écrivent dans le journal
+trace_page = Trace("segmentation", origine="page").activer()
+analyse_lancee = False
+
 # =========================
 # PARAMÈTRES
 # =========================
-IMG_SIZE = 128
-VOLUME_START_AT = 22
-VOLUME_SLICES = 100
+MODEL_PATH = MODELES["segmentation"]
+INTERVALLE_SUIVI_S = 0.5
 
 # =========================
 # SESSION STATE
 # =========================
 if "segmentation_done" not in st.session_state:
     st.session_state.segmentation_done = False
-if "mask" not in st.session_state:
-    st.session_state.mask = None
-if "flair_volume" not in st.session_state:
-    st.session_state.flair_volume = None
-if "t1ce_volume" not in st.session_state:
-    st.session_state.t1ce_volume = None
-if "dx_dy" not in st.session_state:
-    st.session_state.dx_dy = (1, 1)
+if "store_id" not in st.session_state:
+    # Volumes et masque vivent dans le store partagé (budget mémoire global)
+    st.session_state.store_id = uuid.uuid4().hex
+if "espacement" not in st.session_state:
+    st.session_state.espacement = (1, 1, 1)
+if "mesures" not in st.session_state:
+    st.session_state.mesures = None
+if "volumes" not in st.session_state:
+    st.session_state.volumes = None
+if "lesions" not in st.session_state:
+    st.session_state.lesions = None
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
+if "debut_coupes" not in st.session_state:
+    st.session_state.debut_coupes = VOLUME_START_AT
+if "geometrie" not in st.session_state:
+    st.session_state.geometrie = None
+if "export_nifti" not in st.session_state:
+    st.session_state.export_nifti = None
+if "cle_etude" not in st.session_state:
+    st.session_state.cle_etude = None
+if "cache_vues" not in st.session_state:
+    st.session_state.cache_vues = CacheVues()
+
+
+
+def afficher_resultat(resultat, cle):
+    """Installe un résultat (job terminé ou étude rouverte) dans la session."""
+    st.session_state.segmentation_done = True
+    store_sessions().put(
+        st.session_state.store_id,
+        flair=resultat["flair"], t1ce=resultat["t1ce"], mask=resultat["mask"]
+    )
+    st.session_state.espacement = resultat["espacement"]
+    st.session_state.mesures = resultat["mesures"]
+    st.session_state.volumes = resultat["volumes"]
+    st.session_state.lesions = resultat["lesions"]
+    st.session_state.cle_etude = cle
+    st.session_state.debut_coupes = resultat["debut"]
+    st.session_state.geometrie = resultat["geometrie"]
+    st.session_state.export_nifti = None
+
 
 # =========================
-# FONCTIONS
+# HISTORIQUE
 # =========================
-def calculer_mesures_physiques(mask_slice, dx, dy):
-    binary = (mask_slice > 0).astype(np.uint8)
-
-    surface_mm2 = np.sum(binary) * dx * dy
-
-    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    perimetre_pixels = sum(cv2.arcLength(cnt, True) for cnt in contours)
-    perimetre_mm = perimetre_pixels * dx
-
-    surface_totale_mm2 = binary.shape[0] * binary.shape[1] * dx * dy
-    densite = surface_mm2 / surface_totale_mm2 if surface_totale_mm2 > 0 else 0
-
-    return surface_mm2, perimetre_mm, densite
-
-
-def load_and_preprocess_data(flair_path, t1ce_path):
-    flair_img = nib.load(flair_path)
-    t1ce_img = nib.load(t1ce_path)
-
-    flair = flair_img.get_fdata()
-    t1ce = t1ce_img.get_fdata()
-
-    dx, dy, dz = flair_img.header.get_zooms()
-
-    X = np.zeros((VOLUME_SLICES, IMG_SIZE, IMG_SIZE, 2), dtype=np.float32)
-
-    for i in range(VOLUME_SLICES):
-        X[i, :, :, 0] = cv2.resize(
-            flair[:, :, i + VOLUME_START_AT], (IMG_SIZE, IMG_SIZE)
+# Masqué pendant le suivi d'un job : l'aperçu relance le script toutes les
+# INTERVALLE_SUIVI_S secondes, sans refaire la requête en base à chaque fois
+if st.session_state.job_id is None:
+    with st.expander("🗂️ Historique des segmentations"):
+        # Résumés seulement : les masques restent compressés en base jusqu'à l'ouverture
+        seulement_patient = st.session_state.get("patient_id") and st.checkbox(
+            "Patient courant uniquement", value=True
         )
-        X[i, :, :, 1] = cv2.resize(
-            t1ce[:, :, i + VOLUME_START_AT], (IMG_SIZE, IMG_SIZE)
+        resumes = base_donnees().resumes_segmentations(
+            st.session_state.patient_id if seulement_patient else None
         )
-
-    X = X / np.max(X)
-
-    return X, flair, t1ce, (dx, dy)
-
+        if resumes.empty:
+            st.write("Aucune segmentation enregistrée.")
+        else:
+            st.dataframe(
+                pd.DataFrame({
+                    "Étude": resumes["etude_id"],
+                    "Date": resumes["date"],
+                    "Patient": (resumes["prenom"].fillna("") + " " + resumes["nom"].fillna("")).str.strip(),
+                    "Volume tumoral (mm³)": resumes["resume"].map(lambda r: round(r["volumes"]["tumeur"])),
+                    "Lésions": resumes["resume"].map(lambda r: r["lesions"]),
+                    "Taille (Ko)": (resumes["octets"] / 1024).round(1),
+                }),
+                use_container_width=True, hide_index=True
+            )
+            etude_id = st.selectbox("Étude à ouvrir", resumes["etude_id"].tolist())
+            if st.button("📂 Ouvrir l'étude"):
+                analyse_lancee = True
+                with span("historique.ouverture"):
+                    resume, blobs = base_donnees().charger_segmentation(int(etude_id))
+                    afficher_resultat(ouvrir_segmentation(resume, blobs), f"etude-{etude_id}")
 
 # =========================
 # UPLOAD DES FICHIERS
@@ -111,51 +158,190 @@ with col2:
     )
 
 # =========================
-# SEGMENTATION
+# SEGMENTATION (JOB DE FOND)
 # =========================
-if flair_file and t1ce_file:
-    if st.button("🚀 Lancer la segmentation", type="primary", use_container_width=True):
-        with st.spinner("Traitement en cours..."):
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".nii") as f:
-                f.write(flair_file.read())
-                flair_path = f.name
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".nii") as f:
-                f.write(t1ce_file.read())
-                t1ce_path = f.name
+gestionnaire = gestionnaire_jobs()
+
+if flair_file and t1ce_file and st.session_state.job_id is None:
+    with st.expander("⚙️ Options avancées"):
+        taille_bloc = st.select_slider(
+            "Coupes par bloc d'inférence",
+            options=[4, 8, 16, 32, 50, 100],
+            value=TAILLE_BLOC_INFERENCE
+        )
+        candidats = st.checkbox(
+            "Segmenter seulement les coupes avec signal FLAIR suspect",
+            value=False,
+            help="Les coupes sans cerveau sont toujours ignorées ; cette option "
+                 "ignore aussi celles sans hypersignal FLAIR."
+        )
+        apercu_rapide = st.checkbox(
+            "Aperçu rapide puis affinage",
+            value=True,
+            help="Une coupe sur 4 est segmentée d'abord, les autres sont interpolées "
+                 "puis affinées en arrière-plan (mode standard uniquement)."
+        )
+        haute_resolution = st.toggle(
+            "Haute résolution (tuiles sur les coupes natives)",
+            value=False,
+            help="Masque et mesures à la résolution d'origine ; inférence plus lente "
+                 "(plusieurs tuiles 128×128 par coupe)."
+        )
 
-            X, flair, t1ce, voxel_size = load_and_preprocess_data(
-                flair_path, t1ce_path
+    if st.button("🚀 Lancer la segmentation", type="primary", use_container_width=True):
+        analyse_lancee = True
+        # Cache adressé par contenu : mêmes fichiers + même modèle = même masque
+        with span("upload.lecture_hash"):
+            cle = cle_cache(
+                "segmentation", hash_flux(flair_file), hash_flux(t1ce_file),
+                hash_fichier(MODEL_PATH), backend_configure("segmentation"), IMG_SIZE, VOLUME_START_AT, VOLUME_SLICES,
+                "etendue", candidats, "natif" if haute_resolution else "modele"
             )
-
-            import tensorflow as tf
-            from tensorflow import keras
-
-            model = keras.models.load_model(
-                "models/model_x81_dcs65.h5",
-                compile=False
+        try:
+            job = gestionnaire.soumettre(
+                executer_segmentation, flair_file, t1ce_file, cle,
+                lambda: modele_pour("segmentation"), taille_bloc, candidats, haute_resolution,
+                apercu_rapide and not haute_resolution,
+                etapes=ETAPES_SEGMENTATION
             )
-
-            pred = model.predict(X, verbose=0)
-            mask = np.argmax(pred, axis=-1)
-
-            st.session_state.segmentation_done = True
-            st.session_state.mask = mask
-            st.session_state.flair_volume = flair
-            st.session_state.t1ce_volume = t1ce
-            st.session_state.dx_dy = voxel_size
-
-            os.unlink(flair_path)
-            os.unlink(t1ce_path)
+            st.session_state.job_id = job.id
+        except FileJobsPleine as e:
+            st.warning(f"⏳ Serveur occupé : {e}")
+
+# Suivi du job : l'interface reste réactive, le calcul tourne dans un worker
+if st.session_state.job_id is not None:
+    job = gestionnaire.get(st.session_state.job_id)
+
+    if job is None:
+        st.session_state.job_id = None
+    else:
+        if st.button("⛔ Annuler la segmentation", use_container_width=True):
+            job.annuler()
+
+        progression = st.progress(0.0)
+        apercu = st.empty()
+
+        while not job.fini:
+            progression.progress(
+                job.fraction_totale(),
+                text=f"Job {job.id} — étape : {job.etape or 'en attente'}"
+            )
+            partiel = job.partiel
+            if "affinees" in partiel:
+                # Aperçu 3D approximatif : chaque coupe affinée remplace sa valeur interpolée.
+                # Le slider relance le script, qui reprend le suivi du job.
+                affinees = partiel["affinees"]
+                estimation = volumes_par_classe(partiel["mask"], partiel["espacement"])
+                st.caption(
+                    f"Aperçu : {affinees.sum()} / {len(affinees)} coupes affinées — "
+                    f"volume tumoral estimé {estimation['tumeur']:.0f} mm³"
+                )
+                coupe = st.slider(
+                    "Coupe (aperçu)", 0, len(affinees) - 1, min(60, len(affinees) - 1), key="coupe_apercu"
+                )
+                st.image(
+                    apercu_coupe(partiel["flair"][:, :, coupe], partiel["mask"][coupe]),
+                    caption=f"Coupe {coupe} — {'affinée' if affinees[coupe] else 'interpolée'}",
+                    width=350
+                )
+                time.sleep(INTERVALLE_SUIVI_S)
+                # st.rerun() interrompt le script : la trace de ce passage est close avant
+                trace_page.terminer(exporter=analyse_lancee)
+                st.rerun()
+            if partiel:
+                coupe = partiel["coupe"]
+                apercu.image(
+                    apercu_coupe(partiel["flair"][:, :, coupe], partiel["mask"][coupe]),
+                    caption=f"Aperçu coupe {coupe}",
+                    width=350
+                )
+            time.sleep(INTERVALLE_SUIVI_S)
+
+        progression.empty()
+        apercu.empty()
+        st.session_state.job_id = None
+
+        # Le job ne garde pas le masque ni les volumes : ils vivent dans le store de sessions
+        resultat = job.prendre_resultat() if job.etat == TERMINE else None
+        if job.etat == TERMINE and resultat is None:
+            # Résultat non réclamé à temps (onglet fermé), libéré par le gestionnaire
+            st.info("Résultat expiré, relancez la segmentation (le cache de résultats rend ça immédiat).")
+        elif job.etat == TERMINE:
+            analyse_lancee = True
+            afficher_resultat(resultat, resultat["cle"])
+            st.session_state.cache_vues.put(resultat["cle"], resultat["vues"])
+            st.session_state.trace_segmentation = resultat["trace"]
+
+            # Étude enregistrée (rattachée au patient courant s'il y en a un) avec
+            # son résultat compressé : rouvrable plus tard sans relancer le modèle.
+            # Mêmes fichiers relancés (hit du cache) : l'étude existante est réutilisée
+            with span("base.enregistrement"):
+                base = base_donnees()
+                patient_id = st.session_state.get("patient_id")
+                existante = base.etude_par_cle(patient_id, "segmentation", resultat["cle"])
+                if existante is None:
+                    etude_id = base.ajouter_etude(patient_id, "segmentation", resultat["cle"])
+                    volumes = resultat["volumes"]
+                    base.ajouter_analyses(etude_id, [{
+                        "fichier": getattr(flair_file, "name", None),
+                        "diagnostic": DIAGNOSTIC_TUMEUR if volumes["tumeur"] > 0 else LABELS_FR["no_tumor"],
+                        "resultats": {"volumes_mm3": volumes, "lesions": len(resultat["lesions"])},
+                    }])
+                    enregistree = False
+                else:
+                    etude_id, enregistree = existante
+                if not enregistree:
+                    base.enregistrer_segmentation(
+                        etude_id, resume_segmentation(resultat), blobs_segmentation(resultat)
+                    )
+        elif job.etat == ANNULE:
+            st.info("Segmentation annulée.")
+        elif job.etat == ERREUR:
+            st.error(f"Erreur lors de la segmentation : {job.erreur}")
 
 # =========================
 # AFFICHAGE DES RÉSULTATS
 # =========================
+volumes_session = store_sessions().get(st.session_state.store_id) \
+    if st.session_state.segmentation_done else None
+if st.session_state.segmentation_done and volumes_session is None:
+    # Session expirée du store : il faut relancer (le cache de résultats rend ça immédiat)
+    st.session_state.segmentation_done = False
+    st.info("Session expirée, relancez la segmentation pour afficher les résultats.")
+
 if st.session_state.segmentation_done:
 
     st.success("✅ Segmentation terminée")
 
+    # Volumétrie (mm³) sur tout le volume segmenté
+    volumes = st.session_state.volumes
+    v1, v2, v3, v4 = st.columns(4)
+    v1.metric("Volume tumoral (mm³)", f"{volumes['tumeur']:.0f}")
+    v2.metric("Nécrose (mm³)", f"{volumes['necrose']:.0f}")
+    v3.metric("Œdème (mm³)", f"{volumes['oedeme']:.0f}")
+    v4.metric("Zone renforcée (mm³)", f"{volumes['renforcee']:.0f}")
+
+    # Lésions (composantes connexes 3D), calculées une fois avec le masque
+    lesions = st.session_state.lesions
+    with st.expander(f"🎯 Lésions détectées : {len(lesions)}"):
+        if len(lesions):
+            st.dataframe(
+                lesions[[
+                    "lesion", "volume_mm3", "volume_necrose_mm3", "volume_oedeme_mm3",
+                    "volume_renforcee_mm3", "diametre_axial_max_mm", "coupe_diametre_max",
+                    "z_min", "z_max", "centroide_z", "centroide_y", "centroide_x"
+                ]],
+                use_container_width=True, hide_index=True
+            )
+            st.download_button(
+                "📥 Télécharger les lésions (CSV)",
+                data=lesions.to_csv(index=False),
+                file_name="lesions_segmentation.csv",
+                mime="text/csv"
+            )
+        else:
+            st.write("Aucune lésion segmentée.")
+
     slice_id = st.slider(
         "Coupe",
         0,
@@ -163,44 +349,112 @@ if st.session_state.segmentation_done:
         60
     )
 
-    surface, perimetre, densite = calculer_mesures_physiques(
-        st.session_state.mask[slice_id],
-        st.session_state.dx_dy[0],
-        st.session_state.dx_dy[1]
-    )
+    # Mesures calculées une fois par le job, le slider ne fait qu'indexer
+    mesures = st.session_state.mesures
+    ligne = mesures.iloc[slice_id]
 
     c1, c2, c3 = st.columns(3)
-    c1.metric("Surface (mm²)", f"{surface:.2f}")
-    c2.metric("Périmètre (mm)", f"{perimetre:.2f}")
-    c3.metric("Densité", f"{densite:.4f}")
-
-    fig, ax = plt.subplots(1, 3, figsize=(15, 5))
-
-    ax[0].imshow(
-        cv2.resize(
-            st.session_state.flair_volume[:, :, slice_id + VOLUME_START_AT],
-            (IMG_SIZE, IMG_SIZE)
-        ),
-        cmap="gray"
-    )
-    ax[0].set_title("FLAIR")
-    ax[0].axis("off")
-
-    ax[1].imshow(
-        cv2.resize(
-            st.session_state.t1ce_volume[:, :, slice_id + VOLUME_START_AT],
-            (IMG_SIZE, IMG_SIZE)
-        ),
-        cmap="gray"
-    )
-    ax[1].set_title("T1CE")
-    ax[1].axis("off")
+    c1.metric("Surface (mm²)", f"{ligne['tumeur_surface_mm2']:.2f}")
+    c2.metric("Périmètre (mm)", f"{ligne['tumeur_perimetre_mm']:.2f}")
+    c3.metric("Densité", f"{ligne['tumeur_densite']:.4f}")
+
+    with st.expander("📏 Mesures par classe et export"):
+        st.dataframe(
+            pd.DataFrame({
+                nom: [ligne[f"{nom}_surface_mm2"], ligne[f"{nom}_perimetre_mm"], ligne[f"{nom}_densite"]]
+                for nom in ("necrose", "oedeme", "renforcee")
+            }, index=["Surface (mm²)", "Périmètre (mm)", "Densité"]),
+            use_container_width=True
+        )
+        st.download_button(
+            "📥 Télécharger les mesures (CSV)",
+            data=mesures.to_csv(index=False),
+            file_name="mesures_segmentation.csv",
+            mime="text/csv"
+        )
 
-    ax[2].imshow(st.session_state.mask[slice_id], cmap="jet")
-    ax[2].set_title("Segmentation")
-    ax[2].axis("off")
+    with st.expander("💾 Export du masque (NIfTI)"):
+        st.caption(
+            "Masque ramené à la forme et à l'affine du volume FLAIR source "
+            "(labels BraTS : 1 nécrose, 2 œdème, 4 zone renforcée)."
+        )
+        # Encodé une seule fois par étude, pas à chaque mouvement du slider
+        export = st.session_state.export_nifti
+        if st.session_state.geometrie is None:
+            st.write("Géométrie du volume source inconnue pour cette étude.")
+        elif export is None or export[0] != st.session_state.cle_etude:
+            if st.button("Préparer le fichier .nii.gz"):
+                analyse_lancee = True
+                with span("export.nifti"):
+                    donnees = exporter_masque(
+                        volumes_session["mask"], st.session_state.geometrie,
+                        st.session_state.debut_coupes
+                    )
+                export = (st.session_state.cle_etude, donnees)
+                st.session_state.export_nifti = export
+        if export is not None and export[0] == st.session_state.cle_etude:
+            st.download_button(
+                "📥 Télécharger le masque (.nii.gz)",
+                data=export[1],
+                file_name="masque_segmentation.nii.gz",
+                mime="application/gzip"
+            )
+
+    # Coupes pré-rendues après la segmentation : un slider = une image, sans matplotlib
+    vues = st.session_state.cache_vues.get(st.session_state.cle_etude)
+    if vues is None:
+        with span("affichage.coupes_png"):
+            vues = rendre_coupes(
+                volumes_session["flair"], volumes_session["t1ce"], volumes_session["mask"]
+            )
+        st.session_state.cache_vues.put(st.session_state.cle_etude, vues)
+
+    with span("affichage.coupe"):
+        st.image(
+            vues[slice_id],
+            caption=f"FLAIR  |  T1CE  |  Segmentation (coupe {slice_id}, "
+                    f"coupe {st.session_state.debut_coupes + slice_id} du volume)",
+            width=900
+        )
+
+stats_cache = cache_resultats().stats()
+st.sidebar.caption(
+    f"Cache : {stats_cache['hits']} hits / {stats_cache['misses']} misses "
+    f"({stats_cache['entrees']} entrées)"
+)
+stats_store = store_sessions().stats()
+st.sidebar.caption(
+    f"Sessions : {stats_store['octets_memoire'] / 2**20:.0f} / {stats_store['budget_octets'] / 2**20:.0f} Mo en mémoire, "
+    f"{stats_store['sur_disque']} sur disque"
+)
+stats_jobs = gestionnaire.stats()
+st.sidebar.caption(
+    f"Jobs : {stats_jobs['en cours']} en cours / {stats_jobs['en attente']} en attente"
+)
 
-    st.pyplot(fig)
+trace_page.terminer(exporter=analyse_lancee)
+
+# =========================
+# PANNEAU ADMIN (BT_ADMIN=1)
+# =========================
+if PANNEAU_ADMIN:
+    with st.sidebar.expander("🛠️ Performances par étape"):
+        derniere = st.session_state.get("trace_segmentation")
+        if derniere:
+            st.caption(f"Dernière segmentation : {derniere['duree_ms'] / 1000:.2f} s")
+            st.dataframe(
+                pd.DataFrame(derniere["spans"]).groupby("etape", sort=False)
+                .agg(appels=("duree_ms", "size"), duree_ms=("duree_ms", "sum"),
+                     pic_memoire_mo=("pic_memoire_mo", "max")),
+                use_container_width=True
+            )
+        etapes = metriques().etapes("segmentation")
+        if etapes:
+            st.caption("Depuis le démarrage du serveur (p50 / p99 sur les dernières exécutions)")
+            st.dataframe(
+                pd.DataFrame(etapes).drop(columns="page").round(2),
+                use_container_width=True, hide_index=True
+            )
 
 # =========================
 # RETOUR
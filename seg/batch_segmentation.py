@@ -0,0 +1,202 @@
+"""
+Segmentation en lot (sans interface) d'un dossier de cas BraTS.
+
+Le prétraitement (lecture NIfTI + redimensionnement) tourne sur un pool de
+processus pendant que le modèle consomme des batchs multi-cas. Pour chaque
+cas : masque uint8 (.npz) + ligne de métriques dans metrics.csv.
+
+Exécution (depuis la racine du projet) :
+    python seg/batch_segmentation.py /data/BraTS2020_TrainingData sortie/
+    python seg/batch_segmentation.py manifest.csv sortie/ --workers 8 --cas-par-batch 4
+
+Manifest CSV : colonnes case_id, flair, t1ce.
+"""
+import argparse
+import csv
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ingest import charger_coupes
+from utils.extent import fenetre_coupes, coupes_actives
+from utils.resample import preparer_entree
+from utils.inference import segmenter_par_blocs
+from utils.pipeline import IMG_SIZE, VOLUME_START_AT, VOLUME_SLICES
+from utils.mesures import CLASSES, espacement_modele, tableau_mesures, volumes_par_classe
+from utils.backends import BACKENDS
+
+
+# =========================
+# DÉCOUVERTE DES CAS
+# =========================
+def lister_cas(source):
+    """Renvoie une liste de (case_id, flair_path, t1ce_path)."""
+    if os.path.isfile(source):
+        with open(source, newline="") as f:
+            return [(r["case_id"], r["flair"], r["t1ce"]) for r in csv.DictReader(f)]
+
+    cas = []
+    motif = os.path.join(source, "**", "*flair.nii*")
+    for flair_path in sorted(glob.glob(motif, recursive=True)):
+        t1ce_path = flair_path.replace("flair.nii", "t1ce.nii")
+        if not os.path.exists(t1ce_path):
+            print(f"[!] T1CE introuvable pour {flair_path}, cas ignoré")
+            continue
+        case_id = os.path.basename(flair_path).split("flair.nii")[0].rstrip("_-") \
+            or os.path.basename(os.path.dirname(flair_path))
+        cas.append((case_id, flair_path, t1ce_path))
+    return cas
+
+
+# =========================
+# PRÉTRAITEMENT (PROCESSUS)
+# =========================
+def preparer_cas(cas, candidats=False):
+    case_id, flair_path, t1ce_path = cas
+    t0 = time.perf_counter()
+    debut = fenetre_coupes(flair_path, VOLUME_SLICES, VOLUME_START_AT)
+    flair, zooms = charger_coupes(flair_path, debut, VOLUME_SLICES)
+    t1ce, _ = charger_coupes(t1ce_path, debut, VOLUME_SLICES)
+    # Coupes sans cerveau (ou sans signal suspect) : fond, pas d'inférence
+    actives = coupes_actives(flair, candidats)
+    t1 = time.perf_counter()
+    # Un seul thread par processus : le parallélisme vient du pool
+    X = preparer_entree([flair, t1ce], IMG_SIZE, max_workers=1)
+    t2 = time.perf_counter()
+
+    # Espacement des voxels dans l'espace du modèle (coupes redimensionnées)
+    espacement = espacement_modele(zooms, flair.shape, IMG_SIZE)
+    return case_id, X, actives, espacement, {"ingest": t1 - t0, "resample": t2 - t1}
+
+
+# =========================
+# MÉTRIQUES
+# =========================
+def metriques_cas(mask, espacement):
+    surfaces = tableau_mesures(mask, espacement)["tumeur_surface_mm2"].to_numpy()
+    volumes = volumes_par_classe(mask, espacement)
+
+    ligne = {
+        "volume_total_mm3": volumes["tumeur"],
+        "surface_max_mm2": float(surfaces.max()),
+        "coupe_surface_max": int(np.argmax(surfaces)),
+    }
+    for nom in CLASSES.values():
+        ligne[f"volume_{nom}_mm3"] = volumes[nom]
+    return ligne
+
+
+# =========================
+# BOUCLE PRINCIPALE
+# =========================
+def traiter_batch(model, batch, sortie, taille_bloc, writer, durees, comptes):
+    # Seules les coupes actives de tous les cas du batch passent par le modèle
+    X = np.concatenate([item[1][item[2]] for item in batch], axis=0)
+    indices = np.flatnonzero(np.concatenate([item[2] for item in batch]))
+    n_total = sum(len(item[1]) for item in batch)
+
+    t0 = time.perf_counter()
+    mask = np.zeros((n_total,) + X.shape[1:3], dtype=np.uint8)
+    for start, stop, bloc in segmenter_par_blocs(model, X, taille_bloc, centre_d_abord=False):
+        mask[indices[start:stop]] = bloc
+    durees["infer"] += time.perf_counter() - t0
+    comptes["coupes"] += len(indices)
+    comptes["coupes_ignorees"] += n_total - len(indices)
+
+    t0 = time.perf_counter()
+    debut = 0
+    for case_id, X_cas, _, espacement, d in batch:
+        fin = debut + len(X_cas)
+        mask_cas = mask[debut:fin]
+        debut = fin
+
+        np.savez_compressed(os.path.join(sortie, f"{case_id}_mask.npz"), mask=mask_cas)
+        writer.writerow({"case_id": case_id, **metriques_cas(mask_cas, espacement)})
+        for etape, duree in d.items():
+            durees[etape] += duree
+    durees["write"] += time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmentation en lot de cas BraTS (FLAIR + T1CE)")
+    parser.add_argument("source", help="dossier de cas ou manifest CSV (case_id, flair, t1ce)")
+    parser.add_argument("sortie", help="dossier de sortie (masques + metrics.csv)")
+    parser.add_argument("--model", default="models/model_x81_dcs65.h5")
+    parser.add_argument("--backend", choices=BACKENDS, help="défaut : BT_BACKEND_SEGMENTATION ou keras")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--cas-par-batch", type=int, default=2)
+    parser.add_argument("--taille-bloc", type=int, default=32, help="coupes par appel au modèle")
+    parser.add_argument("--prefetch", type=int, default=4, help="cas prétraités d'avance")
+    parser.add_argument("--candidats", action="store_true",
+                        help="segmenter seulement les coupes avec signal FLAIR suspect")
+    args = parser.parse_args()
+
+    cas = lister_cas(args.source)
+    if not cas:
+        sys.exit(f"Aucun cas trouvé dans {args.source}")
+    os.makedirs(args.sortie, exist_ok=True)
+
+    from utils.models import charger_modele
+    model = charger_modele("segmentation", args.model, args.backend)
+    print(f"==> {len(cas)} cas, {args.workers} workers de prétraitement")
+
+    durees = {"ingest": 0.0, "resample": 0.0, "infer": 0.0, "write": 0.0}
+    comptes = {"coupes": 0, "coupes_ignorees": 0}
+    colonnes = ["case_id", "volume_total_mm3", "surface_max_mm2", "coupe_surface_max"] + \
+        [f"volume_{nom}_mm3" for nom in CLASSES.values()]
+
+    t_debut = time.perf_counter()
+    fait = 0
+    with open(os.path.join(args.sortie, "metrics.csv"), "w", newline="") as f, \
+            ProcessPoolExecutor(
+                max_workers=args.workers,
+                # TensorFlow est déjà initialisé (threads, modèle) : fork pourrait
+                # bloquer les workers et copierait le modèle dans chacun
+                mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+        writer = csv.DictWriter(f, fieldnames=colonnes)
+        writer.writeheader()
+
+        # File bornée de futures : le prétraitement garde `prefetch` cas d'avance
+        a_soumettre = iter(cas)
+        en_cours = deque()
+        for item in a_soumettre:
+            en_cours.append(pool.submit(preparer_cas, item, args.candidats))
+            if len(en_cours) >= args.prefetch + args.cas_par_batch:
+                break
+
+        batch = []
+        while en_cours:
+            try:
+                batch.append(en_cours.popleft().result())
+            except Exception as e:
+                print(f"[!] Échec du prétraitement : {e}")
+            prochain = next(a_soumettre, None)
+            if prochain is not None:
+                en_cours.append(pool.submit(preparer_cas, prochain, args.candidats))
+
+            if batch and (len(batch) >= args.cas_par_batch or not en_cours):
+                traiter_batch(model, batch, args.sortie, args.taille_bloc, writer, durees, comptes)
+                fait += len(batch)
+                ecoule = time.perf_counter() - t_debut
+                print(f"  {fait}/{len(cas)} cas — {fait / ecoule:.2f} cas/s")
+                batch = []
+
+    ecoule = time.perf_counter() - t_debut
+    print(f"==> {fait} cas en {ecoule:.1f}s ({fait / ecoule:.2f} cas/s)")
+    print(f"    Coupes segmentées : {comptes['coupes']}, ignorées (hors cerveau) : {comptes['coupes_ignorees']}")
+    print("    Temps cumulés par étape (prétraitement parallélisé sur les workers) :")
+    for etape, duree in durees.items():
+        print(f"    - {etape:8s}: {duree:8.2f}s ({duree / max(fait, 1) * 1000:.0f} ms/cas)")
+
+
+if __name__ == "__main__":
+    main()
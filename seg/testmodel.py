@@ -1,11 +1,20 @@
-import numpy as np
-import nibabel as nib
+import os
+import sys
+from collections import namedtuple
 import cv2
-import keras
-import tensorflow as tf
-import matplotlib.pyplot as plt
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.resample import preparer_entree
+from utils.extent import fenetre_coupes, coupes_actives
+from utils.inference import segmenter_volume
+from utils.pipeline import charger_volumes
+from utils.mesures import tableau_mesures, volumes_par_classe
+from utils.models import charger_keras
+from utils.travailleur_tk import TravailleurTk
 
 # -----------------------------
 # PARAMÈTRES
@@ -14,25 +23,17 @@ IMG_SIZE = 128
 VOLUME_START_AT = 22
 VOLUME_SLICES = 100
 SLICE_ID = 60   # slice affiché
+MODEL_PATH = "model_x81_dcs65.h5"
+
+Resultat = namedtuple("Resultat", "nom flair_coupe mask_coupe debut mesures volumes n_actives")
 
 # -----------------------------
-# Charger le modèle
+# Charger le modèle (worker, en arrière-plan : la fenêtre s'ouvre sans l'attendre)
 # -----------------------------
-model = keras.models.load_model(
-    "model_x81_dcs65.h5",
-    custom_objects={
-        "dice_coef": None,
-        "precision": None,
-        "sensitivity": None,
-        "specificity": None,
-        "dice_coef_necrotic": None,
-        "dice_coef_edema": None,
-        "dice_coef_enhancing": None
-    },
-    compile=False
-)
-
-print("==> Modèle chargé.")
+def charger_modele():
+    model = charger_keras("segmentation", MODEL_PATH)
+    print("==> Modèle chargé.")
+    return model
 
 # -----------------------------
 # Variables globales
@@ -40,31 +41,6 @@ print("==> Modèle chargé.")
 flair_path = None
 t1ce_path = None
 
-# -----------------------------
-# Mesures physiques (mm/mm²)
-# -----------------------------
-def calculer_mesures_physiques(mask_slice, dx, dy):
-    """
-    mask_slice : 2D (128x128) mask
-    dx, dy : taille du voxel en mm
-    """
-    # Binaire : tumeur = 1
-    binary = (mask_slice > 0).astype(np.uint8)
-
-    # Surface en mm²
-    surface_mm2 = np.sum(binary) * dx * dy
-
-    # Contours pour périmètre
-    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    perimetre_pixels = sum(cv2.arcLength(cnt, closed=True) for cnt in contours)
-    perimetre_mm = perimetre_pixels * dx  # si dx ≈ dy
-
-    # Densité tumorale (ratio)
-    surface_totale_mm2 = binary.shape[0] * binary.shape[1] * dx * dy
-    densite = surface_mm2 / surface_totale_mm2 if surface_totale_mm2 > 0 else 0
-
-    return surface_mm2, perimetre_mm, densite
-
 # -----------------------------
 # Fonctions GUI
 # -----------------------------
@@ -86,6 +62,38 @@ def choisir_t1ce():
     if t1ce_path:
         label_t1ce.config(text=t1ce_path)
 
+def segmenter_cas(model, rapporter, flair_path, t1ce_path):
+    """Exécuté dans le worker : aucune opération Tk ici."""
+    nom = os.path.basename(flair_path)
+
+    # Fenêtre de coupes centrée sur le cerveau si la géométrie n'est pas celle de BraTS
+    rapporter(0.0, f"{nom} : lecture des volumes")
+    debut = fenetre_coupes(flair_path, VOLUME_SLICES, VOLUME_START_AT)
+    # Seules les coupes utilisées sont lues ; taille des voxels du masque en mm
+    flair, t1ce, espacement = charger_volumes(flair_path, t1ce_path, debut)
+
+    # Préparer les slices (redimensionnement par lots + normalisation en place)
+    rapporter(0.1, f"{nom} : prétraitement")
+    X = preparer_entree([flair, t1ce], IMG_SIZE)
+
+    # Prédiction sur les coupes contenant du cerveau uniquement (les autres = fond)
+    actives = coupes_actives(flair)
+
+    def avancer(mask, start, stop, fraction):
+        rapporter(0.15 + 0.8 * fraction, f"{nom} : segmentation ({fraction:.0%})")
+
+    mask = segmenter_volume(model, X, callback=avancer, actives=actives)
+    print(f"==> {nom} : {actives.sum()}/{len(actives)} coupes segmentées")
+
+    # Mesures physiques : mêmes fonctions que la page Segmentation
+    mesures = tableau_mesures(mask, espacement).iloc[SLICE_ID]
+    volumes = volumes_par_classe(mask, espacement)
+    rapporter(1.0, f"{nom} : terminé")
+    return Resultat(
+        nom, cv2.resize(flair[:, :, SLICE_ID], (IMG_SIZE, IMG_SIZE)), mask[SLICE_ID],
+        debut, mesures, volumes, int(actives.sum())
+    )
+
 def lancer_segmentation():
     if flair_path is None or t1ce_path is None:
         messagebox.showerror(
@@ -94,70 +102,68 @@ def lancer_segmentation():
         )
         return
 
-    # Charger les volumes
-    flair_img = nib.load(flair_path)
-    t1ce_img  = nib.load(t1ce_path)
-    flair = flair_img.get_fdata()
-    t1ce  = t1ce_img.get_fdata()
+    # Plusieurs cas peuvent être mis en file : ils sont traités l'un après l'autre
+    travailleur.soumettre(
+        segmenter_cas, flair_path, t1ce_path,
+        progression=afficher_progression, termine=afficher_resultat, erreur=afficher_erreur
+    )
+    maj_file()
 
-    # Taille des voxels en mm
-    dx, dy, dz = flair_img.header.get_zooms()
+def afficher_progression(fraction, texte):
+    progress["value"] = 100 * fraction
+    label_statut.config(text=texte)
 
-    # Préparer les slices
-    X = np.zeros((VOLUME_SLICES, IMG_SIZE, IMG_SIZE, 2), dtype=np.float32)
+def afficher_erreur(e):
+    label_statut.config(text="Erreur")
+    maj_file()
+    messagebox.showerror("Erreur", str(e))
 
-    for i in range(VOLUME_SLICES):
-        X[i, :, :, 0] = cv2.resize(
-            flair[:, :, i + VOLUME_START_AT],
-            (IMG_SIZE, IMG_SIZE)
-        )
-        X[i, :, :, 1] = cv2.resize(
-            t1ce[:, :, i + VOLUME_START_AT],
-            (IMG_SIZE, IMG_SIZE)
-        )
+def modele_pret(duree):
+    label_modele.config(text=f"Modèle chargé ({duree:.1f} s)")
 
-    # Normalisation
-    X = X / np.max(X)
-
-    # Prédiction
-    pred = model.predict(X, verbose=1)
-    mask = np.argmax(pred, axis=-1)
-
-    # Calcul des mesures physiques
-    surface_mm2, perimetre_mm, densite = calculer_mesures_physiques(mask[SLICE_ID], dx, dy)
-
-    # -----------------------------
-    # Affichage
-    # -----------------------------
-    plt.figure(figsize=(14, 6))
-
-    plt.subplot(1, 2, 1)
-    plt.title("FLAIR")
-    plt.imshow(
-        cv2.resize(
-            flair[:, :, SLICE_ID + VOLUME_START_AT],
-            (IMG_SIZE, IMG_SIZE)
-        ),
-        cmap="gray"
-    )
-    plt.axis("off")
+def modele_echec(e):
+    label_modele.config(text=f"Échec du chargement du modèle : {e}")
+
+def maj_file():
+    n = travailleur.en_attente
+    label_file.config(text=f"{n} cas en file" if n else "File vide")
+
+# -----------------------------
+# Affichage (thread Tk) : une fenêtre par cas, sans bloquer l'interface
+# -----------------------------
+def afficher_resultat(resultat):
+    maj_file()
+    mesures = resultat.mesures
 
-    plt.subplot(1, 2, 2)
-    plt.title("Segmentation prédite")
-    plt.imshow(mask[SLICE_ID], cmap="jet", alpha=0.7)
-    plt.axis("off")
+    fenetre = tk.Toplevel(root)
+    fenetre.title(f"{resultat.nom} — coupe {SLICE_ID + resultat.debut}")
+
+    fig = Figure(figsize=(14, 6))
+
+    ax = fig.add_subplot(1, 2, 1)
+    ax.set_title("FLAIR")
+    ax.imshow(resultat.flair_coupe, cmap="gray")
+    ax.axis("off")
+
+    ax = fig.add_subplot(1, 2, 2)
+    ax.set_title("Segmentation prédite")
+    ax.imshow(resultat.mask_coupe, cmap="jet", alpha=0.7)
+    ax.axis("off")
 
     # Texte des mesures
-    plt.figtext(
+    fig.text(
         0.5, 0.02,
-        f"Surface: {surface_mm2:.2f} mm² | "
-        f"Périmètre: {perimetre_mm:.2f} mm | "
-        f"Densité: {densite:.4f}",
+        f"Surface: {mesures['tumeur_surface_mm2']:.2f} mm² | "
+        f"Périmètre: {mesures['tumeur_perimetre_mm']:.2f} mm | "
+        f"Densité: {mesures['tumeur_densite']:.4f} | "
+        f"Volume tumoral: {resultat.volumes['tumeur']:.0f} mm³",
         ha="center",
         fontsize=12
     )
 
-    plt.show()
+    canvas = FigureCanvasTkAgg(fig, master=fenetre)
+    canvas.draw()
+    canvas.get_tk_widget().pack(fill="both", expand=True)
 
 # -----------------------------
 # Interface Tkinter
@@ -168,6 +174,9 @@ root.title("Segmentation de tumeur cérébrale")
 frame = tk.Frame(root, padx=10, pady=10)
 frame.pack()
 
+label_modele = tk.Label(frame, text="Chargement du modèle en arrière-plan…", fg="#64748b")
+label_modele.pack(pady=(0, 10))
+
 btn_flair = tk.Button(frame, text="Choisir FLAIR (.nii)", command=choisir_flair)
 btn_flair.pack(fill="x")
 
@@ -189,4 +198,15 @@ btn_run = tk.Button(
 )
 btn_run.pack(fill="x", pady=15)
 
+progress = ttk.Progressbar(frame, maximum=100)
+progress.pack(fill="x")
+
+label_statut = tk.Label(frame, text="")
+label_statut.pack()
+
+label_file = tk.Label(frame, text="File vide", fg="#64748b")
+label_file.pack()
+
+travailleur = TravailleurTk(root, charger_modele, pret=modele_pret, echec=modele_echec)
+
 root.mainloop()
@@ -0,0 +1,170 @@
+"""
+Réglage automatique de l'inférence CPU sur la machine courante.
+
+Mesure le débit de chaque modèle (graphes à signature fixe, utils/compilation.py)
+pour plusieurs pools de threads TensorFlow, tailles de batch et avec ou sans
+XLA, puis écrit le meilleur profil. Les pages le chargent au démarrage
+(utils/models.py) ; sans profil, les réglages par défaut de TF s'appliquent.
+
+Les pools de threads ne se règlent qu'une fois par processus : chaque
+configuration de threads est mesurée dans un sous-processus.
+
+Lancement (depuis la racine du projet) :
+    python -m utils.autotune
+    python -m utils.autotune --modeles classification --batch 8 16 32 64 --sans-xla
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from utils.compilation import PROFIL_INFERENCE
+from utils.models import MODELES
+
+# =========================
+# PARAMÈTRES
+# =========================
+DUREE_MESURE_S = 3.0
+
+
+def grille_threads(n_coeurs):
+    """(intra_op, inter_op) essayés : de quelques cœurs à tous, 1 ou 2 pools inter-op."""
+    intras = sorted({max(1, n_coeurs // d) for d in (4, 2, 1)})
+    return [(intra, inter) for intra in intras for inter in (1, 2)]
+
+
+# =========================
+# ESSAI (SOUS-PROCESSUS)
+# =========================
+def essai(intra_op, inter_op, modeles, batchs, xla_options, duree):
+    """Débit (échantillons/s) de chaque (modèle, batch, xla) pour une config de threads."""
+    from utils.compilation import appliquer_threads, ModeleCompile
+    appliquer_threads(intra_op, inter_op)
+    from utils.models import charger_modele
+
+    resultats = {}
+    for nom in modeles:
+        model = charger_modele(nom, backend="keras", compiler=False)
+        forme = tuple(model.input_shape[1:])
+        resultats[nom] = []
+        for xla in xla_options:
+            for batch in batchs:
+                try:
+                    compile_ = ModeleCompile(model, batch, xla)
+                    entree = np.random.default_rng(0).random((batch,) + forme, dtype=np.float32)
+                    compile_.predict_on_batch(entree)   # traçage + compilation
+                    n, t0 = 0, time.perf_counter()
+                    while time.perf_counter() - t0 < duree:
+                        compile_.predict_on_batch(entree)
+                        n += batch
+                    debit = n / (time.perf_counter() - t0)
+                except Exception as e:
+                    print(f"[!] {nom} batch={batch} xla={xla} : {e}", file=sys.stderr)
+                    continue
+                resultats[nom].append({"batch": batch, "xla": xla, "debit": debit})
+    return resultats
+
+
+def lancer_essai(intra_op, inter_op, args):
+    commande = [
+        sys.executable, "-m", "utils.autotune", "--essai", str(intra_op), str(inter_op),
+        "--modeles", *args.modeles, "--batch", *map(str, args.batch),
+        "--duree", str(args.duree),
+    ]
+    if args.sans_xla:
+        commande.append("--sans-xla")
+    sortie = subprocess.run(commande, capture_output=True, text=True)
+    if sortie.returncode != 0:
+        print(f"[!] Essai intra={intra_op} inter={inter_op} en échec :\n{sortie.stderr[-2000:]}")
+        return None
+    # Le résultat JSON est la dernière ligne de la sortie standard
+    return json.loads(sortie.stdout.strip().splitlines()[-1])
+
+
+# =========================
+# CHOIX DU PROFIL
+# =========================
+def choisir_profil(mesures):
+    """
+    Les threads sont communs à tous les modèles : on garde la config dont la
+    moyenne géométrique des débits relatifs (meilleur batch / XLA de chaque
+    modèle, rapporté au meilleur débit toutes configs confondues) est maximale.
+    """
+    noms = {nom for _, res in mesures for nom in res}
+    meilleurs = {
+        nom: max((r["debit"] for _, res in mesures for r in res.get(nom, [])), default=0.0)
+        for nom in noms
+    }
+
+    def score(res):
+        relatifs = [
+            max((r["debit"] for r in res.get(nom, [])), default=0.0) / meilleurs[nom]
+            for nom in noms if meilleurs[nom] > 0
+        ]
+        return float(np.prod(relatifs) ** (1 / len(relatifs))) if relatifs else 0.0
+
+    (intra_op, inter_op), res = max(mesures, key=lambda m: score(m[1]))
+    profil = {"intra_op": intra_op, "inter_op": inter_op}
+    for nom in noms:
+        if res.get(nom):
+            meilleur = max(res[nom], key=lambda r: r["debit"])
+            profil[nom] = {"batch": meilleur["batch"], "xla": meilleur["xla"],
+                           "debit": round(meilleur["debit"], 1)}
+    return profil
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réglage automatique des threads et batchs d'inférence")
+    parser.add_argument("--modeles", nargs="+", choices=list(MODELES), default=list(MODELES))
+    parser.add_argument("--batch", type=int, nargs="+", default=[8, 16, 32, 64])
+    parser.add_argument("--threads", type=int, nargs="+", help="valeurs intra_op à essayer")
+    parser.add_argument("--sans-xla", action="store_true", help="ne pas essayer XLA")
+    parser.add_argument("--duree", type=float, default=DUREE_MESURE_S, help="secondes par mesure")
+    parser.add_argument("--sortie", default=PROFIL_INFERENCE)
+    parser.add_argument("--essai", type=int, nargs=2, metavar=("INTRA", "INTER"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    xla_options = [False] if args.sans_xla else [False, True]
+    if args.essai:
+        resultats = essai(*args.essai, args.modeles, args.batch, xla_options, args.duree)
+        print(json.dumps(resultats))
+        return
+
+    n_coeurs = os.cpu_count() or 1
+    grille = [(t, i) for t in args.threads for i in (1, 2)] if args.threads else grille_threads(n_coeurs)
+    print(f"==> {n_coeurs} cœurs, {len(grille)} configurations de threads, "
+          f"batchs {args.batch}, XLA {'non' if args.sans_xla else 'oui/non'}")
+
+    mesures = []
+    for intra_op, inter_op in grille:
+        res = lancer_essai(intra_op, inter_op, args)
+        if res is None:
+            continue
+        mesures.append(((intra_op, inter_op), res))
+        for nom, lignes in res.items():
+            if lignes:
+                m = max(lignes, key=lambda r: r["debit"])
+                print(f"  intra={intra_op:3d} inter={inter_op} {nom:15s} "
+                      f"{m['debit']:8.1f} éch./s (batch {m['batch']}, xla {m['xla']})")
+
+    if not mesures:
+        sys.exit("Aucune configuration n'a pu être mesurée")
+
+    profil = choisir_profil(mesures)
+    profil["hote"] = {
+        "machine": platform.node(),
+        "coeurs": n_coeurs,
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(args.sortie, "w") as f:
+        json.dump(profil, f, indent=2)
+    print(f"==> Profil écrit dans {args.sortie} : {json.dumps({k: v for k, v in profil.items() if k != 'hote'})}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import os
+import threading
+
+import numpy as np
+
+# =========================
+# PARAMÈTRES
+# =========================
+# keras : modèle .h5 d'origine ; tflite_* : modèle converti pour le CPU
+BACKENDS = ("keras", "tflite_float32", "tflite_float16", "tflite_int8")
+BACKEND_DEFAUT = "keras"
+THREADS_TFLITE = int(os.environ.get("BT_TFLITE_THREADS", os.cpu_count() or 1))
+
+
+def backend_configure(nom):
+    """Backend choisi pour un modèle : variable BT_BACKEND_<NOM> (ex. BT_BACKEND_CLASSIFICATION=tflite_int8)."""
+    backend = os.environ.get(f"BT_BACKEND_{nom.upper()}", BACKEND_DEFAUT)
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend inconnu pour {nom} : {backend} (choix : {', '.join(BACKENDS)})")
+    return backend
+
+
+def chemin_tflite(path_keras, backend):
+    """models/effnet.h5 + tflite_int8 -> models/effnet.int8.tflite"""
+    return f"{os.path.splitext(path_keras)[0]}.{backend.split('_', 1)[1]}.tflite"
+
+
+# =========================
+# CONVERSION
+# =========================
+def convertir_tflite(model, backend):
+    """
+    Convertit un modèle Keras en TFLite et renvoie les octets du modèle.
+
+    - tflite_float32 : conversion seule
+    - tflite_float16 : poids stockés en float16 (calcul en float32)
+    - tflite_int8    : quantification dynamique des poids en int8,
+                       sans jeu de calibration
+    """
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if backend == "tflite_float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif backend == "tflite_int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif backend != "tflite_float32":
+        raise ValueError(f"Pas de conversion TFLite pour le backend {backend}")
+    return converter.convert()
+
+
+def exporter_tflite(model, path_keras, backend):
+    """Convertit puis écrit le modèle à côté du .h5 ; renvoie le chemin écrit."""
+    path = chemin_tflite(path_keras, backend)
+    contenu = convertir_tflite(model, backend)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(contenu)
+    os.replace(tmp, path)
+    return path
+
+
+# =========================
+# EXÉCUTION
+# =========================
+def _interpreteur(path, threads):
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path, num_threads=threads)
+
+
+class ModeleTFLite:
+    """
+    Modèle TFLite avec l'interface utilisée par le reste du code
+    (`predict_on_batch`, `predict`, `input_shape`).
+
+    L'interpréteur n'est pas thread-safe : les appels sont sérialisés.
+    La taille de batch d'entrée est ajustée à la demande.
+    """
+
+    def __init__(self, path, threads=THREADS_TFLITE):
+        self.path = path
+        self._interpreteur = _interpreteur(path, threads)
+        self._interpreteur.allocate_tensors()
+        self._entree = self._interpreteur.get_input_details()[0]
+        self._sortie = self._interpreteur.get_output_details()[0]
+        self._batch = int(self._entree["shape"][0])
+        self._verrou = threading.Lock()
+
+    @property
+    def input_shape(self):
+        return (None,) + tuple(int(d) for d in self._entree["shape"][1:])
+
+    def predict_on_batch(self, entree):
+        entree = np.ascontiguousarray(entree, dtype=self._entree["dtype"])
+        with self._verrou:
+            if len(entree) != self._batch:
+                self._interpreteur.resize_tensor_input(
+                    self._entree["index"], (len(entree),) + tuple(entree.shape[1:])
+                )
+                self._interpreteur.allocate_tensors()
+                self._batch = len(entree)
+            self._interpreteur.set_tensor(self._entree["index"], entree)
+            self._interpreteur.invoke()
+            return self._interpreteur.get_tensor(self._sortie["index"]).copy()
+
+    def predict(self, entree, verbose=0):
+        return self.predict_on_batch(entree)
+
+
+def charger_backend(backend, path_keras, charger_keras, threads=None):
+    """
+    Modèle prêt à prédire pour `backend`.
+
+    Le .tflite est réutilisé s'il existe et est plus récent que le .h5 ; sinon
+    le modèle Keras (`charger_keras()`) est converti une fois et écrit sur disque.
+    """
+    if backend == "keras":
+        return charger_keras()
+
+    path = chemin_tflite(path_keras, backend)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(path_keras):
+        exporter_tflite(charger_keras(), path_keras, backend)
+        print(f"==> Modèle converti : {path}")
+    return ModeleTFLite(path, threads or THREADS_TFLITE)
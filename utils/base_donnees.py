@@ -0,0 +1,393 @@
+"""
+Base SQLite des patients, études et analyses.
+
+Un seul thread écrit : les écritures concurrentes des sessions sont groupées
+en une transaction (une seule synchronisation disque par lot). Les lectures
+passent par une connexion par thread (mode WAL : lectures et écriture en
+parallèle).
+
+Import ponctuel des anciennes fiches JSON (data/patient_*.json) :
+    python -m utils.base_donnees importer data/
+"""
+import argparse
+import glob
+import json
+import os
+import queue
+import sqlite3
+import threading
+import unicodedata
+from datetime import date
+
+import pandas as pd
+
+# =========================
+# PARAMÈTRES
+# =========================
+CHEMIN_BASE = os.environ.get("BT_DB_PATH", "data/brain_tumor.db")
+LOT_ECRITURE_MAX = 256        # requêtes par transaction
+ATTENTE_LOT_MS = 5            # fenêtre de regroupement des écritures
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    id            INTEGER PRIMARY KEY,
+    nom           TEXT NOT NULL,
+    prenom        TEXT NOT NULL,
+    nom_cle       TEXT NOT NULL,      -- minuscules sans accents, pour la recherche
+    prenom_cle    TEXT NOT NULL,
+    email         TEXT,
+    age           INTEGER,
+    telephone     TEXT,
+    adresse       TEXT,
+    commentaires  TEXT,
+    date          TEXT NOT NULL,      -- AAAA-MM-JJ
+    source        TEXT UNIQUE         -- fiche JSON importée (import idempotent)
+);
+CREATE INDEX IF NOT EXISTS idx_patients_nom ON patients (nom_cle, prenom_cle);
+CREATE INDEX IF NOT EXISTS idx_patients_prenom ON patients (prenom_cle);
+CREATE INDEX IF NOT EXISTS idx_patients_date ON patients (date);
+
+CREATE TABLE IF NOT EXISTS etudes (
+    id          INTEGER PRIMARY KEY,
+    patient_id  INTEGER REFERENCES patients (id) ON DELETE CASCADE,
+    type        TEXT NOT NULL,        -- segmentation | classification
+    date        TEXT NOT NULL,
+    cle         TEXT                  -- clé du cache de résultats
+);
+CREATE INDEX IF NOT EXISTS idx_etudes_patient ON etudes (patient_id, date);
+CREATE INDEX IF NOT EXISTS idx_etudes_date ON etudes (date);
+CREATE INDEX IF NOT EXISTS idx_etudes_cle ON etudes (cle);
+
+CREATE TABLE IF NOT EXISTS analyses (
+    id          INTEGER PRIMARY KEY,
+    etude_id    INTEGER NOT NULL REFERENCES etudes (id) ON DELETE CASCADE,
+    fichier     TEXT,
+    diagnostic  TEXT,
+    confiance   REAL,
+    resultats   TEXT                  -- JSON (volumes, probabilités...)
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_etude ON analyses (etude_id);
+CREATE INDEX IF NOT EXISTS idx_analyses_diagnostic ON analyses (diagnostic);
+
+-- Résultat complet d'une segmentation : résumé JSON léger + blobs compressés
+-- (utils/historique.py), relus seulement à l'ouverture d'une étude
+CREATE TABLE IF NOT EXISTS resultats_segmentation (
+    etude_id  INTEGER PRIMARY KEY REFERENCES etudes (id) ON DELETE CASCADE,
+    resume    TEXT NOT NULL,
+    octets    INTEGER NOT NULL,
+    masque    BLOB NOT NULL,
+    mesures   BLOB NOT NULL,
+    lesions   BLOB NOT NULL,
+    flair     BLOB,
+    t1ce      BLOB
+);
+"""
+
+BLOBS_SEGMENTATION = ("masque", "mesures", "lesions", "flair", "t1ce")
+
+COLONNES_PATIENT = ("nom", "prenom", "email", "age", "telephone", "adresse", "commentaires", "date")
+
+
+def cle_recherche(texte):
+    """'Gharbi É.' -> 'gharbi e.' : minuscules, sans accents."""
+    texte = unicodedata.normalize("NFKD", str(texte or "").strip().lower())
+    return "".join(c for c in texte if not unicodedata.combining(c))
+
+
+def _uniformiser_diagnostics(conn):
+    """Anciennes analyses : codes anglais (classification) et minuscules (segmentation) -> libellés LABELS_FR."""
+    from utils.classification import LABELS_FR, DIAGNOSTIC_TUMEUR
+
+    anciens = {**LABELS_FR, "tumeur": DIAGNOSTIC_TUMEUR, "aucune tumeur": LABELS_FR["no_tumor"]}
+    conn.executemany(
+        "UPDATE analyses SET diagnostic = ? WHERE diagnostic = ?",
+        [(libelle, ancien) for ancien, libelle in anciens.items()]
+    )
+
+
+def _connecter(path):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+class _Ecriture:
+    __slots__ = ("sql", "params", "plusieurs", "attendue", "fait", "resultat", "erreur")
+
+    def __init__(self, sql, params, plusieurs, attendue=True):
+        self.sql = sql
+        self.params = params
+        self.plusieurs = plusieurs
+        self.attendue = attendue   # sinon personne ne lit `erreur` : elle est journalisée
+        self.fait = threading.Event()
+        self.resultat = None
+        self.erreur = None
+
+
+# =========================
+# BASE
+# =========================
+class BaseDonnees:
+
+    def __init__(self, path=CHEMIN_BASE):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with _connecter(path) as conn:
+            conn.executescript(SCHEMA)
+            _uniformiser_diagnostics(conn)
+        self._lecture = threading.local()
+        self._file = queue.Queue()
+        self._thread = threading.Thread(target=self._boucle_ecriture, name="ecrivain-sqlite", daemon=True)
+        self._thread.start()
+
+    # --- écritures groupées ---
+    def _collecter(self):
+        lot = [self._file.get()]
+        while len(lot) < LOT_ECRITURE_MAX:
+            try:
+                lot.append(self._file.get(timeout=ATTENTE_LOT_MS / 1000))
+            except queue.Empty:
+                break
+        return lot
+
+    def _boucle_ecriture(self):
+        conn = _connecter(self.path)
+        while True:
+            lot = self._collecter()
+            try:
+                with conn:   # une transaction pour tout le lot
+                    for e in lot:
+                        if e.plusieurs:
+                            e.resultat = conn.executemany(e.sql, e.params).rowcount
+                        else:
+                            e.resultat = conn.execute(e.sql, e.params).lastrowid
+            except Exception:
+                # Lot annulé : chaque requête est rejouée seule pour isoler l'erreur
+                for e in lot:
+                    try:
+                        with conn:
+                            if e.plusieurs:
+                                e.resultat = conn.executemany(e.sql, e.params).rowcount
+                            else:
+                                e.resultat = conn.execute(e.sql, e.params).lastrowid
+                    except Exception as erreur:
+                        e.erreur = erreur
+                        if not e.attendue:
+                            print(f"==> Écriture en base perdue ({e.sql.split('(')[0].strip()}) : {erreur!r}")
+            finally:
+                for e in lot:
+                    e.fait.set()
+
+    def _ecrire(self, sql, params=(), plusieurs=False, attendre=True):
+        """Met une écriture en file ; renvoie lastrowid (ou le nombre de lignes) si `attendre`."""
+        ecriture = _Ecriture(sql, params, plusieurs, attendre)
+        self._file.put(ecriture)
+        if not attendre:
+            return None
+        ecriture.fait.wait()
+        if ecriture.erreur is not None:
+            raise ecriture.erreur
+        return ecriture.resultat
+
+    # --- lectures ---
+    def _conn(self):
+        conn = getattr(self._lecture, "conn", None)
+        if conn is None:
+            conn = self._lecture.conn = _connecter(self.path)
+        return conn
+
+    def _lire(self, sql, params=()):
+        return pd.read_sql_query(sql, self._conn(), params=params)
+
+    # --- patients ---
+    def ajouter_patient(self, nom, prenom, email=None, age=None, telephone=None,
+                        adresse=None, commentaires=None, date_fiche=None, source=None):
+        return self._ecrire(
+            "INSERT INTO patients (nom, prenom, nom_cle, prenom_cle, email, age, telephone,"
+            " adresse, commentaires, date, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (nom, prenom, cle_recherche(nom), cle_recherche(prenom), email, age, telephone,
+             adresse, commentaires, date_fiche or str(date.today()), source)
+        )
+
+    def patient(self, patient_id):
+        lignes = self._lire("SELECT * FROM patients WHERE id = ?", (patient_id,))
+        return None if lignes.empty else lignes.iloc[0].to_dict()
+
+    def rechercher_patients(self, texte=None, date_min=None, date_max=None,
+                            diagnostic=None, limite=100):
+        """
+        Patients dont le nom ou le prénom commence par chaque mot de `texte`
+        (sans casse ni accents), créés entre date_min et date_max, et/ou ayant
+        au moins une analyse de diagnostic `diagnostic`. Utilise les index.
+        """
+        conditions, params = [], []
+        for mot in cle_recherche(texte).split():
+            conditions.append("(p.nom_cle >= ? AND p.nom_cle < ? OR p.prenom_cle >= ? AND p.prenom_cle < ?)")
+            params += [mot, mot + "\uffff", mot, mot + "\uffff"]
+        if date_min:
+            conditions.append("p.date >= ?")
+            params.append(str(date_min))
+        if date_max:
+            conditions.append("p.date <= ?")
+            params.append(str(date_max))
+        if diagnostic:
+            conditions.append(
+                "p.id IN (SELECT e.patient_id FROM analyses a JOIN etudes e ON e.id = a.etude_id"
+                " WHERE a.diagnostic = ?)"
+            )
+            params.append(diagnostic)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._lire(
+            "SELECT p.id, p.nom, p.prenom, p.age, p.email, p.telephone, p.date,"
+            " (SELECT COUNT(*) FROM etudes e WHERE e.patient_id = p.id) AS etudes"
+            f" FROM patients p {where} ORDER BY p.date DESC, p.id DESC LIMIT ?",
+            params + [limite]
+        )
+
+    # --- études et analyses ---
+    def ajouter_etude(self, patient_id, type_etude, cle=None, date_etude=None):
+        return self._ecrire(
+            "INSERT INTO etudes (patient_id, type, date, cle) VALUES (?, ?, ?, ?)",
+            (patient_id, type_etude, date_etude or str(date.today()), cle)
+        )
+
+    def etude_par_cle(self, patient_id, type_etude, cle):
+        """
+        Étude existante du patient (ou sans patient) pour cette clé de cache :
+        (etude_id, résultat de segmentation enregistré ?) ou None.
+        """
+        ligne = self._conn().execute(
+            "SELECT e.id, r.etude_id IS NOT NULL FROM etudes e"
+            " LEFT JOIN resultats_segmentation r ON r.etude_id = e.id"
+            " WHERE e.cle = ? AND e.type = ? AND e.patient_id IS ? ORDER BY e.id LIMIT 1",
+            (cle, type_etude, patient_id)
+        ).fetchone()
+        return None if ligne is None else (ligne[0], bool(ligne[1]))
+
+    def ajouter_analyses(self, etude_id, analyses, attendre=False):
+        """
+        analyses : liste de dicts {fichier, diagnostic, confiance, resultats}.
+        Un seul executemany ; sans `attendre`, l'appelant ne bloque pas.
+        """
+        lignes = [
+            (etude_id, a.get("fichier"), a.get("diagnostic"), a.get("confiance"),
+             json.dumps(a.get("resultats"), default=float) if a.get("resultats") is not None else None)
+            for a in analyses
+        ]
+        return self._ecrire(
+            "INSERT INTO analyses (etude_id, fichier, diagnostic, confiance, resultats)"
+            " VALUES (?, ?, ?, ?, ?)",
+            lignes, plusieurs=True, attendre=attendre
+        )
+
+    def historique(self, patient_id):
+        """Études et analyses d'un patient, de la plus récente à la plus ancienne."""
+        return self._lire(
+            "SELECT e.id AS etude_id, e.type, e.date, a.fichier, a.diagnostic, a.confiance"
+            " FROM etudes e LEFT JOIN analyses a ON a.etude_id = e.id"
+            " WHERE e.patient_id = ? ORDER BY e.date DESC, e.id DESC, a.id",
+            (patient_id,)
+        )
+
+    # --- historique des segmentations ---
+    def enregistrer_segmentation(self, etude_id, resume, blobs, attendre=False):
+        """Résumé (dict) + blobs compressés d'une étude ; écriture en arrière-plan."""
+        octets = sum(len(blobs[nom]) for nom in BLOBS_SEGMENTATION if blobs.get(nom))
+        return self._ecrire(
+            "INSERT OR REPLACE INTO resultats_segmentation"
+            f" (etude_id, resume, octets, {', '.join(BLOBS_SEGMENTATION)})"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (etude_id, json.dumps(resume), octets, *(blobs.get(nom) for nom in BLOBS_SEGMENTATION)),
+            attendre=attendre
+        )
+
+    def resumes_segmentations(self, patient_id=None, limite=100):
+        """Historique léger : résumés seulement, aucun blob n'est lu."""
+        filtre, params = ("WHERE e.patient_id = ?", [patient_id]) if patient_id else ("", [])
+        tableau = self._lire(
+            "SELECT e.id AS etude_id, e.date, e.patient_id, p.prenom, p.nom, r.octets, r.resume"
+            " FROM resultats_segmentation r JOIN etudes e ON e.id = r.etude_id"
+            f" LEFT JOIN patients p ON p.id = e.patient_id {filtre}"
+            " ORDER BY e.date DESC, e.id DESC LIMIT ?",
+            params + [limite]
+        )
+        tableau["resume"] = tableau["resume"].map(json.loads)
+        return tableau
+
+    def charger_segmentation(self, etude_id):
+        """(résumé, blobs) d'une étude, ou None."""
+        ligne = self._conn().execute(
+            f"SELECT resume, {', '.join(BLOBS_SEGMENTATION)} FROM resultats_segmentation WHERE etude_id = ?",
+            (etude_id,)
+        ).fetchone()
+        if ligne is None:
+            return None
+        return json.loads(ligne[0]), dict(zip(BLOBS_SEGMENTATION, ligne[1:]))
+
+    def diagnostics(self):
+        return self._lire(
+            "SELECT DISTINCT diagnostic FROM analyses WHERE diagnostic IS NOT NULL ORDER BY diagnostic"
+        )["diagnostic"].tolist()
+
+    # --- import ---
+    def importer_json(self, dossier="data"):
+        """
+        Import ponctuel des fiches data/patient_*.json en une transaction.
+        Idempotent : une fiche déjà importée (même chemin) est ignorée.
+        Renvoie le nombre de patients ajoutés.
+        """
+        lignes = []
+        for path in sorted(glob.glob(os.path.join(dossier, "patient_*.json"))):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    fiche = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[!] Fiche illisible {path} : {e}")
+                continue
+            valeurs = [fiche.get(c) for c in COLONNES_PATIENT]
+            nom, prenom = valeurs[0] or "", valeurs[1] or ""
+            lignes.append((
+                nom, prenom, cle_recherche(nom), cle_recherche(prenom), *valeurs[2:7],
+                valeurs[7] or str(date.today()), os.path.abspath(path)
+            ))
+
+        return self._ecrire(
+            "INSERT OR IGNORE INTO patients (nom, prenom, nom_cle, prenom_cle, email, age,"
+            " telephone, adresse, commentaires, date, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            lignes, plusieurs=True
+        )
+
+
+_base = None
+_verrou_base = threading.Lock()
+
+
+def base_donnees():
+    """Base partagée par toutes les sessions du processus."""
+    global _base
+    with _verrou_base:
+        if _base is None:
+            _base = BaseDonnees()
+        return _base
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Base SQLite des patients")
+    sous = parser.add_subparsers(dest="commande", required=True)
+    importer = sous.add_parser("importer", help="importe les fiches data/patient_*.json")
+    importer.add_argument("dossier", nargs="?", default="data")
+    importer.add_argument("--base", default=CHEMIN_BASE)
+    args = parser.parse_args()
+
+    if args.commande == "importer":
+        base = BaseDonnees(args.base)
+        ajoutes = base.importer_json(args.dossier)
+        print(f"==> {ajoutes} patient(s) importé(s) dans {args.base}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import tempfile
+import threading
+import zipfile
+import zlib
+
+import numpy as np
+
+# =========================
+# PARAMÈTRES
+# =========================
+DOSSIER_CACHE = os.path.join(".cache", "resultats")
+TAILLE_MAX_CACHE = 512 * 1024 * 1024   # 512 Mo
+TAILLE_BLOC_HASH = 1024 * 1024
+
+
+# =========================
+# EMPREINTES
+# =========================
+def hash_flux(fichier, taille_bloc=TAILLE_BLOC_HASH):
+    """SHA-256 du contenu d'un objet fichier (lu par blocs, position restaurée)."""
+    h = hashlib.sha256()
+    position = fichier.tell() if hasattr(fichier, "tell") else None
+    if hasattr(fichier, "seek"):
+        fichier.seek(0)
+    for bloc in iter(lambda: fichier.read(taille_bloc), b""):
+        h.update(bloc)
+    if position is not None:
+        fichier.seek(position)
+    return h.hexdigest()
+
+
+_hash_fichiers = {}
+_verrou_hash = threading.Lock()
+
+
+def hash_fichier(path):
+    """SHA-256 d'un fichier sur disque, mémorisé tant que (taille, mtime) ne change pas."""
+    stat = os.stat(path)
+    signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _verrou_hash:
+        if signature in _hash_fichiers:
+            return _hash_fichiers[signature]
+    with open(path, "rb") as f:
+        empreinte = hash_flux(f)
+    with _verrou_hash:
+        _hash_fichiers[signature] = empreinte
+    return empreinte
+
+
+def cle_cache(*parties):
+    """Clé de cache : SHA-256 des empreintes / paramètres fournis."""
+    h = hashlib.sha256()
+    for partie in parties:
+        h.update(str(partie).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+# =========================
+# CACHE DISQUE LRU
+# =========================
+class CacheResultats:
+    """
+    Cache disque adressé par contenu.
+
+    Chaque entrée est un .npz compressé (masques uint8, vecteurs de probabilités...).
+    L'ordre LRU repose sur la date de modification des fichiers, mise à jour à
+    chaque lecture ; les entrées les plus anciennes sont supprimées dès que la
+    taille totale dépasse `taille_max`.
+    """
+
+    def __init__(self, dossier=DOSSIER_CACHE, taille_max=TAILLE_MAX_CACHE):
+        self.dossier = dossier
+        self.taille_max = taille_max
+        self.hits = 0
+        self.misses = 0
+        self._verrou = threading.Lock()
+        os.makedirs(dossier, exist_ok=True)
+
+    def _chemin(self, cle):
+        return os.path.join(self.dossier, f"{cle}.npz")
+
+    def get(self, cle, requis=()):
+        """
+        Renvoie un dict {nom: array} ou None si absent. Une entrée illisible
+        (archive tronquée, tableau de `requis` manquant) compte comme un miss
+        et est supprimée : le résultat sera recalculé puis réécrit.
+        """
+        path = self._chemin(cle)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                resultat = {nom: data[nom] for nom in data.files}
+            for nom in requis:
+                if nom not in resultat:
+                    raise KeyError(nom)
+            os.utime(path)
+        except FileNotFoundError:
+            with self._verrou:
+                self.misses += 1
+            return None
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile, zlib.error) as e:
+            print(f"==> Entrée de cache illisible supprimée ({cle[:12]}) : {e!r}")
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            with self._verrou:
+                self.misses += 1
+            return None
+
+        with self._verrou:
+            self.hits += 1
+        return resultat
+
+    def put(self, cle, **arrays):
+        # Écriture atomique : fichier temporaire puis renommage
+        fd, tmp = tempfile.mkstemp(dir=self.dossier, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp, self._chemin(cle))
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        self.evincer()
+
+    def evincer(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de la taille max."""
+        with self._verrou:
+            entrees = []
+            for entree in os.scandir(self.dossier):
+                if entree.name.endswith(".npz"):
+                    stat = entree.stat()
+                    entrees.append((stat.st_mtime, stat.st_size, entree.path))
+
+            total = sum(taille for _, taille, _ in entrees)
+            for _, taille, path in sorted(entrees):
+                if total <= self.taille_max:
+                    break
+                try:
+                    os.unlink(path)
+                    total -= taille
+                except OSError:
+                    pass
+
+    def stats(self):
+        entrees = [e for e in os.scandir(self.dossier) if e.name.endswith(".npz")]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entrees": len(entrees),
+            "taille_octets": sum(e.stat().st_size for e in entrees),
+        }
+
+
+_cache = None
+_verrou_cache = threading.Lock()
+
+
+def cache_resultats():
+    """Instance partagée par toutes les sessions du processus."""
+    global _cache
+    with _verrou_cache:
+        if _cache is None:
+            _cache = CacheResultats(
+                os.environ.get("BT_CACHE_DIR", DOSSIER_CACHE),
+                int(os.environ.get("BT_CACHE_MAX_BYTES", TAILLE_MAX_CACHE)),
+            )
+        return _cache
@@ -0,0 +1,70 @@
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from utils.metriques import span
+
+# =========================
+# PARAMÈTRES
+# =========================
+IMAGE_SIZE = 150   # même taille utilisée pour l'entraînement
+
+# Labels des classes
+LABELS = ['glioma_tumor', 'no_tumor', 'meningioma_tumor', 'pituitary_tumor']
+LABELS_FR = {
+    'glioma_tumor': 'Gliome',
+    'no_tumor': 'Aucune tumeur',
+    'meningioma_tumor': 'Méningiome',
+    'pituitary_tumor': 'Tumeur pituitaire'
+}
+# Vocabulaire unique de la colonne analyses.diagnostic : libellés LABELS_FR,
+# plus celui de la segmentation quand un volume tumoral est trouvé
+DIAGNOSTIC_TUMEUR = 'Tumeur'
+
+
+# =========================
+# PRÉTRAITEMENT
+# =========================
+def preprocess_image(image, target_size=(IMAGE_SIZE, IMAGE_SIZE)):
+    from tensorflow.keras.applications.efficientnet import preprocess_input
+
+    img = np.array(image)
+    img = cv2.resize(img, target_size)
+    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    img = np.expand_dims(img, axis=0)
+    img = preprocess_input(img)
+    return img
+
+
+def decoder_image(donnees, target_size=(IMAGE_SIZE, IMAGE_SIZE)):
+    """Octets d'une image -> array RGB uint8 redimensionné (H, W, 3)."""
+    with Image.open(io.BytesIO(donnees)) as image:
+        img = np.array(image.convert("RGB"))
+    return cv2.resize(img, target_size)
+
+
+def preprocess_batch(images):
+    """
+    Version par lots de `preprocess_image` : liste/array d'images RGB uint8
+    déjà redimensionnées -> tenseur (N, H, W, 3) prêt pour le modèle.
+    """
+    from tensorflow.keras.applications.efficientnet import preprocess_input
+
+    batch = np.stack(images) if not isinstance(images, np.ndarray) else images
+    batch = np.ascontiguousarray(batch[..., ::-1])   # RGB -> BGR, comme cv2.cvtColor
+    return preprocess_input(batch.astype(np.float32))
+
+
+def classifier_images(model, donnees):
+    """
+    Classe une liste d'images (octets) en un seul appel au modèle.
+    Renvoie les probabilités (N, len(LABELS)).
+    """
+    with span("infer.decodage"):
+        images = [decoder_image(d) for d in donnees]
+    with span("infer.pretraitement"):
+        batch = preprocess_batch(images)
+    with span("infer.predict"):
+        return np.asarray(model.predict(batch, verbose=0))
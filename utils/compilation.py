@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# =========================
+# PARAMÈTRES
+# =========================
+PROFIL_INFERENCE = os.environ.get("BT_PROFIL_INFERENCE", "profil_inference.json")
+
+_threads_appliques = False
+_verrou_threads = threading.Lock()
+
+
+# =========================
+# PROFIL (écrit par `python -m utils.autotune`)
+# =========================
+def charger_profil(path=None):
+    """
+    Profil d'inférence de la machine, ou {} s'il n'existe pas :
+    {"intra_op": 16, "inter_op": 2, "segmentation": {"batch": 16, "xla": false}, ...}
+    """
+    path = path or PROFIL_INFERENCE
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def appliquer_threads(intra_op=None, inter_op=None):
+    """
+    Fixe les pools de threads de TensorFlow (profil par défaut).
+    Doit précéder la première opération TF du processus ; sans effet ensuite.
+    """
+    global _threads_appliques
+    with _verrou_threads:
+        if _threads_appliques:
+            return
+        _threads_appliques = True
+        if intra_op is None and inter_op is None:
+            profil = charger_profil()
+            intra_op, inter_op = profil.get("intra_op"), profil.get("inter_op")
+        if intra_op is None and inter_op is None:
+            return
+
+        import tensorflow as tf
+        try:
+            if intra_op:
+                tf.config.threading.set_intra_op_parallelism_threads(int(intra_op))
+            if inter_op:
+                tf.config.threading.set_inter_op_parallelism_threads(int(inter_op))
+        except RuntimeError as e:
+            # Runtime TF déjà initialisé : les valeurs par défaut restent en place
+            print(f"==> Threads TF non modifiés : {e}")
+
+
+# =========================
+# GRAPHES À SIGNATURE FIXE
+# =========================
+def tailles_batch(batch_max):
+    """Tailles compilées : puissances de 2 jusqu'à batch_max, puis batch_max."""
+    tailles = []
+    t = 1
+    while t < batch_max:
+        tailles.append(t)
+        t *= 2
+    return tailles + [batch_max]
+
+
+class ModeleCompile:
+    """
+    Modèle Keras appelé via des tf.function à signature d'entrée fixe.
+
+    Une fonction est compilée par taille de `tailles_batch(batch)` : chaque
+    appel est découpé en blocs de `batch` et le dernier bloc est complété par
+    des zéros jusqu'à la taille compilée suivante. Aucun retraçage en service,
+    et pas la surcharge par appel de `model.predict`. `xla` active jit_compile.
+    """
+
+    def __init__(self, model, batch, xla=False):
+        import tensorflow as tf
+
+        self.model = model
+        self.batch = int(batch)
+        self.xla = bool(xla)
+        self._tailles = tailles_batch(self.batch)
+        forme = tuple(model.input_shape[1:])
+
+        def appel(x):
+            return model(x, training=False)
+
+        self._fonctions = {
+            taille: tf.function(
+                appel,
+                input_signature=[tf.TensorSpec((taille,) + forme, tf.float32)],
+                jit_compile=self.xla,
+            )
+            for taille in self._tailles
+        }
+
+    @property
+    def input_shape(self):
+        return self.model.input_shape
+
+    def _taille_compilee(self, n):
+        return next(t for t in self._tailles if t >= n)
+
+    def predict_on_batch(self, entree):
+        entree = np.asarray(entree, dtype=np.float32)
+        sorties = []
+        for debut in range(0, len(entree), self.batch):
+            bloc = entree[debut:debut + self.batch]
+            taille = self._taille_compilee(len(bloc))
+            if taille != len(bloc):
+                complet = np.zeros((taille,) + bloc.shape[1:], dtype=np.float32)
+                complet[:len(bloc)] = bloc
+                bloc = complet
+            sortie = self._fonctions[taille](bloc)
+            sorties.append(np.asarray(sortie)[:min(self.batch, len(entree) - debut)])
+        return np.concatenate(sorties)
+
+    def predict(self, entree, verbose=0):
+        return self.predict_on_batch(entree)
+
+    def precompiler(self):
+        """Trace (et compile avec XLA) toutes les tailles, avant la première requête."""
+        forme = tuple(self.model.input_shape[1:])
+        for taille in self._tailles:
+            self._fonctions[taille](np.zeros((taille,) + forme, dtype=np.float32))
+
+
+def compiler_selon_profil(nom, model, profil=None):
+    """Enveloppe `model` si le profil prévoit une config pour ce modèle, sinon le renvoie tel quel."""
+    profil = charger_profil() if profil is None else profil
+    config = profil.get(nom)
+    if not config:
+        return model
+    return ModeleCompile(model, config["batch"], config.get("xla", False))
@@ -0,0 +1,71 @@
+import gzip
+import io
+
+import nibabel as nib
+import numpy as np
+
+# =========================
+# PARAMÈTRES
+# =========================
+NIVEAU_GZIP = 6
+# Classes du modèle -> labels BraTS (la zone renforcée est codée 4)
+LABELS_BRATS = np.array([0, 1, 2, 4], dtype=np.uint8)
+
+
+# =========================
+# RETOUR EN GÉOMÉTRIE NATIVE
+# =========================
+def _indices_proches(n_dest, n_src):
+    """Indices source du plus proche voisin (centres de pixels alignés)."""
+    return np.minimum(((np.arange(n_dest) + 0.5) * n_src / n_dest).astype(np.intp), n_src - 1)
+
+
+def masque_natif(mask, shape_native, debut, labels_brats=True):
+    """
+    Masque du modèle (N, S1, S2) -> volume uint8 (nx, ny, nz) du volume source.
+
+    Une seule indexation vectorisée (plus proche voisin) ramène les coupes en
+    nx x ny ; elles sont replacées à partir de la coupe `debut`, le reste du
+    volume est du fond.
+    """
+    nx, ny, nz = shape_native
+    n_slices = mask.shape[0]
+    lignes = _indices_proches(nx, mask.shape[1])
+    colonnes = _indices_proches(ny, mask.shape[2])
+
+    stop = min(debut + n_slices, nz)
+    volume = np.zeros((nx, ny, nz), dtype=np.uint8)
+    if stop > debut:
+        coupes = mask[:stop - debut][:, lignes[:, None], colonnes[None, :]]
+        if labels_brats:
+            coupes = LABELS_BRATS[coupes]
+        volume[:, :, debut:stop] = np.moveaxis(coupes, 0, 2)
+    return volume
+
+
+# =========================
+# ÉCRITURE .nii.gz EN MÉMOIRE
+# =========================
+def nifti_gz(volume, affine, header=None, niveau=NIVEAU_GZIP):
+    """
+    Encode un volume en .nii.gz directement dans un buffer mémoire.
+
+    nibabel écrit l'en-tête puis les voxels par blocs dans le flux gzip :
+    pas de fichier temporaire ni de copie non compressée complète.
+    Renvoie les octets du fichier.
+    """
+    img = nib.Nifti1Image(volume, affine, header=header)
+    img.set_data_dtype(np.uint8)
+    img.header.set_slope_inter(1, 0)
+
+    buffer = io.BytesIO()
+    # mtime=0 : même masque -> mêmes octets
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=niveau, mtime=0) as flux:
+        img.to_file_map(img.make_file_map({"image": flux}))
+    return buffer.getvalue()
+
+
+def exporter_masque(mask, geometrie, debut, labels_brats=True):
+    """Masque du modèle -> octets .nii.gz aligné sur le volume source (forme + affine)."""
+    volume = masque_natif(mask, geometrie["shape"], debut, labels_brats)
+    return nifti_gz(volume, geometrie["affine"], geometrie.get("header"))
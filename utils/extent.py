@@ -0,0 +1,103 @@
+import nibabel as nib
+import numpy as np
+
+# =========================
+# PARAMÈTRES
+# =========================
+PAS_PROFIL = 4               # sous-échantillonnage dans le plan pour le pré-passage
+SEUIL_RELATIF = 0.1          # voxel "cerveau" si > 10 % du percentile 99 du volume
+FRACTION_MIN_CERVEAU = 0.02  # coupe "cerveau" si > 2 % de ses voxels le sont
+SEUIL_CANDIDAT_SIGMA = 3.0   # FLAIR hyperintense : > moyenne + 3 écarts-types du cerveau
+MARGE_COUPES = 2             # coupes gardées de part et d'autre de l'étendue détectée
+NZ_ENTRAINEMENT = 155        # nombre de coupes des volumes BraTS d'entraînement
+
+
+# =========================
+# PROFIL D'INTENSITÉ
+# =========================
+def _seuil_cerveau(volume):
+    haut = float(np.percentile(volume, 99)) if volume.size else 0.0
+    return SEUIL_RELATIF * haut if haut > 0 else None
+
+
+def profil_axial(volume):
+    """Fraction de voxels "cerveau" par coupe axiale d'un volume (H, W, N)."""
+    seuil = _seuil_cerveau(volume)
+    if seuil is None:
+        return np.zeros(volume.shape[2])
+    return (volume > seuil).mean(axis=(0, 1))
+
+
+def etendue_cerveau(profil, fraction_min=FRACTION_MIN_CERVEAU, marge=MARGE_COUPES):
+    """(debut, fin) des coupes contenant du cerveau (fin exclue), ou None si aucune."""
+    coupes = np.flatnonzero(profil > fraction_min)
+    if len(coupes) == 0:
+        return None
+    return max(int(coupes[0]) - marge, 0), min(int(coupes[-1]) + 1 + marge, len(profil))
+
+
+# =========================
+# FENÊTRE ENVOYÉE AU MODÈLE
+# =========================
+def fenetre_coupes(path, n_slices, debut_defaut, pas=PAS_PROFIL):
+    """
+    Première coupe de la fenêtre de `n_slices` coupes à lire.
+
+    Volumes à la géométrie d'entraînement (155 coupes) : fenêtre d'entraînement,
+    sans lecture supplémentaire. Autres géométries : pré-passage sous-échantillonné
+    dans le plan (proxy nibabel) et fenêtre centrée sur le cerveau détecté.
+    """
+    img = nib.load(path, mmap=True)
+    nz = img.shape[2]
+    if nz == NZ_ENTRAINEMENT:
+        return debut_defaut
+
+    apercu = np.asarray(img.dataobj[::pas, ::pas, :], dtype=np.float32)
+    del img
+    etendue = etendue_cerveau(profil_axial(apercu))
+    if etendue is None:
+        return min(debut_defaut, max(nz - n_slices, 0))
+
+    centre = (etendue[0] + etendue[1]) // 2
+    return int(min(max(centre - n_slices // 2, 0), max(nz - n_slices, 0)))
+
+
+# =========================
+# COUPES À SEGMENTER
+# =========================
+def _dilater(coupes, marge):
+    elargies = coupes.copy()
+    for d in range(1, marge + 1):
+        elargies[d:] |= coupes[:-d]
+        elargies[:-d] |= coupes[d:]
+    return elargies
+
+
+def coupes_candidates(flair_slab, sigma=SEUIL_CANDIDAT_SIGMA, marge=MARGE_COUPES):
+    """
+    Coupes du slab FLAIR (H, W, N) contenant un signal hyperintense (candidat
+    tumoral), élargies de `marge` coupes. Renvoie un masque booléen (N,).
+    """
+    seuil = _seuil_cerveau(flair_slab)
+    if seuil is None:
+        return np.zeros(flair_slab.shape[2], dtype=bool)
+    cerveau = flair_slab > seuil
+    valeurs = flair_slab[cerveau]
+    hyper = valeurs.mean() + sigma * valeurs.std()
+    return _dilater((flair_slab > hyper).any(axis=(0, 1)), marge)
+
+
+def coupes_actives(flair_slab, candidats=False, pas=PAS_PROFIL):
+    """
+    Masque booléen (N,) des coupes du slab à envoyer au modèle : étendue du
+    cerveau, restreinte aux coupes avec signal FLAIR suspect si `candidats`.
+    Les autres coupes sont du fond.
+    """
+    actives = np.zeros(flair_slab.shape[2], dtype=bool)
+    etendue = etendue_cerveau(profil_axial(flair_slab[::pas, ::pas]))
+    if etendue is None:
+        return actives
+    actives[etendue[0]:etendue[1]] = True
+    if candidats:
+        actives &= coupes_candidates(flair_slab)
+    return actives
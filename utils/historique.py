@@ -0,0 +1,108 @@
+import io
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from utils.lesions import tableau_en_array, array_en_tableau
+
+# =========================
+# PARAMÈTRES
+# =========================
+NIVEAU_ZLIB = 6
+
+
+# =========================
+# CODECS
+# =========================
+def compresser_masque(mask):
+    """
+    Masque uint8 de labels -> octets : plans de bits (2 bits/voxel pour 4 classes)
+    empaquetés par np.packbits puis zlib. En-tête : forme + nombre de plans.
+    """
+    mask = np.ascontiguousarray(mask, dtype=np.uint8)
+    n_plans = max(1, int(mask.max()).bit_length()) if mask.size else 1
+    plans = np.stack([(mask >> b) & 1 for b in range(n_plans)])
+    entete = np.array([mask.ndim, n_plans, *mask.shape], dtype=np.uint32).tobytes()
+    return entete + zlib.compress(np.packbits(plans, axis=None).tobytes(), NIVEAU_ZLIB)
+
+
+def decompresser_masque(donnees):
+    ndim, n_plans = np.frombuffer(donnees[:8], dtype=np.uint32)
+    shape = tuple(int(n) for n in np.frombuffer(donnees[8:8 + 4 * ndim], dtype=np.uint32))
+    bits = np.unpackbits(np.frombuffer(zlib.decompress(donnees[8 + 4 * ndim:]), dtype=np.uint8))
+    plans = bits[:n_plans * int(np.prod(shape))].reshape((n_plans,) + shape)
+    mask = np.zeros(shape, dtype=np.uint8)
+    for b in range(n_plans):
+        mask |= plans[b] << b
+    return mask
+
+
+def compresser_array(array):
+    """Array quelconque -> .npy compressé zlib."""
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+    return zlib.compress(buffer.getvalue(), NIVEAU_ZLIB)
+
+
+def decompresser_array(donnees):
+    return np.load(io.BytesIO(zlib.decompress(donnees)), allow_pickle=False)
+
+
+def compresser_tableau(tableau):
+    """DataFrame numérique -> octets (valeurs float32 + noms de colonnes)."""
+    entete = "\t".join(tableau.columns).encode("utf-8")
+    return len(entete).to_bytes(4, "little") + entete + compresser_array(tableau.to_numpy(np.float32))
+
+
+def decompresser_tableau(donnees):
+    n = int.from_bytes(donnees[:4], "little")
+    colonnes = donnees[4:4 + n].decode("utf-8").split("\t")
+    return pd.DataFrame(decompresser_array(donnees[4 + n:]), columns=colonnes)
+
+
+# =========================
+# RÉSULTAT DE SEGMENTATION
+# =========================
+def resume_segmentation(resultat):
+    """Partie légère (JSON) d'un résultat : chargée par la vue historique."""
+    geometrie = resultat.get("geometrie") or {}
+    return {
+        "volumes": {k: float(v) for k, v in resultat["volumes"].items()},
+        "lesions": int(len(resultat["lesions"])),
+        "espacement": [float(e) for e in resultat["espacement"]],
+        "debut": int(resultat["debut"]),
+        "shape_native": list(geometrie.get("shape", ())),
+        "affine": np.asarray(geometrie["affine"]).tolist() if "affine" in geometrie else None,
+        "shape_masque": list(resultat["mask"].shape),
+    }
+
+
+def blobs_segmentation(resultat):
+    """Parties lourdes, compressées : décompressées seulement à l'ouverture."""
+    return {
+        "masque": compresser_masque(resultat["mask"]),
+        "mesures": compresser_tableau(resultat["mesures"]),
+        "lesions": compresser_array(tableau_en_array(resultat["lesions"])),
+        "flair": compresser_array(resultat["flair"]),
+        "t1ce": compresser_array(resultat["t1ce"]),
+    }
+
+
+def ouvrir_segmentation(resume, blobs):
+    """Résumé + blobs -> dict au format de `executer_segmentation` (sans les vues PNG)."""
+    mesures = decompresser_tableau(blobs["mesures"])
+    mesures["coupe"] = mesures["coupe"].astype(np.int64)
+    affine = resume.get("affine")
+    return {
+        "mask": decompresser_masque(blobs["masque"]),
+        "flair": decompresser_array(blobs["flair"]),
+        "t1ce": decompresser_array(blobs["t1ce"]),
+        "mesures": mesures,
+        "lesions": array_en_tableau(decompresser_array(blobs["lesions"])),
+        "volumes": resume["volumes"],
+        "espacement": tuple(resume["espacement"]),
+        "debut": resume["debut"],
+        "geometrie": {"shape": tuple(resume["shape_native"]), "affine": np.array(affine)}
+        if affine is not None else None,
+    }
@@ -0,0 +1,143 @@
+import numpy as np
+
+from utils.metriques import span
+
+# =========================
+# PARAMÈTRES
+# =========================
+TAILLE_BLOC_INFERENCE = 16   # coupes par appel au modèle
+
+
+def ordre_centre(n_slices, taille_bloc):
+    """Débuts de blocs triés du centre du volume vers les bords."""
+    centre = n_slices / 2
+    starts = range(0, n_slices, taille_bloc)
+    return sorted(
+        starts,
+        key=lambda s: abs(s + min(taille_bloc, n_slices - s) / 2 - centre)
+    )
+
+
+def segmenter_par_blocs(model, X, taille_bloc=TAILLE_BLOC_INFERENCE, centre_d_abord=True):
+    """
+    Segmente X (N, H, W, C) par blocs de coupes.
+
+    Le softmax de chaque bloc est réduit immédiatement en masque uint8 puis
+    libéré : la mémoire crête est celle d'un bloc, pas de tout le volume.
+    Générateur : produit (start, stop, masque_bloc) à chaque bloc terminé.
+    """
+    n_slices = X.shape[0]
+    starts = ordre_centre(n_slices, taille_bloc) if centre_d_abord \
+        else range(0, n_slices, taille_bloc)
+
+    for start in starts:
+        stop = min(start + taille_bloc, n_slices)
+        with span("infer.predict"):
+            pred = np.asarray(model.predict_on_batch(X[start:stop]))
+        with span("infer.argmax"):
+            bloc = np.argmax(pred, axis=-1).astype(np.uint8)
+        del pred
+        yield start, stop, bloc
+
+
+def segmenter_volume(model, X, taille_bloc=TAILLE_BLOC_INFERENCE, callback=None, actives=None):
+    """
+    Segmente tout le volume et renvoie le masque uint8 (N, H, W).
+    `actives` (booléen (N,), optionnel) : seules ces coupes passent par le modèle,
+    les autres restent à 0 (fond).
+    `callback(mask, start, stop, fraction)` est appelé après chaque bloc.
+    """
+    mask = np.zeros(X.shape[:3], dtype=np.uint8)
+    indices = np.arange(X.shape[0]) if actives is None else np.flatnonzero(actives)
+    if len(indices) == 0:
+        return mask
+    if len(indices) < X.shape[0]:
+        X = X[indices]
+    fait = 0
+
+    for start, stop, bloc in segmenter_par_blocs(model, X, taille_bloc):
+        mask[indices[start:stop]] = bloc
+        fait += stop - start
+        if callback is not None:
+            callback(mask, int(indices[start]), int(indices[stop - 1]) + 1, fait / len(indices))
+
+    return mask
+
+
+# =========================
+# APERÇU PUIS AFFINAGE
+# =========================
+PAS_APERCU = 4   # une coupe sur 4 pour l'aperçu
+
+
+def _predire_probas(model, X, indices, taille_bloc):
+    """Softmax float32 des coupes `indices`, par blocs."""
+    return np.concatenate([
+        np.asarray(model.predict_on_batch(X[indices[i:i + taille_bloc]]), dtype=np.float32)
+        for i in range(0, len(indices), taille_bloc)
+    ])
+
+
+def interpoler_coupes(probas, z_connues, z_cibles):
+    """
+    Masque uint8 des coupes `z_cibles` par interpolation linéaire en z des
+    softmax des coupes voisines `z_connues` (triées), puis argmax.
+    """
+    hauts = np.clip(np.searchsorted(z_connues, z_cibles), 1, len(z_connues) - 1) \
+        if len(z_connues) > 1 else np.zeros(len(z_cibles), dtype=np.intp)
+    bas = np.maximum(hauts - 1, 0)
+    ecart = np.maximum(z_connues[hauts] - z_connues[bas], 1)
+    poids = np.clip((z_cibles - z_connues[bas]) / ecart, 0, 1).astype(np.float32)[:, None, None, None]
+    return np.argmax(probas[bas] * (1 - poids) + probas[hauts] * poids, axis=-1).astype(np.uint8)
+
+
+def segmenter_progressif(model, X, pas=PAS_APERCU, taille_bloc=TAILLE_BLOC_INFERENCE,
+                         callback=None, actives=None):
+    """
+    Segmentation en deux phases, même masque final que `segmenter_volume` :
+
+    1. aperçu : une coupe active sur `pas` (plus la dernière) passe par le
+       modèle, les autres sont interpolées -> masque approximatif complet ;
+    2. affinage : les coupes restantes sont prédites par blocs, du centre
+       vers les bords, et remplacent leur valeur interpolée.
+
+    `callback(mask, affinees, fraction)` est appelé après l'aperçu puis après
+    chaque bloc ; `affinees` (booléen (N,)) marque les coupes déjà prédites.
+    """
+    mask = np.zeros(X.shape[:3], dtype=np.uint8)
+    affinees = np.zeros(X.shape[0], dtype=bool)
+    indices = np.arange(X.shape[0]) if actives is None else np.flatnonzero(actives)
+    if len(indices) == 0:
+        return mask
+
+    # --- phase 1 : aperçu ---
+    z_apercu = np.unique(np.r_[indices[::pas], indices[-1]])
+    with span("infer.predict_apercu"):
+        probas = _predire_probas(model, X, z_apercu, taille_bloc)
+    with span("infer.interpolation"):
+        for i in range(0, len(indices), taille_bloc):
+            z = indices[i:i + taille_bloc]
+            mask[z] = interpoler_coupes(probas, z_apercu, z)
+        mask[z_apercu] = np.argmax(probas, axis=-1)
+    affinees[z_apercu] = True
+    del probas
+    fait = len(z_apercu)
+    if callback is not None:
+        callback(mask, affinees, fait / len(indices))
+
+    # --- phase 2 : affinage, centre d'abord ---
+    restantes = indices[~affinees[indices]]
+    restantes = restantes[np.argsort(np.abs(restantes - indices.mean()), kind="stable")]
+    for i in range(0, len(restantes), taille_bloc):
+        z = restantes[i:i + taille_bloc]
+        with span("infer.predict"):
+            pred = np.asarray(model.predict_on_batch(X[z]))
+        with span("infer.argmax"):
+            mask[z] = np.argmax(pred, axis=-1)
+        del pred
+        affinees[z] = True
+        fait += len(z)
+        if callback is not None:
+            callback(mask, affinees, fait / len(indices))
+
+    return mask
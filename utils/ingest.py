@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+
+import nibabel as nib
+import numpy as np
+
+# =========================
+# PARAMÈTRES
+# =========================
+TAILLE_BLOC = 1024 * 1024   # 1 Mo par écriture
+
+
+# =========================
+# UPLOADS
+# =========================
+def suffixe_nifti(nom):
+    """Renvoie '.nii.gz' ou '.nii' selon le nom du fichier uploadé."""
+    return ".nii.gz" if str(nom).lower().endswith(".gz") else ".nii"
+
+
+def sauvegarder_upload(fichier, taille_bloc=TAILLE_BLOC):
+    """
+    Copie un fichier uploadé (objet fichier) sur disque par blocs,
+    sans jamais charger tout son contenu en mémoire.
+    Renvoie le chemin du fichier temporaire (à supprimer par l'appelant).
+    """
+    if hasattr(fichier, "seek"):
+        fichier.seek(0)
+
+    suffix = suffixe_nifti(getattr(fichier, "name", ""))
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as f:
+        shutil.copyfileobj(fichier, f, taille_bloc)
+        return f.name
+
+
+def supprimer_fichiers(*paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.unlink(path)
+
+
+# =========================
+# GÉOMÉTRIE
+# =========================
+def lire_geometrie(path):
+    """Forme 3D, affine et en-tête du volume source (sans lire les voxels)."""
+    img = nib.load(path, mmap=True)
+    geometrie = {
+        "shape": tuple(int(n) for n in img.shape[:3]),
+        "affine": np.array(img.affine),
+        "header": img.header.copy(),
+    }
+    del img
+    return geometrie
+
+
+# =========================
+# LECTURE PARTIELLE
+# =========================
+def charger_coupes(path, start, n_slices):
+    """
+    Lit uniquement les coupes axiales [start, start + n_slices) d'un volume NIfTI.
+
+    - .nii    : le fichier est mappé en mémoire (mmap), seules les pages
+                du bloc demandé sont lues.
+    - .nii.gz : lecture via le proxy `dataobj` de nibabel, seul le bloc
+                demandé est décompressé et mis à l'échelle.
+
+    Renvoie (slab float32 de forme (X, Y, n_slices), zooms (dx, dy, dz)).
+    Les coupes absentes (volume trop court) sont remplies de zéros.
+    """
+    img = nib.load(path, mmap=True)
+    zooms = tuple(float(z) for z in img.header.get_zooms()[:3])
+
+    nx, ny, nz = img.shape[:3]
+    stop = min(start + n_slices, nz)
+
+    slab = np.zeros((nx, ny, n_slices), dtype=np.float32)
+    if stop > start:
+        # np.array force une copie : le slab ne référence pas le mmap
+        slab[:, :, :stop - start] = np.array(
+            img.dataobj[:, :, start:stop], dtype=np.float32
+        )
+
+    del img
+    return slab, zooms
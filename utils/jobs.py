@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# =========================
+# PARAMÈTRES
+# =========================
+NB_WORKERS = int(os.environ.get("BT_JOBS_WORKERS", 2))
+MAX_EN_ATTENTE = int(os.environ.get("BT_JOBS_MAX_ATTENTE", 8))
+DUREE_CONSERVATION_S = 3600   # état des jobs terminés gardé 1 h (résultat libéré à la lecture)
+# Résultat jamais réclamé (onglet fermé pendant le job) : libéré après ce délai,
+# il est hors du budget mémoire du store de sessions
+DUREE_RESULTAT_S = int(os.environ.get("BT_JOBS_DUREE_RESULTAT_S", 300))
+
+EN_ATTENTE = "en attente"
+EN_COURS = "en cours"
+TERMINE = "terminé"
+ANNULE = "annulé"
+ERREUR = "erreur"
+
+
+class JobAnnule(Exception):
+    pass
+
+
+class FileJobsPleine(RuntimeError):
+    pass
+
+
+# =========================
+# JOB
+# =========================
+class Job:
+    """
+    Tâche de fond : identifiant, étape courante, progression par étape,
+    annulation coopérative et résultat.
+    """
+
+    def __init__(self, etapes):
+        self.id = uuid.uuid4().hex[:12]
+        self.etapes = tuple(etapes)
+        self.etat = EN_ATTENTE
+        self.etape = None
+        self.progression = {etape: 0.0 for etape in self.etapes}
+        self.partiel = {}
+        self.resultat = None
+        self.erreur = None
+        self.cree_a = time.time()
+        self.termine_a = None
+        self._annulation = threading.Event()
+
+    # --- côté interface ---
+    def annuler(self):
+        self._annulation.set()
+
+    @property
+    def annule(self):
+        return self._annulation.is_set()
+
+    @property
+    def fini(self):
+        return self.etat in (TERMINE, ANNULE, ERREUR)
+
+    def prendre_resultat(self):
+        """
+        Remet le résultat à l'appelant et le libère : le gestionnaire ne garde
+        que l'état et les horodatages, la mémoire passe au budget du store de sessions.
+        """
+        resultat, self.resultat = self.resultat, None
+        return resultat
+
+    def fraction_totale(self):
+        return sum(self.progression.values()) / max(len(self.etapes), 1)
+
+    # --- côté worker ---
+    def verifier_annulation(self):
+        if self._annulation.is_set():
+            raise JobAnnule(self.id)
+
+    def avancer(self, etape, fraction=1.0):
+        """Enregistre la progression d'une étape (0..1) et vérifie l'annulation."""
+        self.etape = etape
+        self.progression[etape] = min(max(fraction, 0.0), 1.0)
+        self.verifier_annulation()
+
+
+# =========================
+# GESTIONNAIRE
+# =========================
+class GestionnaireJobs:
+    """
+    Pool de workers borné avec contrôle d'admission : au-delà de
+    `max_en_attente` jobs non terminés, les nouvelles soumissions sont refusées.
+    """
+
+    def __init__(self, nb_workers=NB_WORKERS, max_en_attente=MAX_EN_ATTENTE):
+        self.max_en_attente = max_en_attente
+        self._pool = ThreadPoolExecutor(max_workers=nb_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._verrou = threading.Lock()
+
+    def soumettre(self, fn, *args, etapes=(), **kwargs):
+        """Lance `fn(job, *args, **kwargs)` en arrière-plan et renvoie le Job."""
+        with self._verrou:
+            self._purger()
+            actifs = sum(1 for job in self._jobs.values() if not job.fini)
+            if actifs >= self.max_en_attente:
+                raise FileJobsPleine(
+                    f"{actifs} analyses en cours, réessayez dans quelques instants"
+                )
+            job = Job(etapes)
+            self._jobs[job.id] = job
+
+        self._pool.submit(self._executer, job, fn, args, kwargs)
+        return job
+
+    def _executer(self, job, fn, args, kwargs):
+        etat = ERREUR
+        try:
+            job.verifier_annulation()
+            job.etat = EN_COURS
+            job.resultat = fn(job, *args, **kwargs)
+            etat = TERMINE
+        except JobAnnule:
+            etat = ANNULE
+        except Exception as e:
+            job.erreur = e
+        finally:
+            # L'état final est publié en dernier : un job `fini` a toujours son termine_a
+            job.partiel = {}
+            job.termine_a = time.time()
+            job.etat = etat
+
+    def get(self, job_id):
+        with self._verrou:
+            self._purger()
+            return self._jobs.get(job_id)
+
+    def _purger(self):
+        maintenant = time.time()
+        for job in list(self._jobs.values()):
+            if not job.fini or job.termine_a is None:
+                continue
+            if job.termine_a < maintenant - DUREE_CONSERVATION_S:
+                del self._jobs[job.id]
+            elif job.resultat is not None and job.termine_a < maintenant - DUREE_RESULTAT_S:
+                job.resultat = None
+
+    def stats(self):
+        with self._verrou:
+            self._purger()
+            jobs = list(self._jobs.values())
+        return {
+            etat: sum(1 for j in jobs if j.etat == etat)
+            for etat in (EN_ATTENTE, EN_COURS, TERMINE, ANNULE, ERREUR)
+        }
+
+
+_gestionnaire = None
+_verrou_gestionnaire = threading.Lock()
+
+
+def gestionnaire_jobs():
+    """Gestionnaire partagé par toutes les sessions du processus."""
+    global _gestionnaire
+    with _verrou_gestionnaire:
+        if _gestionnaire is None:
+            _gestionnaire = GestionnaireJobs()
+        return _gestionnaire
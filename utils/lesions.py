@@ -0,0 +1,133 @@
+import cv2
+import numpy as np
+import pandas as pd
+from scipy import ndimage as ndi
+from skimage.measure import label
+
+from utils.mesures import CLASSES
+
+# =========================
+# PARAMÈTRES
+# =========================
+CONNECTIVITE = 3   # 26-connexité : deux voxels qui se touchent par un coin = même lésion
+
+COLONNES_LESIONS = (
+    ["lesion", "voxels", "volume_mm3"]
+    + [f"volume_{nom}_mm3" for nom in CLASSES.values()]
+    + ["z_min", "z_max", "y_min", "y_max", "x_min", "x_max"]
+    + ["centroide_z", "centroide_y", "centroide_x"]
+    + ["diametre_axial_max_mm", "coupe_diametre_max"]
+)
+
+
+def _diametre_max(points_mm):
+    """Plus grande distance entre deux points d'un nuage 2D (via l'enveloppe convexe)."""
+    if len(points_mm) < 2:
+        return 0.0
+    hull = cv2.convexHull(points_mm.astype(np.float32)).reshape(-1, 2)
+    diff = hull[:, None, :] - hull[None, :, :]
+    return float(np.sqrt((diff ** 2).sum(-1)).max())
+
+
+def _diametres_axiaux(labels, n_lesions, espacement):
+    """
+    Diamètre axial maximal (mm) de chaque lésion et coupe correspondante.
+    Les voxels sont groupés par (lésion, coupe) par un tri unique ; seule
+    l'enveloppe convexe de chaque groupe est parcourue.
+    """
+    dx, dy, _ = espacement
+    z, y, x = np.nonzero(labels)
+    lab = labels[z, y, x]
+
+    cle = lab.astype(np.int64) * labels.shape[0] + z
+    ordre = np.argsort(cle, kind="stable")
+    cle, y, x, lab, z = cle[ordre], y[ordre], x[ordre], lab[ordre], z[ordre]
+    debuts = np.flatnonzero(np.r_[True, cle[1:] != cle[:-1]])
+    fins = np.r_[debuts[1:], len(cle)]
+
+    # lignes du masque = axe x NIfTI (dx), colonnes = axe y (dy)
+    points = np.stack([y * dx, x * dy], axis=1)
+
+    diametres = np.zeros(n_lesions + 1)
+    coupes = np.zeros(n_lesions + 1, dtype=np.int64)
+    for debut, fin in zip(debuts, fins):
+        d = _diametre_max(points[debut:fin])
+        if d > diametres[lab[debut]]:
+            diametres[lab[debut]] = d
+            coupes[lab[debut]] = z[debut]
+    return diametres[1:], coupes[1:]
+
+
+# =========================
+# ANALYSE 3D
+# =========================
+def analyser_lesions(mask, espacement, connectivite=CONNECTIVITE):
+    """
+    Étiquette les composantes connexes 3D de la tumeur (mask > 0) et renvoie
+    (labels int32, DataFrame avec une ligne par lésion).
+
+    Volumes par classe, centroïdes et boîtes englobantes sont agrégés par
+    bincount / find_objects, sans boucle Python sur les voxels.
+    """
+    labels, n_lesions = label(mask > 0, connectivity=connectivite, return_num=True)
+    labels = labels.astype(np.int32)
+    if n_lesions == 0:
+        return labels, pd.DataFrame(columns=COLONNES_LESIONS)
+
+    dx, dy, dz = espacement
+    volume_voxel = dx * dy * dz
+    n_classes = max(CLASSES) + 1
+
+    # Voxels par (lésion, classe)
+    comptes = np.bincount(
+        labels.ravel().astype(np.int64) * n_classes + mask.ravel(),
+        minlength=(n_lesions + 1) * n_classes
+    ).reshape(n_lesions + 1, n_classes)[1:]
+    voxels = comptes.sum(axis=1)
+
+    # Centroïdes (indices de voxels) par sommes pondérées
+    z, y, x = np.nonzero(labels)
+    lab = labels[z, y, x]
+    centroides = np.stack([
+        np.bincount(lab, weights=coord, minlength=n_lesions + 1)[1:] / voxels
+        for coord in (z, y, x)
+    ], axis=1)
+
+    # Boîtes englobantes (bornes incluses)
+    boites = np.array([
+        [borne for s in objet for borne in (s.start, s.stop - 1)]
+        for objet in ndi.find_objects(labels)
+    ])
+
+    diametres, coupes = _diametres_axiaux(labels, n_lesions, espacement)
+
+    tableau = pd.DataFrame({
+        "lesion": np.arange(1, n_lesions + 1),
+        "voxels": voxels,
+        "volume_mm3": voxels * volume_voxel,
+        **{f"volume_{nom}_mm3": comptes[:, classe] * volume_voxel for classe, nom in CLASSES.items()},
+        "z_min": boites[:, 0], "z_max": boites[:, 1],
+        "y_min": boites[:, 2], "y_max": boites[:, 3],
+        "x_min": boites[:, 4], "x_max": boites[:, 5],
+        "centroide_z": centroides[:, 0],
+        "centroide_y": centroides[:, 1],
+        "centroide_x": centroides[:, 2],
+        "diametre_axial_max_mm": diametres,
+        "coupe_diametre_max": coupes,
+    })
+    tableau = tableau.sort_values("volume_mm3", ascending=False, ignore_index=True)
+    return labels, tableau
+
+
+# =========================
+# STOCKAGE AVEC LE MASQUE
+# =========================
+def tableau_en_array(tableau):
+    """DataFrame des lésions -> array float64 (stockable dans un .npz)."""
+    return tableau[COLONNES_LESIONS].to_numpy(dtype=np.float64)
+
+
+def array_en_tableau(array):
+    tableau = pd.DataFrame(np.asarray(array).reshape(-1, len(COLONNES_LESIONS)), columns=COLONNES_LESIONS)
+    entiers = ["lesion", "voxels", "z_min", "z_max", "y_min", "y_max", "x_min", "x_max", "coupe_diametre_max"]
+    return tableau.astype({c: np.int64 for c in entiers})
@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+import pandas as pd
+from scipy import ndimage as ndi
+
+# =========================
+# CLASSES DU MODÈLE
+# =========================
+CLASSES = {1: "necrose", 2: "oedeme", 3: "renforcee"}
+
+# Poids de périmètre par configuration de voisinage (cf. skimage.measure.perimeter, 4-connexité)
+_POIDS_PERIMETRE = np.zeros(50, dtype=np.float64)
+_POIDS_PERIMETRE[[5, 7, 15, 17, 25, 27]] = 1
+_POIDS_PERIMETRE[[21, 33]] = np.sqrt(2)
+_POIDS_PERIMETRE[[13, 23]] = (1 + np.sqrt(2)) / 2
+
+# Remplissage des trous coupe par coupe : connexité 2D dans le plan, aucune entre coupes
+_STRUCTURE_COUPE = np.zeros((3, 3, 3), dtype=bool)
+_STRUCTURE_COUPE[1] = ndi.generate_binary_structure(2, 1)
+
+
+def espacement_modele(zooms, shape_native, img_size):
+    """
+    Taille (mm) d'un voxel du masque : les coupes natives (nx, ny) sont
+    redimensionnées en img_size x img_size, l'épaisseur de coupe dz est inchangée.
+    """
+    dx, dy, dz = zooms
+    return (dx * shape_native[0] / img_size, dy * shape_native[1] / img_size, dz)
+
+
+# =========================
+# MESURES
+# =========================
+def calculer_mesures_physiques(mask_slice, dx, dy):
+    binary = (mask_slice > 0).astype(np.uint8)
+
+    surface_mm2 = np.sum(binary) * dx * dy
+
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    perimetre_pixels = sum(cv2.arcLength(cnt, True) for cnt in contours)
+    perimetre_mm = perimetre_pixels * dx
+
+    surface_totale_mm2 = binary.shape[0] * binary.shape[1] * dx * dy
+    densite = surface_mm2 / surface_totale_mm2 if surface_totale_mm2 > 0 else 0
+
+    return surface_mm2, perimetre_mm, densite
+
+
+def _voisins(volume):
+    """Décalages (haut, bas, gauche, droite, diagonales) de chaque coupe, bord à zéro."""
+    p = np.pad(volume, ((0, 0), (1, 1), (1, 1)))
+    croix = (p[:, :-2, 1:-1], p[:, 2:, 1:-1], p[:, 1:-1, :-2], p[:, 1:-1, 2:])
+    diagonales = (p[:, :-2, :-2], p[:, :-2, 2:], p[:, 2:, :-2], p[:, 2:, 2:])
+    return croix, diagonales
+
+
+def perimetres_pixels(binary):
+    """
+    Périmètre externe (en pixels) de chaque coupe d'un volume binaire (N, H, W),
+    calculé en un seul passage vectorisé sur tout le volume
+    (même estimateur que skimage.measure.perimeter, 4-connexité).
+    Les trous sont remplis d'abord : comme l'ancien contour cv2 RETR_EXTERNAL,
+    le bord d'une cavité (nécrose au centre d'un anneau...) n'est pas compté.
+    """
+    binary = ndi.binary_fill_holes(binary, structure=_STRUCTURE_COUPE).astype(np.uint8)
+
+    croix, _ = _voisins(binary)
+    erode = binary & croix[0] & croix[1] & croix[2] & croix[3]
+    bord = binary - erode
+
+    croix, diagonales = _voisins(bord)
+    codes = bord + 2 * (croix[0] + croix[1] + croix[2] + croix[3]) \
+        + 10 * (diagonales[0] + diagonales[1] + diagonales[2] + diagonales[3])
+    return _POIDS_PERIMETRE[codes].sum(axis=(1, 2))
+
+
+def tableau_mesures(mask, espacement):
+    """
+    Surface (mm²), périmètre (mm) et densité de chaque coupe, pour la tumeur
+    entière et pour chaque classe. Une ligne par coupe : le slider indexe ce tableau.
+    """
+    dx, dy, _ = espacement
+    n_slices, h, w = mask.shape
+    surface_coupe = h * w * dx * dy
+
+    colonnes = {"coupe": np.arange(n_slices)}
+    regions = {"tumeur": mask > 0}
+    regions.update({nom: mask == classe for classe, nom in CLASSES.items()})
+
+    for nom, binary in regions.items():
+        surface = binary.sum(axis=(1, 2)) * dx * dy
+        colonnes[f"{nom}_surface_mm2"] = surface
+        colonnes[f"{nom}_perimetre_mm"] = perimetres_pixels(binary) * dx
+        colonnes[f"{nom}_densite"] = surface / surface_coupe
+
+    return pd.DataFrame(colonnes)
+
+
+def volumes_par_classe(mask, espacement):
+    """Volumes (mm³) de la tumeur entière et de chaque classe."""
+    dx, dy, dz = espacement
+    comptes = np.bincount(mask.ravel(), minlength=max(CLASSES) + 1)
+    volume_voxel = dx * dy * dz
+
+    volumes = {"tumeur": float(comptes[1:].sum() * volume_voxel)}
+    volumes.update({nom: float(comptes[classe] * volume_voxel) for classe, nom in CLASSES.items()})
+    return volumes
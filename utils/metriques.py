@@ -0,0 +1,263 @@
+import contextvars
+import json
+import os
+import resource
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# =========================
+# PARAMÈTRES
+# =========================
+JOURNAL_METRIQUES = os.environ.get("BT_METRIQUES_LOG", "logs/metriques.jsonl")
+FICHIER_PROMETHEUS = os.environ.get("BT_METRIQUES_PROM", "logs/metriques.prom")
+METRIQUES_ACTIVES = os.environ.get("BT_METRIQUES", "1") != "0"
+PANNEAU_ADMIN = os.environ.get("BT_ADMIN") == "1"
+
+# Bornes des histogrammes de latence (secondes)
+BORNES_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FENETRE_QUANTILES = 2048   # dernières durées gardées par étape pour p50 / p99
+
+_trace_courante = contextvars.ContextVar("trace_courante", default=None)
+
+
+def rss_octets():
+    """Mémoire résidente actuelle (Linux), sinon pic du processus."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return pic_rss_octets()
+
+
+def pic_rss_octets():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# =========================
+# AGRÉGATS PAR ÉTAPE
+# =========================
+class _Serie:
+    def __init__(self):
+        self.compte = 0
+        self.somme = 0.0
+        self.buckets = [0] * len(BORNES_S)
+        self.recentes = deque(maxlen=FENETRE_QUANTILES)
+        self.pic_memoire_max = 0
+
+    def observer(self, duree, pic_memoire):
+        self.compte += 1
+        self.somme += duree
+        for i, borne in enumerate(BORNES_S):
+            if duree <= borne:
+                self.buckets[i] += 1
+        self.recentes.append(duree)
+        self.pic_memoire_max = max(self.pic_memoire_max, pic_memoire)
+
+
+class Metriques:
+    """
+    Agrégats par (page, étape) de toutes les traces du processus :
+    histogramme de latence cumulatif (Prometheus), fenêtre glissante pour
+    p50 / p99 et plus forte hausse du pic de mémoire résidente.
+    """
+
+    def __init__(self, journal=JOURNAL_METRIQUES, prometheus=FICHIER_PROMETHEUS):
+        self.journal = journal
+        self.prometheus = prometheus
+        self._series = {}
+        self._verrou = threading.Lock()
+        self._verrou_fichiers = threading.Lock()
+
+    def observer(self, page, etape, duree, pic_memoire):
+        with self._verrou:
+            serie = self._series.get((page, etape))
+            if serie is None:
+                serie = self._series[(page, etape)] = _Serie()
+            serie.observer(duree, pic_memoire)
+
+    def etapes(self, page=None):
+        """Une ligne par étape : nombre, p50 / p99 / max (ms), pic mémoire max (Mo)."""
+        with self._verrou:
+            series = [(cle, s.compte, list(s.recentes), s.pic_memoire_max)
+                      for cle, s in self._series.items() if page is None or cle[0] == page]
+        lignes = []
+        for (p, etape), compte, recentes, pic in sorted(series):
+            p50, p99 = (float(q) for q in np.percentile(recentes, [50, 99]))
+            lignes.append({
+                "page": p, "etape": etape, "n": compte,
+                "p50_ms": 1000 * p50, "p99_ms": 1000 * p99, "max_ms": 1000 * max(recentes),
+                "pic_memoire_mo": pic / 2 ** 20,
+            })
+        return lignes
+
+    def texte_prometheus(self):
+        """Exposition au format texte Prometheus (histogrammes + résumés p50/p99)."""
+        with self._verrou:
+            series = [(cle, s.compte, s.somme, list(s.buckets), list(s.recentes), s.pic_memoire_max)
+                      for cle, s in sorted(self._series.items())]
+        lignes = [
+            "# HELP bt_etape_duree_secondes Durée des étapes d'analyse",
+            "# TYPE bt_etape_duree_secondes histogram",
+        ]
+        for (page, etape), compte, somme, buckets, _, _ in series:
+            labels = f'page="{page}",etape="{etape}"'
+            for borne, n in zip(BORNES_S, buckets):
+                lignes.append(f'bt_etape_duree_secondes_bucket{{{labels},le="{borne}"}} {n}')
+            lignes.append(f'bt_etape_duree_secondes_bucket{{{labels},le="+Inf"}} {compte}')
+            lignes.append(f"bt_etape_duree_secondes_sum{{{labels}}} {somme:.6f}")
+            lignes.append(f"bt_etape_duree_secondes_count{{{labels}}} {compte}")
+
+        lignes += [
+            f"# HELP bt_etape_duree_recente_secondes Quantiles sur les {FENETRE_QUANTILES} dernières exécutions",
+            "# TYPE bt_etape_duree_recente_secondes summary",
+        ]
+        for (page, etape), _, _, _, recentes, _ in series:
+            labels = f'page="{page}",etape="{etape}"'
+            for q, v in zip(("0.5", "0.99"), np.percentile(recentes, [50, 99])):
+                lignes.append(f'bt_etape_duree_recente_secondes{{{labels},quantile="{q}"}} {v:.6f}')
+            lignes.append(f"bt_etape_duree_recente_secondes_sum{{{labels}}} {sum(recentes):.6f}")
+            lignes.append(f"bt_etape_duree_recente_secondes_count{{{labels}}} {len(recentes)}")
+
+        lignes += [
+            "# HELP bt_etape_pic_memoire_octets Plus forte hausse du pic de mémoire résidente pendant l'étape",
+            "# TYPE bt_etape_pic_memoire_octets gauge",
+        ]
+        for (page, etape), _, _, _, _, pic in series:
+            lignes.append(f'bt_etape_pic_memoire_octets{{page="{page}",etape="{etape}"}} {pic}')
+        return "\n".join(lignes) + "\n"
+
+    def exporter(self, trace):
+        """Ajoute la trace au journal JSON (une ligne) et réécrit le fichier Prometheus."""
+        if not METRIQUES_ACTIVES:
+            return
+        ligne = json.dumps(trace.en_dict(), ensure_ascii=False)
+        texte = self.texte_prometheus()
+        with self._verrou_fichiers:
+            try:
+                if self.journal:
+                    os.makedirs(os.path.dirname(self.journal) or ".", exist_ok=True)
+                    with open(self.journal, "a", encoding="utf-8") as f:
+                        f.write(ligne + "\n")
+                if self.prometheus:
+                    # Écriture atomique : le collecteur ne lit jamais un fichier à moitié écrit
+                    os.makedirs(os.path.dirname(self.prometheus) or ".", exist_ok=True)
+                    temporaire = f"{self.prometheus}.tmp"
+                    with open(temporaire, "w", encoding="utf-8") as f:
+                        f.write(texte)
+                    os.replace(temporaire, self.prometheus)
+            except OSError as e:
+                print(f"==> Métriques non exportées : {e}")
+
+
+_metriques = None
+_verrou_metriques = threading.Lock()
+
+
+def metriques():
+    """Agrégats partagés par toutes les sessions du processus."""
+    global _metriques
+    with _verrou_metriques:
+        if _metriques is None:
+            _metriques = Metriques()
+        return _metriques
+
+
+# =========================
+# TRACES ET SPANS
+# =========================
+class Trace:
+    """
+    Spans d'une exécution (une analyse, un passage de page). Activée comme
+    contexte courant : `span()` y enregistre chaque étape, y compris depuis
+    les fonctions de utils/ appelées par la page ou le worker.
+    """
+
+    def __init__(self, page, **attributs):
+        self.id = uuid.uuid4().hex[:12]
+        self.page = page
+        self.attributs = attributs
+        self.spans = []
+        self.debut = time.time()
+        self.duree = None
+        self.statut = None
+        self._jeton = None
+
+    def activer(self):
+        self._jeton = _trace_courante.set(self)
+        return self
+
+    def terminer(self, statut="ok", exporter=True):
+        """
+        Désactive la trace et l'exporte (sans span : rien n'est écrit). Avec
+        `exporter=False`, les spans restent dans les agrégats en mémoire mais
+        ni le journal ni le fichier Prometheus ne sont réécrits.
+        """
+        if self._jeton is not None:
+            try:
+                _trace_courante.reset(self._jeton)
+            except ValueError:
+                # Terminée depuis un autre contexte que celui de l'activation
+                pass
+            self._jeton = None
+        if self.duree is not None:
+            return
+        self.duree = time.time() - self.debut
+        self.statut = statut
+        if self.spans and exporter:
+            metriques().exporter(self)
+
+    def __enter__(self):
+        return self.activer()
+
+    def __exit__(self, type_exc, exc, tb):
+        self.terminer("ok" if type_exc is None else type_exc.__name__)
+        return False
+
+    def en_dict(self):
+        return {
+            "trace": self.id,
+            "page": self.page,
+            "debut": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.debut)),
+            "duree_ms": round(1000 * (self.duree or 0.0), 3),
+            "statut": self.statut,
+            **self.attributs,
+            "spans": list(self.spans),
+        }
+
+
+def trace_courante():
+    return _trace_courante.get()
+
+
+@contextmanager
+def span(etape):
+    """
+    Chronomètre un bloc et mesure la mémoire résidente avant / après ainsi que
+    la hausse du pic du processus (approximation : le processus est partagé
+    entre les sessions). Sans trace courante, le bloc s'exécute sans mesure.
+    """
+    trace = _trace_courante.get()
+    if trace is None or not METRIQUES_ACTIVES:
+        yield
+        return
+
+    rss_avant, pic_avant = rss_octets(), pic_rss_octets()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        duree = time.perf_counter() - t0
+        pic = pic_rss_octets() - pic_avant
+        trace.spans.append({
+            "etape": etape,
+            "debut_ms": round(1000 * (time.time() - trace.debut - duree), 3),
+            "duree_ms": round(1000 * duree, 3),
+            "delta_rss_mo": round((rss_octets() - rss_avant) / 2 ** 20, 3),
+            "pic_memoire_mo": round(pic / 2 ** 20, 3),
+        })
+        metriques().observer(trace.page, etape, duree, pic)
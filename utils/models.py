@@ -0,0 +1,155 @@
+import threading
+import time
+
+import numpy as np
+
+from utils.backends import backend_configure, charger_backend
+from utils.compilation import appliquer_threads, charger_profil, compiler_selon_profil
+
+# =========================
+# MODÈLES DISPONIBLES
+# =========================
+MODELES = {
+    "segmentation": "models/model_x81_dcs65.h5",
+    "classification": "models/effnet.h5",
+}
+
+
+def _custom_objects(nom):
+    if nom != "classification":
+        return None
+
+    from tensorflow.keras.layers import DepthwiseConv2D
+
+    # Custom object pour DepthwiseConv2D (ignore l'argument 'groups' si nécessaire)
+    class FixedDepthwiseConv2D(DepthwiseConv2D):
+        def __init__(self, *args, **kwargs):
+            kwargs.pop("groups", None)  # supprime l'argument non reconnu
+            super().__init__(*args, **kwargs)
+
+    return {"DepthwiseConv2D": FixedDepthwiseConv2D}
+
+
+def charger_keras(nom, path=None):
+    """Charge un modèle Keras du registre (sans compilation)."""
+    # Pools de threads TF du profil machine, avant toute opération TF
+    appliquer_threads()
+    from tensorflow import keras
+
+    return keras.models.load_model(
+        path or MODELES[nom],
+        custom_objects=_custom_objects(nom),
+        compile=False
+    )
+
+
+def charger_modele(nom, path=None, backend=None, compiler=True):
+    """
+    Charge un modèle du registre avec son backend d'exécution
+    (Keras par défaut, ou TFLite float16 / int8 : voir utils/backends.py).
+
+    Avec un profil d'inférence (utils/autotune.py), un modèle Keras est
+    enveloppé dans des graphes à signature fixe (utils/compilation.py).
+    """
+    path = path or MODELES[nom]
+    backend = backend or backend_configure(nom)
+    profil = charger_profil()
+    model = charger_backend(backend, path, lambda: charger_keras(nom, path), profil.get("intra_op"))
+    if backend == "keras" and compiler:
+        model = compiler_selon_profil(nom, model, profil)
+    return model
+
+
+def warmup(model):
+    """Prédiction sur un batch factice : trace le graphe avant la première vraie requête."""
+    if hasattr(model, "precompiler"):
+        model.precompiler()
+        return
+    shape = tuple(d or 1 for d in model.input_shape[1:])
+    model.predict_on_batch(np.zeros((1,) + shape, dtype=np.float32))
+
+
+# =========================
+# REGISTRE
+# =========================
+class RegistreModeles:
+    """
+    Une seule copie de chaque modèle par processus.
+
+    `demarrer()` lance le chargement + warm-up de tous les modèles dans un
+    thread d'arrière-plan ; `get()` attend qu'un modèle soit prêt (ou le
+    charge immédiatement si le préchargement n'a pas été lancé).
+    """
+
+    def __init__(self, modeles=MODELES):
+        self.modeles = dict(modeles)
+        self.durees = {}
+        self._instances = {}
+        self._erreurs = {}
+        self._prets = {nom: threading.Event() for nom in self.modeles}
+        self._verrou = threading.Lock()
+        self._verrou_chargement = threading.Lock()
+        self._thread = None
+
+    def demarrer(self):
+        with self._verrou:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._charger_tout, name="prechargement-modeles", daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def _charger_tout(self):
+        for nom in self.modeles:
+            self._charger(nom)
+
+    def _charger(self, nom):
+        with self._verrou_chargement:
+            if self._prets[nom].is_set():
+                return
+            try:
+                t0 = time.perf_counter()
+                model = charger_modele(nom, self.modeles[nom])
+                t1 = time.perf_counter()
+                warmup(model)
+                t2 = time.perf_counter()
+
+                self._instances[nom] = model
+                self.durees[nom] = {"chargement_s": t1 - t0, "warmup_s": t2 - t1}
+                print(f"==> Modèle {nom} chargé en {t1 - t0:.2f}s (warm-up {t2 - t1:.2f}s)")
+            except Exception as e:
+                self._erreurs[nom] = e
+                print(f"==> Échec du chargement du modèle {nom} : {e}")
+            finally:
+                self._prets[nom].set()
+
+    def get(self, nom, timeout=None):
+        if self._thread is None:
+            self._charger(nom)
+        elif not self._prets[nom].wait(timeout):
+            raise TimeoutError(f"Modèle {nom} toujours en chargement")
+
+        if nom in self._erreurs:
+            raise RuntimeError(f"Impossible de charger le modèle {nom}") from self._erreurs[nom]
+        return self._instances[nom]
+
+    def etat(self):
+        """{nom: 'prêt' | 'en chargement' | 'erreur'}"""
+        etats = {}
+        for nom, pret in self._prets.items():
+            if nom in self._erreurs:
+                etats[nom] = "erreur"
+            elif pret.is_set():
+                etats[nom] = "prêt"
+            else:
+                etats[nom] = "en chargement"
+        return etats
+
+
+_registre = RegistreModeles()
+
+
+def registre():
+    """Registre partagé par toutes les sessions Streamlit du processus."""
+    return _registre
@@ -0,0 +1,235 @@
+import json
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from utils.ingest import sauvegarder_upload, charger_coupes, supprimer_fichiers, lire_geometrie
+from utils.extent import fenetre_coupes, coupes_actives
+from utils.resample import preparer_entree
+from utils.inference import segmenter_volume, segmenter_progressif, TAILLE_BLOC_INFERENCE
+from utils.tuiles import preparer_natif, segmenter_tuiles
+from utils.cache import cache_resultats
+from utils.mesures import espacement_modele, tableau_mesures, volumes_par_classe
+from utils.lesions import analyser_lesions, tableau_en_array, array_en_tableau
+from utils.viewer import en_uint8, superposer, compacter, rendre_coupes, vues_en_arrays, arrays_en_vues
+from utils.metriques import Trace, span
+
+# =========================
+# PARAMÈTRES
+# =========================
+IMG_SIZE = 128
+VOLUME_START_AT = 22
+VOLUME_SLICES = 100
+
+ETAPES_SEGMENTATION = ("ingest", "resample", "infer", "measure", "render")
+
+# Entrée de cache complète : un hit ne relit, ne remesure et ne redessine rien
+CHAMPS_CACHE = ("mask", "lesions", "flair", "t1ce", "mesures", "vues_octets", "vues_tailles", "meta")
+
+
+# =========================
+# FONCTIONS
+# =========================
+def charger_volumes(flair_path, t1ce_path, debut=VOLUME_START_AT, haute_resolution=False):
+    # Seules les coupes utilisées par le modèle sont lues (float32)
+    flair, zooms = charger_coupes(flair_path, debut, VOLUME_SLICES)
+    t1ce, _ = charger_coupes(t1ce_path, debut, VOLUME_SLICES)
+
+    # Taille des voxels du masque : native en haute résolution,
+    # sinon celle des coupes redimensionnées en IMG_SIZE x IMG_SIZE
+    espacement = zooms if haute_resolution else espacement_modele(zooms, flair.shape, IMG_SIZE)
+    return flair, t1ce, espacement
+
+
+def load_and_preprocess_data(flair_path, t1ce_path):
+    debut = fenetre_coupes(flair_path, VOLUME_SLICES, VOLUME_START_AT)
+    flair, t1ce, espacement = charger_volumes(flair_path, t1ce_path, debut)
+
+    # Redimensionnement de tout le slab en un passage + normalisation en place
+    X = preparer_entree([flair, t1ce], IMG_SIZE)
+
+    return X, flair, t1ce, espacement
+
+
+def apercu_coupe(flair_slice, mask_slice):
+    """Image RGB uint8 : FLAIR redimensionné au masque, avec le masque superposé."""
+    fond = cv2.resize(flair_slice, mask_slice.shape[::-1])
+    return superposer(en_uint8(fond), mask_slice)
+
+
+# =========================
+# JOB DE SEGMENTATION
+# =========================
+def executer_segmentation(job, flair_file, t1ce_file, cle, model_fn,
+                          taille_bloc=TAILLE_BLOC_INFERENCE, candidats=False,
+                          haute_resolution=False, apercu=False):
+    """
+    Pipeline complet exécuté dans un worker (utils/jobs.py) :
+    ingest -> resample -> infer -> measure -> render.
+
+    `model_fn()` renvoie le modèle (appelé seulement en cas de cache manquant).
+    Le masque partiel est publié dans `job.partiel` pour l'aperçu en direct.
+    Seules les coupes contenant du cerveau (et, si `candidats`, un signal FLAIR
+    suspect) passent par le modèle ; les autres sont marquées fond.
+    `haute_resolution` : segmentation par tuiles sur les coupes natives
+    (utils/tuiles.py), masque et mesures à la résolution d'origine.
+    `apercu` (mode standard) : aperçu interpolé sur une coupe sur 4, puis
+    affinage des autres coupes ; `job.partiel["affinees"]` suit l'affinage.
+    Le résultat contient la trace des étapes (utils/metriques.py).
+    """
+    trace = Trace("segmentation", job=job.id, haute_resolution=haute_resolution, apercu=apercu)
+    with trace:
+        resultat = _segmentation(job, flair_file, t1ce_file, cle, model_fn,
+                                 taille_bloc, candidats, haute_resolution, apercu)
+    resultat["trace"] = trace.en_dict()
+    return resultat
+
+
+def _vers_cache(resultat):
+    """Résultat d'un job -> arrays du .npz (scalaires et géométrie en JSON)."""
+    geometrie = resultat["geometrie"]
+    meta = {
+        "debut": int(resultat["debut"]),
+        "espacement": [float(e) for e in resultat["espacement"]],
+        "volumes": resultat["volumes"],
+        "colonnes_mesures": list(resultat["mesures"].columns),
+        "shape_native": list(geometrie["shape"]),
+        "affine": np.asarray(geometrie["affine"]).tolist(),
+    }
+    vues_octets, vues_tailles = vues_en_arrays(resultat["vues"])
+    return {
+        "mask": resultat["mask"],
+        "lesions": tableau_en_array(resultat["lesions"]),
+        "flair": resultat["flair"],
+        "t1ce": resultat["t1ce"],
+        "mesures": resultat["mesures"].to_numpy(dtype=np.float64),
+        "vues_octets": vues_octets,
+        "vues_tailles": vues_tailles,
+        "meta": np.array(json.dumps(meta)),
+    }
+
+
+def _depuis_cache(entree):
+    """Inverse de `_vers_cache` (l'en-tête NIfTI source n'est pas conservé, comme dans l'historique)."""
+    meta = json.loads(entree["meta"].item())
+    mesures = pd.DataFrame(entree["mesures"], columns=meta["colonnes_mesures"])
+    mesures["coupe"] = mesures["coupe"].astype(np.int64)
+    return {
+        "debut": meta["debut"],
+        "geometrie": {"shape": tuple(meta["shape_native"]), "affine": np.array(meta["affine"])},
+        "mask": entree["mask"],
+        "flair": entree["flair"],
+        "t1ce": entree["t1ce"],
+        "espacement": tuple(meta["espacement"]),
+        "mesures": mesures,
+        "volumes": meta["volumes"],
+        "lesions": array_en_tableau(entree["lesions"]),
+        "vues": arrays_en_vues(entree["vues_octets"], entree["vues_tailles"]),
+    }
+
+
+def _segmentation(job, flair_file, t1ce_file, cle, model_fn,
+                  taille_bloc, candidats, haute_resolution, apercu):
+    # Vue répétée : servie depuis le cache avant toute lecture des fichiers
+    cache = cache_resultats()
+    with span("cache.lecture"):
+        entree = cache.get(cle, requis=CHAMPS_CACHE)
+    if entree is not None:
+        with span("cache.decodage"):
+            resultat = _depuis_cache(entree)
+        for etape in ETAPES_SEGMENTATION:
+            job.avancer(etape, 1.0)
+        resultat["cle"] = cle
+        return resultat
+
+    # --- ingest ---
+    job.avancer("ingest", 0.0)
+    with span("ingest.fichier_temporaire"):
+        flair_path = sauvegarder_upload(flair_file)
+        t1ce_path = sauvegarder_upload(t1ce_file)
+    try:
+        # Forme + affine du volume source, pour l'export du masque en géométrie native
+        with span("ingest.geometrie"):
+            geometrie = lire_geometrie(flair_path)
+            debut = fenetre_coupes(flair_path, VOLUME_SLICES, VOLUME_START_AT)
+        with span("ingest.lecture_nifti"):
+            flair, t1ce, espacement = charger_volumes(flair_path, t1ce_path, debut, haute_resolution)
+    finally:
+        supprimer_fichiers(flair_path, t1ce_path)
+    job.avancer("ingest", 1.0)
+
+    # --- resample (aucun redimensionnement en haute résolution) ---
+    with span("resample.redimensionnement_normalisation"):
+        if haute_resolution:
+            X = preparer_natif([flair, t1ce])
+        else:
+            X = preparer_entree([flair, t1ce], IMG_SIZE)
+    job.avancer("resample", 1.0)
+
+    # --- infer ---
+    with span("modele.chargement"):
+        model = model_fn()
+
+    # Slab lié explicitement : le nom `flair` est supprimé avant la fin de la fonction
+    def publier(mask, start, stop, fraction, flair=flair):
+        job.partiel = {"mask": mask, "flair": flair, "coupe": (start + stop) // 2}
+        job.avancer("infer", fraction)
+
+    def publier_progressif(mask, affinees, fraction, flair=flair):
+        # Coupes hors cerveau : fond définitif, déjà "affinées"
+        job.partiel = {"mask": mask, "flair": flair, "affinees": affinees | ~actives,
+                       "espacement": espacement}
+        job.avancer("infer", fraction)
+
+    with span("infer.coupes_actives"):
+        actives = coupes_actives(flair, candidats)
+    # Sous-étapes predict / argmax enregistrées par utils/inference.py
+    if haute_resolution:
+        mask = segmenter_tuiles(model, X, actives, callback=publier)
+    elif apercu:
+        mask = segmenter_progressif(
+            model, X, taille_bloc=taille_bloc, callback=publier_progressif, actives=actives
+        )
+    else:
+        mask = segmenter_volume(model, X, taille_bloc, callback=publier, actives=actives)
+    del X
+
+    # --- measure : une seule passe vectorisée, toutes coupes et classes ---
+    with span("measure.mesures_physiques"):
+        mesures = tableau_mesures(mask, espacement)
+        volumes = volumes_par_classe(mask, espacement)
+    job.avancer("measure", 0.5)
+
+    # Lésions 3D (composantes connexes)
+    with span("measure.lesions"):
+        _, lesions = analyser_lesions(mask, espacement)
+    job.avancer("measure", 1.0)
+
+    # --- render : volumes compacts uint8 (N, S, S) à la taille du masque + coupes en PNG ---
+    taille = None if haute_resolution else IMG_SIZE
+    with span("render.compactage"):
+        flair_u8 = compacter(flair, taille)
+        t1ce_u8 = compacter(t1ce, taille)
+    del flair, t1ce
+    with span("render.coupes_png"):
+        vues = rendre_coupes(flair_u8, t1ce_u8, mask)
+    job.avancer("render", 1.0)
+
+    resultat = {
+        "cle": cle,
+        "debut": debut,
+        "geometrie": geometrie,
+        "mask": mask,
+        "flair": flair_u8,
+        "t1ce": t1ce_u8,
+        "espacement": espacement,
+        "mesures": mesures,
+        "volumes": volumes,
+        "lesions": lesions,
+        "vues": vues,
+    }
+    # Tout ce que la page affiche est mis en cache : le prochain passage est immédiat
+    with span("cache.ecriture"):
+        cache.put(cle, **_vers_cache(resultat))
+    return resultat
@@ -0,0 +1,84 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# =========================
+# PARAMÈTRES
+# =========================
+CANAUX_MAX = 128              # canaux max par cv2.resize (limite OpenCV 5, 512 en 4.x)
+SEUIL_THREADS = 4_000_000     # voxels : au-delà, redimensionnement multi-thread
+TAILLE_BLOC_THREADS = 16      # coupes par tâche du pool
+
+
+def _nb_workers(max_workers=None):
+    return max_workers or min(8, os.cpu_count() or 1)
+
+
+def _resize_bloc(slab, size, interpolation):
+    # cv2 traite les coupes comme les canaux d'une seule image (H, W, N)
+    bloc = np.ascontiguousarray(slab)
+    res = cv2.resize(bloc, (size, size), interpolation=interpolation)
+    if res.ndim == 2:
+        res = res[:, :, None]
+    return np.moveaxis(res, -1, 0)
+
+
+# =========================
+# REDIMENSIONNEMENT
+# =========================
+def redimensionner_volume(slab, size, out=None, interpolation=cv2.INTER_LINEAR,
+                          max_workers=None, seuil=SEUIL_THREADS):
+    """
+    Redimensionne toutes les coupes axiales d'un slab (H, W, N) en (N, size, size).
+
+    Petits volumes : un seul appel cv2.resize vectorisé (coupes = canaux).
+    Gros volumes   : blocs de coupes répartis sur un pool de threads
+                     (cv2 libère le GIL pendant le calcul).
+    `out` peut être une vue (ex. X[..., 0]) remplie sans copie intermédiaire.
+    """
+    n_slices = slab.shape[2]
+    if out is None:
+        out = np.empty((n_slices, size, size), dtype=np.float32)
+
+    workers = _nb_workers(max_workers)
+
+    if slab.size < seuil or workers == 1:
+        for start in range(0, n_slices, CANAUX_MAX):
+            stop = min(start + CANAUX_MAX, n_slices)
+            out[start:stop] = _resize_bloc(slab[:, :, start:stop], size, interpolation)
+        return out
+
+    def tache(start):
+        stop = min(start + TAILLE_BLOC_THREADS, n_slices)
+        out[start:stop] = _resize_bloc(slab[:, :, start:stop], size, interpolation)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(tache, range(0, n_slices, TAILLE_BLOC_THREADS)))
+
+    return out
+
+
+def normaliser_inplace(X):
+    """Divise X par son maximum, sans allouer de seconde copie."""
+    x_max = float(np.max(X))
+    if x_max > 0:
+        np.multiply(X, 1.0 / x_max, out=X)
+    return X
+
+
+def preparer_entree(modalites, size, max_workers=None):
+    """
+    Construit le tenseur d'entrée du modèle de segmentation.
+
+    modalites : liste de slabs (H, W, N), un par modalité (FLAIR, T1CE...)
+    Renvoie X float32 de forme (N, size, size, len(modalites)), normalisé dans [0, 1].
+    """
+    n_slices = modalites[0].shape[2]
+    X = np.empty((n_slices, size, size, len(modalites)), dtype=np.float32)
+
+    for c, slab in enumerate(modalites):
+        redimensionner_volume(slab, size, out=X[..., c], max_workers=max_workers)
+
+    return normaliser_inplace(X)
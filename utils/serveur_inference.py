@@ -0,0 +1,314 @@
+"""
+Serveur d'inférence local partagé par toutes les sessions Streamlit.
+
+Un processus unique garde une copie de chaque modèle et regroupe les requêtes
+concurrentes en micro-batchs (taille max / attente max configurables).
+Les clients communiquent via une socket locale (multiprocessing.connection).
+
+Lancement :
+    python -m utils.serveur_inference --port 6001 --batch-max 32 --attente-ms 10
+
+Les pages l'utilisent si la variable d'environnement BT_INFERENCE_SERVER
+vaut "hote:port" ; sinon l'inférence reste locale (registre de modèles).
+
+Authentification : clé BT_INFERENCE_AUTHKEY si elle est définie, sinon clé
+aléatoire générée au lancement du serveur et écrite (mode 0600) dans
+BT_INFERENCE_AUTHKEY_FILE, que les clients du même utilisateur relisent.
+Sans clé explicite, le serveur n'écoute que sur la boucle locale.
+"""
+import argparse
+import os
+import queue
+import secrets
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+# =========================
+# PARAMÈTRES
+# =========================
+ADRESSE_DEFAUT = ("127.0.0.1", 6001)
+FICHIER_CLE = os.environ.get(
+    "BT_INFERENCE_AUTHKEY_FILE", os.path.join(os.path.expanduser("~"), ".bt_inference_authkey")
+)
+HOTES_LOCAUX = ("127.0.0.1", "localhost", "::1")
+BATCH_MAX = 32
+ATTENTE_MAX_MS = 10
+
+
+class Requete:
+    def __init__(self, entree):
+        self.entree = entree
+        self.resultat = None
+        self.erreur = None
+        self.fait = threading.Event()
+
+
+# =========================
+# CLÉ D'AUTHENTIFICATION
+# =========================
+def cle_explicite():
+    cle = os.environ.get("BT_INFERENCE_AUTHKEY")
+    return cle.encode("utf-8") if cle else None
+
+
+def generer_cle(path=FICHIER_CLE):
+    """Nouvelle clé aléatoire, écrite lisible par le seul utilisateur courant."""
+    cle = secrets.token_hex(32)
+    descripteur = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descripteur, "w") as f:
+        f.write(cle)
+    # Fichier préexistant : O_CREAT ne change pas ses permissions
+    os.chmod(path, 0o600)
+    return cle.encode("utf-8")
+
+
+def lire_cle(path=FICHIER_CLE):
+    """Clé des clients : BT_INFERENCE_AUTHKEY, sinon celle écrite par le serveur."""
+    cle = cle_explicite()
+    if cle is not None:
+        return cle
+    try:
+        with open(path) as f:
+            return f.read().strip().encode("utf-8")
+    except FileNotFoundError:
+        raise RuntimeError(
+            f"Clé du serveur d'inférence introuvable ({path}) : lancez le serveur "
+            "ou définissez BT_INFERENCE_AUTHKEY"
+        ) from None
+
+
+# =========================
+# MICRO-BATCHING
+# =========================
+class MicroBatcher:
+    """
+    File de requêtes pour un modèle.
+
+    Un thread unique vide la file : il attend la première requête, puis
+    accumule les suivantes jusqu'à `batch_max` échantillons ou `attente_max_ms`,
+    concatène les entrées et appelle le modèle une seule fois. Une requête qui
+    ferait dépasser `batch_max` ouvre le lot suivant ; les entrées de forme
+    incompatible avec le modèle sont refusées avant d'entrer dans la file.
+    """
+
+    def __init__(self, model, batch_max=BATCH_MAX, attente_max_ms=ATTENTE_MAX_MS):
+        self.model = model
+        self.batch_max = batch_max
+        self.attente_max = attente_max_ms / 1000.0
+        self.forme = tuple(model.input_shape[1:])
+        self.file = queue.Queue()
+        self._report = None   # requête reportée au lot suivant (lu par le seul thread de boucle)
+        self.nb_batchs = 0
+        self.nb_echantillons = 0
+        self._thread = threading.Thread(target=self._boucle, daemon=True)
+        self._thread.start()
+
+    def soumettre(self, entree):
+        """Bloque jusqu'au résultat (appelé par les threads de connexion)."""
+        entree = np.asarray(entree, dtype=np.float32)
+        self.verifier(entree)
+        requete = Requete(entree)
+        self.file.put(requete)
+        requete.fait.wait()
+        if requete.erreur is not None:
+            raise requete.erreur
+        return requete.resultat
+
+    def verifier(self, entree):
+        """Une entrée mal formée échouerait au concatenate et ferait échouer tout son lot."""
+        if entree.ndim != len(self.forme) + 1 or any(
+            attendu is not None and n != attendu for n, attendu in zip(entree.shape[1:], self.forme)
+        ):
+            raise ValueError(
+                f"Entrée de forme {entree.shape} incompatible avec le modèle (None, {', '.join(map(str, self.forme))})"
+            )
+
+    def _collecter(self):
+        premiere, self._report = self._report, None
+        lot = [premiere if premiere is not None else self.file.get()]
+        taille = len(lot[0].entree)
+        echeance = time.monotonic() + self.attente_max
+
+        while taille < self.batch_max:
+            reste = echeance - time.monotonic()
+            if reste <= 0:
+                break
+            try:
+                requete = self.file.get(timeout=reste)
+            except queue.Empty:
+                break
+            if taille + len(requete.entree) > self.batch_max:
+                self._report = requete
+                break
+            lot.append(requete)
+            taille += len(requete.entree)
+        return lot
+
+    def _boucle(self):
+        while True:
+            lot = self._collecter()
+            try:
+                entree = np.concatenate([r.entree for r in lot], axis=0)
+                sortie = np.asarray(self.model.predict_on_batch(entree))
+                self.nb_batchs += 1
+                self.nb_echantillons += len(entree)
+
+                debut = 0
+                for r in lot:
+                    fin = debut + len(r.entree)
+                    r.resultat = sortie[debut:fin]
+                    debut = fin
+            except Exception as e:
+                for r in lot:
+                    r.erreur = e
+            finally:
+                for r in lot:
+                    r.fait.set()
+
+
+# =========================
+# SERVEUR
+# =========================
+def _servir_connexion(conn, batchers):
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+
+            commande = message.get("commande")
+            try:
+                if commande == "predict":
+                    sortie = batchers[message["modele"]].soumettre(message["entree"])
+                    conn.send({"ok": True, "sortie": sortie})
+                elif commande == "stats":
+                    conn.send({"ok": True, "stats": {
+                        nom: {"batchs": b.nb_batchs, "echantillons": b.nb_echantillons}
+                        for nom, b in batchers.items()
+                    }})
+                else:
+                    conn.send({"ok": False, "erreur": f"Commande inconnue : {commande}"})
+            except Exception as e:
+                conn.send({"ok": False, "erreur": repr(e)})
+
+
+def servir(adresse=ADRESSE_DEFAUT, batch_max=BATCH_MAX, attente_max_ms=ATTENTE_MAX_MS,
+           modeles=None):
+    # Les messages reçus sont dépicklés : sans clé choisie par l'exploitant,
+    # aucune écoute hors de la machine
+    cle = cle_explicite()
+    if cle is None:
+        if adresse[0] not in HOTES_LOCAUX:
+            raise SystemExit(
+                f"Écoute sur {adresse[0]} refusée sans BT_INFERENCE_AUTHKEY explicite"
+            )
+        cle = generer_cle()
+
+    from utils.models import registre
+
+    reg = registre()
+    noms = modeles or list(reg.modeles)
+    batchers = {
+        nom: MicroBatcher(reg.get(nom), batch_max, attente_max_ms)
+        for nom in noms
+    }
+
+    with Listener(adresse, backlog=64, authkey=cle) as listener:
+        print(f"==> Serveur d'inférence prêt sur {adresse[0]}:{adresse[1]} ({', '.join(noms)})")
+        while True:
+            conn = listener.accept()
+            threading.Thread(
+                target=_servir_connexion, args=(conn, batchers), daemon=True
+            ).start()
+
+
+# =========================
+# CLIENT
+# =========================
+class ClientInference:
+    """
+    Client léger, compatible avec l'interface `predict_on_batch` des modèles
+    Keras : il peut remplacer un modèle local dans utils/inference.py.
+    """
+
+    def __init__(self, modele, adresse=ADRESSE_DEFAUT):
+        self.modele = modele
+        self.adresse = adresse
+        self._local = threading.local()
+
+    def _connexion(self):
+        # Une connexion par thread : les sessions Streamlit sont des threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.adresse, authkey=lire_cle())
+            self._local.conn = conn
+        return conn
+
+    def _requete(self, message):
+        conn = self._connexion()
+        try:
+            conn.send(message)
+            reponse = conn.recv()
+        except (EOFError, OSError):
+            self._local.conn = None
+            raise
+        if not reponse["ok"]:
+            raise RuntimeError(reponse["erreur"])
+        return reponse
+
+    def predict_on_batch(self, entree):
+        return self._requete({
+            "commande": "predict",
+            "modele": self.modele,
+            "entree": np.asarray(entree, dtype=np.float32),
+        })["sortie"]
+
+    def predict(self, entree, verbose=0):
+        return self.predict_on_batch(entree)
+
+    def stats(self):
+        return self._requete({"commande": "stats"})["stats"]
+
+
+def adresse_serveur():
+    """Adresse du serveur configurée via BT_INFERENCE_SERVER ("hote:port"), sinon None."""
+    valeur = os.environ.get("BT_INFERENCE_SERVER")
+    if not valeur:
+        return None
+    hote, _, port = valeur.rpartition(":")
+    return (hote or "127.0.0.1", int(port))
+
+
+_clients = {}
+
+
+def modele_pour(nom):
+    """Client du serveur d'inférence s'il est configuré, sinon modèle local du registre."""
+    adresse = adresse_serveur()
+    if adresse is not None:
+        if (nom, adresse) not in _clients:
+            _clients[(nom, adresse)] = ClientInference(nom, adresse)
+        return _clients[(nom, adresse)]
+
+    from utils.models import registre
+    return registre().demarrer().get(nom)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur d'inférence local avec micro-batching")
+    parser.add_argument("--hote", default=ADRESSE_DEFAUT[0])
+    parser.add_argument("--port", type=int, default=ADRESSE_DEFAUT[1])
+    parser.add_argument("--batch-max", type=int, default=BATCH_MAX)
+    parser.add_argument("--attente-ms", type=float, default=ATTENTE_MAX_MS)
+    parser.add_argument("--modeles", nargs="*", default=None)
+    args = parser.parse_args()
+
+    servir((args.hote, args.port), args.batch_max, args.attente_ms, args.modeles)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# =========================
+# PARAMÈTRES
+# =========================
+BUDGET_MEMOIRE = int(os.environ.get("BT_SESSION_BUDGET_BYTES", 256 * 1024 * 1024))
+DUREE_VIE_S = 4 * 3600   # sessions inactives supprimées après 4 h
+
+
+class _Entree:
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.dossier = None          # dossier de débordement si sur disque
+        self.acces = time.time()
+
+    @property
+    def en_memoire(self):
+        return self.dossier is None
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.arrays.values()) if self.en_memoire else 0
+
+
+class StoreSessions:
+    """
+    Volumes compacts (uint8) de chaque session, sous un budget mémoire global.
+
+    Quand le total en mémoire dépasse `budget`, les sessions les moins
+    récemment utilisées sont écrites sur disque et rouvertes en mémoire
+    mappée (np.load mmap_mode='r') : seules les coupes consultées sont relues.
+    """
+
+    def __init__(self, budget=BUDGET_MEMOIRE, dossier=None, duree_vie=DUREE_VIE_S):
+        self.budget = budget
+        self.duree_vie = duree_vie
+        self.dossier = dossier or tempfile.mkdtemp(prefix="bt_sessions_")
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def put(self, session_id, **arrays):
+        arrays = {nom: np.ascontiguousarray(a) for nom, a in arrays.items()}
+        with self._verrou:
+            self._supprimer(session_id)
+            self._entrees[session_id] = _Entree(arrays)
+            self._purger()
+            self._appliquer_budget()
+
+    def get(self, session_id):
+        """Renvoie {nom: array} (en mémoire ou mappé depuis le disque) ou None."""
+        with self._verrou:
+            entree = self._entrees.get(session_id)
+            if entree is None:
+                return None
+            entree.acces = time.time()
+            self._entrees.move_to_end(session_id)
+            return dict(entree.arrays)
+
+    def supprimer(self, session_id):
+        with self._verrou:
+            self._supprimer(session_id)
+
+    def _supprimer(self, session_id):
+        entree = self._entrees.pop(session_id, None)
+        if entree is not None and entree.dossier:
+            shutil.rmtree(entree.dossier, ignore_errors=True)
+
+    def _purger(self):
+        limite = time.time() - self.duree_vie
+        for session_id in [s for s, e in self._entrees.items() if e.acces < limite]:
+            self._supprimer(session_id)
+
+    def _deborder(self, session_id, entree):
+        dossier = os.path.join(self.dossier, session_id)
+        os.makedirs(dossier, exist_ok=True)
+        mappes = {}
+        for nom, array in entree.arrays.items():
+            path = os.path.join(dossier, f"{nom}.npy")
+            np.save(path, array)
+            mappes[nom] = np.load(path, mmap_mode="r")
+        entree.arrays = mappes
+        entree.dossier = dossier
+
+    def _appliquer_budget(self):
+        total = sum(e.nbytes for e in self._entrees.values())
+        # Parcours du moins récent au plus récent ; la session courante reste en mémoire
+        for session_id, entree in list(self._entrees.items())[:-1]:
+            if total <= self.budget:
+                break
+            if entree.en_memoire:
+                total -= entree.nbytes
+                self._deborder(session_id, entree)
+
+    def stats(self):
+        with self._verrou:
+            entrees = list(self._entrees.values())
+        return {
+            "sessions": len(entrees),
+            "sur_disque": sum(1 for e in entrees if not e.en_memoire),
+            "octets_memoire": sum(e.nbytes for e in entrees),
+            "budget_octets": self.budget,
+        }
+
+
+_store = None
+_verrou_store = threading.Lock()
+
+
+def store_sessions():
+    """Store partagé par toutes les sessions du processus."""
+    global _store
+    with _verrou_store:
+        if _store is None:
+            _store = StoreSessions()
+        return _store
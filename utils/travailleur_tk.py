@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+
+# =========================
+# PARAMÈTRES
+# =========================
+INTERVALLE_UI_MS = 50   # fréquence à laquelle le thread Tk vide la file de retours
+
+
+class TravailleurTk:
+    """
+    Thread de fond unique pour les outils Tk (seg/testmodel.py,
+    classification/classification.py).
+
+    Le modèle est chargé par le worker dès sa création : la fenêtre s'affiche
+    sans l'attendre. Les tâches soumises sont exécutées une par une, dans
+    l'ordre, après le chargement. Tk n'est pas thread-safe : le worker
+    n'appelle jamais l'interface, il dépose des callbacks dans une file que
+    le thread principal vide avec `root.after`.
+    """
+
+    def __init__(self, root, charger_modele, pret=None, echec=None, intervalle_ms=INTERVALLE_UI_MS):
+        self.root = root
+        self.modele_pret = False
+        self._charger_modele = charger_modele
+        self._pret = pret
+        self._echec = echec
+        self._intervalle_ms = intervalle_ms
+        self._taches = queue.Queue()
+        self._retours = queue.Queue()
+        self._en_attente = 0
+        self._verrou = threading.Lock()
+
+        threading.Thread(target=self._boucle, name="travailleur-tk", daemon=True).start()
+        root.after(self._intervalle_ms, self._pomper)
+
+    # --- côté interface ---
+    def soumettre(self, fn, *args, progression=None, termine=None, erreur=None):
+        """
+        Exécute `fn(modele, rapporter, *args)` dans le worker. `rapporter(fraction, texte)`
+        relaie l'avancement vers `progression` ; `termine(resultat)` ou `erreur(exception)`
+        sont appelés ensuite, tous trois sur le thread Tk.
+        """
+        with self._verrou:
+            self._en_attente += 1
+        self._taches.put((fn, args, progression, termine, erreur))
+
+    @property
+    def en_attente(self):
+        """Tâches soumises non terminées (y compris celle en cours)."""
+        with self._verrou:
+            return self._en_attente
+
+    def arreter(self):
+        self._taches.put(None)
+
+    def _pomper(self):
+        try:
+            while True:
+                try:
+                    fn, args = self._retours.get_nowait()
+                except queue.Empty:
+                    break
+                fn(*args)
+        finally:
+            self.root.after(self._intervalle_ms, self._pomper)
+
+    # --- côté worker ---
+    def _vers_ui(self, fn, *args):
+        if fn is not None:
+            self._retours.put((fn, args))
+
+    def _boucle(self):
+        t0 = time.perf_counter()
+        try:
+            modele = self._charger_modele()
+            erreur_modele = None
+            self.modele_pret = True
+            self._vers_ui(self._pret, time.perf_counter() - t0)
+        except Exception as e:
+            modele, erreur_modele = None, e
+            self._vers_ui(self._echec, e)
+
+        while True:
+            tache = self._taches.get()
+            if tache is None:
+                return
+            fn, args, progression, termine, erreur = tache
+
+            def rapporter(fraction, texte=""):
+                self._vers_ui(progression, fraction, texte)
+
+            try:
+                if erreur_modele is not None:
+                    raise RuntimeError(f"Modèle non chargé : {erreur_modele}")
+                retour = (termine, fn(modele, rapporter, *args))
+            except Exception as e:
+                retour = (erreur, e)
+            # Compteur à jour avant que l'interface ne reçoive le résultat
+            with self._verrou:
+                self._en_attente -= 1
+            self._vers_ui(*retour)
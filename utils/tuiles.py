@@ -0,0 +1,104 @@
+import numpy as np
+
+from utils.resample import normaliser_inplace
+from utils.metriques import span
+
+# =========================
+# PARAMÈTRES
+# =========================
+TAILLE_TUILE = 128        # taille d'entrée du modèle
+RECOUVREMENT_MIN = 16     # pixels partagés au minimum par deux tuiles voisines
+TUILES_PAR_APPEL = 64     # tuiles (toutes coupes confondues) par appel au modèle
+SIGMA_RELATIF = 1 / 8     # pondération gaussienne : centre des tuiles favorisé
+
+
+# =========================
+# GÉOMÉTRIE DES TUILES
+# =========================
+def positions_tuiles(longueur, tuile=TAILLE_TUILE, recouvrement_min=RECOUVREMENT_MIN):
+    """Débuts des tuiles le long d'un axe, régulièrement espacés, bords compris."""
+    if longueur <= tuile:
+        return [0]
+    n = int(np.ceil((longueur - recouvrement_min) / (tuile - recouvrement_min)))
+    return [int(round(p)) for p in np.linspace(0, longueur - tuile, n)]
+
+
+def poids_gaussien(tuile=TAILLE_TUILE, sigma_relatif=SIGMA_RELATIF):
+    """Poids (tuile, tuile) float32 : 1 au centre, décroissant vers les bords."""
+    axe = np.arange(tuile) - (tuile - 1) / 2
+    g = np.exp(-axe ** 2 / (2 * (tuile * sigma_relatif) ** 2))
+    poids = np.outer(g, g)
+    # Jamais nul : un pixel couvert par une seule tuile garde sa prédiction
+    return np.maximum(poids / poids.max(), 1e-3).astype(np.float32)
+
+
+def preparer_natif(modalites):
+    """
+    Slabs natifs (H, W, N) -> tenseur (N, H, W, C) float32 normalisé dans [0, 1],
+    sans redimensionnement.
+    """
+    X = np.stack([np.moveaxis(slab, 2, 0) for slab in modalites], axis=-1).astype(np.float32)
+    return normaliser_inplace(X)
+
+
+# =========================
+# INFÉRENCE PAR TUILES
+# =========================
+def segmenter_tuiles(model, X, actives=None, tuile=TAILLE_TUILE,
+                     recouvrement_min=RECOUVREMENT_MIN, tuiles_par_appel=TUILES_PAR_APPEL,
+                     callback=None):
+    """
+    Segmente X (N, H, W, C) à résolution native par tuiles tuile x tuile qui se recouvrent.
+
+    Les tuiles de toutes les coupes sont regroupées en gros appels au modèle ;
+    les softmax sont accumulés avec une pondération gaussienne puis réduits
+    en masque uint8 (N, H, W) coupe par coupe, dès qu'une coupe est complète.
+    `callback(mask, start, stop, fraction)` est appelé après chaque appel au modèle.
+    """
+    n_slices, h, w = X.shape[:3]
+    mask = np.zeros((n_slices, h, w), dtype=np.uint8)
+    indices = np.arange(n_slices) if actives is None else np.flatnonzero(actives)
+    if len(indices) == 0:
+        return mask
+
+    # Coupes plus petites qu'une tuile : complétées par des zéros
+    hp, wp = max(h, tuile), max(w, tuile)
+    if (hp, wp) != (h, w):
+        Xp = np.zeros((n_slices, hp, wp, X.shape[3]), dtype=X.dtype)
+        Xp[:, :h, :w] = X
+        X = Xp
+
+    ys = positions_tuiles(hp, tuile, recouvrement_min)
+    xs = positions_tuiles(wp, tuile, recouvrement_min)
+    grille = [(y, x) for y in ys for x in xs]
+    poids = poids_gaussien(tuile)
+
+    # Liste plate (coupe, y, x) : les appels au modèle chevauchent plusieurs coupes
+    taches = [(z, y, x) for z in indices for (y, x) in grille]
+    accumulateurs = {}
+    restantes = {}
+    total = len(taches)
+
+    for debut in range(0, total, tuiles_par_appel):
+        lot = taches[debut:debut + tuiles_par_appel]
+        with span("infer.extraction_tuiles"):
+            entree = np.stack([X[z, y:y + tuile, x:x + tuile] for z, y, x in lot])
+        with span("infer.predict"):
+            pred = np.asarray(model.predict_on_batch(entree), dtype=np.float32)
+
+        for (z, y, x), p in zip(lot, pred):
+            if z not in accumulateurs:
+                accumulateurs[z] = np.zeros((hp, wp, p.shape[-1]), dtype=np.float32)
+                restantes[z] = len(grille)
+            accumulateurs[z][y:y + tuile, x:x + tuile] += p * poids[..., None]
+            restantes[z] -= 1
+            if restantes[z] == 0:
+                # Pas besoin de diviser par la somme des poids : l'argmax n'en dépend pas
+                mask[z] = np.argmax(accumulateurs.pop(z)[:h, :w], axis=-1)
+        del pred
+
+        if callback is not None:
+            z = lot[-1][0]
+            callback(mask, int(z), int(z) + 1, min(debut + len(lot), total) / total)
+
+    return mask
@@ -0,0 +1,102 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from utils.resample import redimensionner_volume
+
+# =========================
+# PARAMÈTRES
+# =========================
+# Couleurs (RGB) des classes : fond, nécrose, œdème, zone renforcée
+COULEURS_CLASSES = np.array([
+    [0, 0, 0],
+    [255, 64, 64],
+    [64, 200, 64],
+    [255, 220, 0],
+], dtype=np.uint8)
+ALPHA_MASQUE = 0.5
+MAX_ETUDES_PAR_SESSION = 3
+
+
+# =========================
+# RENDU
+# =========================
+def en_uint8(volume):
+    """Volume float (N, H, W) -> uint8, fenêtré sur le percentile 99.5 du volume."""
+    haut = float(np.percentile(volume, 99.5)) if volume.size else 0.0
+    if haut <= 0:
+        return np.zeros(volume.shape, dtype=np.uint8)
+    out = np.clip(volume * (255.0 / haut), 0, 255)
+    return out.astype(np.uint8)
+
+
+def superposer(gris, mask):
+    """Fond uint8 (..., H, W) + masque -> RGB uint8 (..., H, W, 3) avec les classes en couleur."""
+    rgb = np.repeat(gris[..., None], 3, axis=-1).astype(np.float32)
+    couleurs = COULEURS_CLASSES[mask].astype(np.float32)
+    alpha = (mask > 0)[..., None] * ALPHA_MASQUE
+    rgb = rgb * (1 - alpha) + couleurs * alpha
+    return rgb.astype(np.uint8)
+
+
+def compacter(slab, size=None):
+    """
+    Slab natif float (H, W, N) -> volume d'affichage uint8 (N, size, size),
+    ou (N, H, W) sans redimensionnement si size est None.
+    """
+    if size is None:
+        return en_uint8(np.moveaxis(slab, 2, 0))
+    return en_uint8(redimensionner_volume(slab, size))
+
+
+def rendre_coupes(flair_u8, t1ce_u8, mask):
+    """
+    Rend toutes les coupes une seule fois, juste après la segmentation.
+
+    flair_u8, t1ce_u8 : volumes compacts (N, S, S) uint8 ; mask : (N, S, S) uint8.
+    Renvoie une liste de PNG (octets), un par coupe : [FLAIR | T1CE | superposition].
+    """
+    bandeaux = np.concatenate([
+        np.repeat(flair_u8[..., None], 3, axis=-1),
+        np.repeat(t1ce_u8[..., None], 3, axis=-1),
+        superposer(flair_u8, mask),
+    ], axis=2)
+
+    # cv2 encode en BGR
+    return [cv2.imencode(".png", b[..., ::-1])[1].tobytes() for b in bandeaux]
+
+
+def vues_en_arrays(vues):
+    """Liste de PNG -> (octets concaténés uint8, tailles) : stockable dans un .npz."""
+    tailles = np.array([len(v) for v in vues], dtype=np.int64)
+    return np.frombuffer(b"".join(vues), dtype=np.uint8), tailles
+
+
+def arrays_en_vues(octets, tailles):
+    fins = np.cumsum(tailles)
+    donnees = np.asarray(octets, dtype=np.uint8).tobytes()
+    return [donnees[fin - taille:fin] for fin, taille in zip(fins.tolist(), tailles.tolist())]
+
+
+# =========================
+# CACHE PAR SESSION
+# =========================
+class CacheVues:
+    """Cache LRU borné des rendus (quelques études par session)."""
+
+    def __init__(self, max_etudes=MAX_ETUDES_PAR_SESSION):
+        self.max_etudes = max_etudes
+        self._vues = OrderedDict()
+
+    def get(self, cle):
+        if cle not in self._vues:
+            return None
+        self._vues.move_to_end(cle)
+        return self._vues[cle]
+
+    def put(self, cle, vues):
+        self._vues[cle] = vues
+        self._vues.move_to_end(cle)
+        while len(self._vues) > self.max_etudes:
+            self._vues.popitem(last=False)